@@ -2,15 +2,18 @@
 import os
 import django
 import uuid
-from datetime import datetime, timedelta
+from datetime import timedelta
 import random
 
 # Set up Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cinema_project.settings')
 django.setup()
 
+from django.utils import timezone
+
 # Import models
 from cinema.models import Movie, Hall, Showtime
+from cinema.scheduling import filter_conflicts
 
 # Create halls if they don't exist
 halls = {
@@ -56,7 +59,7 @@ if not movies:
     exit()
 
 # Generate showtimes for the next 7 days
-today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
 languages = ['kg', 'ru']
 
 # Standard time slots
@@ -79,9 +82,9 @@ vip_time_slots = [
 Showtime.objects.filter(datetime__gte=today).delete()
 print("Deleted existing future showtimes")
 
-showtime_count = 0
+candidates = []
 
-# Add new showtimes
+# Collect candidate showtimes
 for day in range(7):
     current_date = today + timedelta(days=day)
     
@@ -95,15 +98,13 @@ for day in range(7):
             showtime_time = current_date.replace(hour=hour, minute=minute)
             language = random.choice(languages)
             
-            Showtime.objects.create(
-                id=uuid.uuid4(),
-                movie=movie,
-                hall=created_halls['standard'],
-                datetime=showtime_time,
-                language=language,
-                price=300.00  # Standard price in KGS
-            )
-            showtime_count += 1
+            candidates.append({
+                'movie': movie,
+                'hall': created_halls['standard'],
+                'datetime': showtime_time,
+                'language': language,
+                'price': 300.00,  # Standard price in KGS
+            })
         
         # Add VIP showtimes
         for hour, minute in vip_time_slots:
@@ -114,14 +115,20 @@ for day in range(7):
             showtime_time = current_date.replace(hour=hour, minute=minute)
             language = random.choice(languages)
             
-            Showtime.objects.create(
-                id=uuid.uuid4(),
-                movie=movie,
-                hall=created_halls['vip'],
-                datetime=showtime_time,
-                language=language,
-                price=500.00  # VIP price in KGS
-            )
-            showtime_count += 1
+            candidates.append({
+                'movie': movie,
+                'hall': created_halls['vip'],
+                'datetime': showtime_time,
+                'language': language,
+                'price': 500.00,  # VIP price in KGS
+            })
+
+# Drop candidates that would overlap in the same hall (movie duration + cleaning buffer)
+random.shuffle(candidates)
+accepted, rejected = filter_conflicts(candidates)
 
-print(f"Created {showtime_count} showtimes for the next 7 days") 
\ No newline at end of file
+Showtime.objects.bulk_create([
+    Showtime(id=uuid.uuid4(), **candidate) for candidate in accepted
+])
+print(f"Skipped {len(rejected)} showtimes that overlap in the same hall")
+print(f"Created {len(accepted)} showtimes for the next 7 days") 
\ No newline at end of file
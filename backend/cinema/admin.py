@@ -1,10 +1,68 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from . import outbox
+from .availability import cancel_bookings
 from .models import (
-    Movie, Hall, Showtime, Snack, 
-    Booking, SnackOrder, News, 
-    Gallery, PasswordReset
+    Movie, Hall, Showtime, Snack,
+    Booking, SnackOrder, News,
+    Gallery, PasswordReset, JobRun, OutboxEvent
 )
 
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids a full COUNT(*) on large, unfiltered tables.
+
+    On PostgreSQL the planner's row estimate is used once the table is big
+    enough for the difference to matter; filtered changelists and other
+    databases fall back to an exact count.
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Shared changelist settings for tables that grow with every booking
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+def _update_status(modeladmin, request, queryset, status, from_statuses):
+    # One UPDATE for the whole selection instead of Booking.save() per row,
+    # so the side effects are done here: cancelling goes through
+    # cancel_bookings (releases seat and snack counters), and every status
+    # change publishes its booking events to the outbox
+    if status == 'cancelled':
+        updated = cancel_bookings(queryset.filter(status__in=from_statuses))
+    else:
+        with transaction.atomic():
+            rows = list(queryset.filter(status__in=from_statuses).values_list('id', 'showtime_id'))
+            updated = queryset.model.objects.filter(id__in=[row[0] for row in rows]).update(
+                status=status, updated_at=timezone.now()
+            )
+            outbox.publish_many(f'booking.{status}', 'booking', [
+                (booking_id, {'showtime': str(showtime_id)}) for booking_id, showtime_id in rows
+            ])
+    modeladmin.message_user(request, f"{updated} booking(s) marked as {status}.", messages.SUCCESS)
+
+
 # Register your models here.
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
@@ -15,27 +73,45 @@ class MovieAdmin(admin.ModelAdmin):
 @admin.register(Hall)
 class HallAdmin(admin.ModelAdmin):
     list_display = ('name', 'capacity')
+    search_fields = ('name',)
 
 @admin.register(Showtime)
-class ShowtimeAdmin(admin.ModelAdmin):
-    list_display = ('movie', 'hall', 'datetime', 'language', 'price')
+class ShowtimeAdmin(LargeTableAdmin):
+    list_display = ('movie', 'hall', 'datetime', 'language', 'price', 'seats_sold', 'seats_held')
     list_filter = ('hall', 'language')
-    search_fields = ('movie__title_kg', 'movie__title_ru')
+    readonly_fields = ('seats_sold', 'seats_held')
+    list_select_related = ('movie', 'hall')
+    search_fields = ('^movie__title_kg', '^movie__title_ru')
+    autocomplete_fields = ('movie', 'hall')
 
 @admin.register(Snack)
 class SnackAdmin(admin.ModelAdmin):
-    list_display = ('name_kg', 'name_ru', 'price', 'available')
-    list_filter = ('available',)
+    list_display = ('name_kg', 'name_ru', 'price', 'available', 'track_stock')
+    list_filter = ('available', 'track_stock')
+    search_fields = ('name_kg', 'name_ru')
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ('user', 'showtime', 'ticket_total', 'snack_total', 'grand_total', 'status')
     list_filter = ('status',)
-    search_fields = ('user__username', 'showtime__movie__title_kg')
+    list_select_related = ('user', 'showtime__movie')
+    search_fields = ('=user__username', '^showtime__movie__title_kg')
+    autocomplete_fields = ('user', 'showtime')
+    actions = ('cancel_bookings', 'mark_completed')
+
+    @admin.action(description="Cancel selected bookings")
+    def cancel_bookings(self, request, queryset):
+        _update_status(self, request, queryset, 'cancelled', ['pending', 'confirmed'])
+
+    @admin.action(description="Mark selected bookings as completed")
+    def mark_completed(self, request, queryset):
+        _update_status(self, request, queryset, 'completed', ['confirmed'])
 
 @admin.register(SnackOrder)
-class SnackOrderAdmin(admin.ModelAdmin):
+class SnackOrderAdmin(LargeTableAdmin):
     list_display = ('booking', 'snack', 'quantity', 'subtotal')
+    list_select_related = ('booking__user', 'snack')
+    autocomplete_fields = ('booking', 'snack')
 
 @admin.register(News)
 class NewsAdmin(admin.ModelAdmin):
@@ -48,6 +124,20 @@ class GalleryAdmin(admin.ModelAdmin):
     list_display = ('caption_kg', 'caption_ru', 'created_at')
 
 @admin.register(PasswordReset)
-class PasswordResetAdmin(admin.ModelAdmin):
+class PasswordResetAdmin(LargeTableAdmin):
     list_display = ('user', 'expires_at', 'used')
     list_filter = ('used',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'started_at', 'finished_at', 'rows_processed', 'duration_ms')
+    list_filter = ('job',)
+    readonly_fields = ('job', 'started_at', 'finished_at', 'rows_processed', 'duration_ms', 'details')
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+    list_display = ('id', 'event_type', 'aggregate_type', 'aggregate_id', 'status', 'attempts', 'created_at')
+    list_filter = ('status', 'aggregate_type')
+    search_fields = ('=aggregate_id',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CinemaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cinema'
+
+    def ready(self):
+        # Register outbox signal receivers and system checks
+        from . import checks, signals  # noqa: F401
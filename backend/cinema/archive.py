@@ -0,0 +1,155 @@
+from django.db import transaction
+from django.db.models import BooleanField, F, Value
+
+from . import outbox
+from .availability import reconcile_counters
+from .models import (
+    Showtime, Booking, SnackOrder, SeatHold, Tombstone,
+    ArchivedShowtime, ArchivedBooking, ArchivedSnackOrder
+)
+
+# Hot model -> archive model, in parent-to-child order
+ARCHIVE_MODELS = [
+    (Showtime, ArchivedShowtime),
+    (Booking, ArchivedBooking),
+    (SnackOrder, ArchivedSnackOrder),
+]
+
+
+def _copy_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _rows(queryset, model):
+    return list(queryset.values(*_copy_fields(model)))
+
+
+def _raw_delete(queryset):
+    # One DELETE statement: no cascade collection and no delete signals
+    queryset._raw_delete(queryset.db)
+
+
+def _move(showtime_ids, source, target):
+    """
+    Copy the showtimes with their bookings and snack orders from one tier to
+    the other and delete them from the source, inside the caller's
+    transaction. Returns the number of rows moved per kind.
+    """
+    (showtime_src, showtime_dst), (booking_src, booking_dst), (order_src, order_dst) = [
+        (pair[source], pair[target]) for pair in ARCHIVE_MODELS
+    ]
+
+    showtimes = _rows(showtime_src.objects.filter(id__in=showtime_ids), showtime_src)
+    bookings = _rows(booking_src.objects.filter(showtime_id__in=showtime_ids), booking_src)
+    orders = _rows(order_src.objects.filter(booking__showtime_id__in=showtime_ids), order_src)
+
+    for model, rows in ((showtime_dst, showtimes), (booking_dst, bookings), (order_dst, orders)):
+        fields = set(_copy_fields(model))
+        objs = [model(**{k: v for k, v in row.items() if k in fields}) for row in rows]
+        model.objects.bulk_create(objs, batch_size=1000)
+
+        # auto_now/auto_now_add overwrite the copied timestamps on insert;
+        # put the original values back
+        timestamps = [
+            field.attname for field in model._meta.concrete_fields
+            if (getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False))
+            and rows and field.attname in rows[0]
+        ]
+        if timestamps:
+            for obj, row in zip(objs, rows):
+                for field in timestamps:
+                    setattr(obj, field, row[field])
+            model.objects.bulk_update(objs, timestamps, batch_size=1000)
+
+    # Children first. Deleting showtimes through the ORM would run the
+    # catalog receivers (cinema.signals) once per row; the callers record
+    # the tombstones and events for the whole batch instead
+    if showtime_src is Showtime:
+        # Leftover holds of the showings aren't kept
+        _raw_delete(SeatHold.objects.filter(showtime_id__in=showtime_ids))
+    _raw_delete(order_src.objects.filter(booking__showtime_id__in=showtime_ids))
+    _raw_delete(booking_src.objects.filter(showtime_id__in=showtime_ids))
+    _raw_delete(showtime_src.objects.filter(id__in=showtime_ids))
+
+    return {
+        'showtimes': len(showtimes),
+        'bookings': len(bookings),
+        'snack_orders': len(orders),
+    }
+
+
+def _add(totals, moved):
+    for key, value in moved.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def archive_showtimes(cutoff, batch_size=200):
+    """
+    Move showtimes that started before ``cutoff``, with their bookings and
+    snack orders, into the archive tables.
+
+    Works in batches of ``batch_size`` showtimes, one transaction each, so
+    locks stay short and an interrupted run can simply be started again.
+    For delta sync and outbox consumers the showtimes count as deleted.
+    """
+    totals = {'showtimes': 0, 'bookings': 0, 'snack_orders': 0}
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Showtime.objects.filter(datetime__lt=cutoff)
+                .order_by('datetime')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            _add(totals, _move(ids, 0, 1))
+            Tombstone.objects.bulk_create([Tombstone(model='showtime', object_id=str(pk)) for pk in ids])
+            outbox.publish_many('showtime.deleted', 'showtime', [(pk, {}) for pk in ids])
+    return totals
+
+
+def restore_showtimes(showtime_ids=(), booking_ids=()):
+    """
+    Move archived showtimes back into the hot tables, e.g. to handle a
+    dispute. A booking is restored together with its whole showtime.
+    """
+    ids = set(showtime_ids)
+    if booking_ids:
+        ids.update(
+            ArchivedBooking.objects.filter(id__in=list(booking_ids))
+            .values_list('showtime_id', flat=True)
+        )
+    with transaction.atomic():
+        ids = list(ArchivedShowtime.objects.filter(id__in=list(ids)).values_list('id', flat=True))
+        if not ids:
+            return {'showtimes': 0, 'bookings': 0, 'snack_orders': 0}
+        moved = _move(ids, 1, 0)
+        # Sync clients would otherwise keep treating them as deleted
+        Tombstone.objects.filter(model='showtime', object_id__in=[str(pk) for pk in ids]).delete()
+        # The archive doesn't keep availability counters; recount them
+        reconcile_counters(ids, fix=True)
+        outbox.publish_many('showtime.created', 'showtime', [(showtime_id, {}) for showtime_id in ids])
+        return moved
+
+
+def _history_values(queryset, archived):
+    return queryset.values(
+        'id', 'showtime_id', 'seats_json', 'snack_total', 'ticket_total',
+        'grand_total', 'status', 'created_at',
+        movie_title_kg=F('showtime__movie__title_kg'),
+        movie_title_ru=F('showtime__movie__title_ru'),
+        datetime=F('showtime__datetime'),
+        hall_name=F('showtime__hall__name'),
+        archived=Value(archived, output_field=BooleanField()),
+    )
+
+
+def booking_history(user):
+    """
+    A user's bookings from both the hot and the archive tables, newest
+    first, as a single UNION query.
+    """
+    live = _history_values(Booking.objects.filter(user=user), False)
+    archived = _history_values(ArchivedBooking.objects.filter(user=user), True)
+    return live.union(archived, all=True).order_by('-created_at')
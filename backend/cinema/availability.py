@@ -0,0 +1,143 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import outbox
+from .inventory import release_booking_snacks
+from .models import Showtime, Booking, SeatHold
+
+# Bookings in these statuses occupy their seats
+SOLD_STATUSES = ['pending', 'confirmed', 'completed']
+
+
+def _delta(field, amount):
+    if amount >= 0:
+        return F(field) + amount
+    # Never go below zero, even if the counter has drifted
+    return Greatest(F(field) - Value(-amount), Value(0))
+
+
+def adjust_counters(showtime_id, sold=0, held=0):
+    """
+    Atomically move a showtime's seats_sold/seats_held counters by the given
+    amounts with a single F-expression UPDATE.
+    """
+    updates = {}
+    if sold:
+        updates['seats_sold'] = _delta('seats_sold', sold)
+    if held:
+        updates['seats_held'] = _delta('seats_held', held)
+    if updates:
+        Showtime.objects.filter(pk=showtime_id).update(**updates)
+
+
+def _adjust_many(rows, field):
+    # rows: (showtime_id, seats_json) pairs; one UPDATE per affected showtime
+    totals = Counter()
+    for showtime_id, seats_json in rows:
+        totals[showtime_id] += len(seats_json or [])
+    for showtime_id, amount in totals.items():
+        adjust_counters(showtime_id, **{field: -amount})
+
+
+def release_bookings(rows):
+    """Give back the seats of cancelled/deleted bookings."""
+    _adjust_many(rows, 'sold')
+
+
+def release_holds(rows):
+    """Give back the seats of deleted holds."""
+    _adjust_many(rows, 'held')
+
+
+def cancel_bookings(queryset, now=None):
+    """
+    Cancel the bookings in ``queryset`` that still hold seats, with one
+    UPDATE, and release their seats and snacks. Returns the number cancelled.
+    """
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(status__in=SOLD_STATUSES)
+            .select_for_update()
+            .values_list('id', 'showtime_id', 'seats_json')
+        )
+        if not rows:
+            return 0
+        cancelled = Booking.objects.filter(id__in=[row[0] for row in rows]).update(
+            status='cancelled', updated_at=now or timezone.now()
+        )
+        release_bookings((showtime_id, seats) for _, showtime_id, seats in rows)
+        release_booking_snacks([row[0] for row in rows])
+        outbox.publish_many('booking.cancelled', 'booking', [
+            (booking_id, {'showtime': str(showtime_id)}) for booking_id, showtime_id, _ in rows
+        ])
+    return cancelled
+
+
+def delete_holds(queryset):
+    """Delete seat holds and release their seats."""
+    with transaction.atomic():
+        rows = list(queryset.values_list('id', 'showtime_id', 'seats_json'))
+        if rows:
+            SeatHold.objects.filter(id__in=[row[0] for row in rows]).delete()
+            release_holds((showtime_id, seats) for _, showtime_id, seats in rows)
+    return len(rows)
+
+
+def expire_holds(now=None):
+    """Drop holds that have run out. Meant to run every minute or so."""
+    return delete_holds(SeatHold.objects.filter(expires_at__lte=now or timezone.now()))
+
+
+def actual_counts(showtime_ids=None):
+    """
+    Recount sold and held seats from the bookings and active holds.
+    Returns ``{showtime_id: (sold, held)}`` for showtimes with any seats taken.
+    """
+    bookings = Booking.objects.filter(status__in=SOLD_STATUSES)
+    holds = SeatHold.objects.filter(expires_at__gt=timezone.now())
+    if showtime_ids is not None:
+        bookings = bookings.filter(showtime_id__in=showtime_ids)
+        holds = holds.filter(showtime_id__in=showtime_ids)
+
+    sold = Counter()
+    for showtime_id, seats_json in bookings.values_list('showtime_id', 'seats_json').iterator(chunk_size=2000):
+        sold[showtime_id] += len(seats_json or [])
+    held = Counter()
+    for showtime_id, seats_json in holds.values_list('showtime_id', 'seats_json').iterator(chunk_size=2000):
+        held[showtime_id] += len(seats_json or [])
+
+    return {
+        showtime_id: (sold[showtime_id], held[showtime_id])
+        for showtime_id in set(sold) | set(held)
+    }
+
+
+def reconcile_counters(showtime_ids=None, fix=False):
+    """
+    Compare the stored counters with a recount and optionally repair them.
+    Returns a list of ``(showtime_id, stored, actual)`` for drifted rows.
+    """
+    actual = actual_counts(showtime_ids)
+    stored = Showtime.objects.all()
+    if showtime_ids is not None:
+        stored = stored.filter(id__in=showtime_ids)
+
+    drift = []
+    for showtime_id, sold, held in stored.values_list('id', 'seats_sold', 'seats_held').iterator(chunk_size=2000):
+        expected = actual.get(showtime_id, (0, 0))
+        if (sold, held) != expected:
+            drift.append((showtime_id, (sold, held), expected))
+
+    if fix:
+        for showtime_id, _, _ in drift:
+            # Recount under the showtime's row lock so concurrent counter
+            # updates aren't overwritten with a stale value
+            with transaction.atomic():
+                list(Showtime.objects.select_for_update().filter(pk=showtime_id).values_list('pk', flat=True))
+                sold, held = actual_counts([showtime_id]).get(showtime_id, (0, 0))
+                Showtime.objects.filter(pk=showtime_id).update(seats_sold=sold, seats_held=held)
+    return drift
@@ -0,0 +1,122 @@
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Movie, Hall, Showtime, Booking
+
+# The tables a booking insert touches, and what they reference
+SCRATCH_MODELS = [ContentType, Permission, Group, User, Movie, Hall, Showtime, Booking]
+
+
+@contextmanager
+def scratch_sqlite(config):
+    """
+    A temporary SQLite file with the booking tables, connected with
+    ``config`` under its own alias (yielded). Removed afterwards.
+    """
+    directory = tempfile.mkdtemp(prefix='cinema-benchmark-')
+    alias = f'benchmark_{uuid.uuid4().hex[:8]}'
+    config = dict(config, NAME=os.path.join(directory, 'benchmark.sqlite3'))
+    # configure_settings fills in the defaults Django gives every DATABASES entry
+    connections.settings[alias] = connections.configure_settings({
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS], alias: config,
+    })[alias]
+    try:
+        with connections[alias].schema_editor() as editor:
+            for model in SCRATCH_MODELS:
+                editor.create_model(model)
+        yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def concurrent_booking_inserts(alias, threads=8, bookings=50):
+    """
+    ``threads`` clients each create ``bookings`` bookings on one showtime,
+    all at once. Every booking is its own transaction (insert plus the
+    seats_sold counter update, as in BookingCreateSerializer) followed by
+    the connection handling Django does at the end of a request, so
+    CONN_MAX_AGE is exercised too.
+
+    Returns throughput, latency percentiles and the errors seen.
+    """
+    # bulk_create: no signals, so nothing is written outside ``alias``
+    user, = User.objects.using(alias).bulk_create([User(username='benchmark')])
+    hall, = Hall.objects.using(alias).bulk_create([Hall(name='Benchmark', capacity=0, layout_json={})])
+    movie, = Movie.objects.using(alias).bulk_create([Movie(
+        title_kg='Benchmark', title_ru='Benchmark', synopsis_kg='', synopsis_ru='',
+        trailer='https://example.com/', genre='drama', language='kg', duration=90,
+        poster='movie_posters/benchmark.jpg', release_date=date.today(),
+    )])
+    showtime, = Showtime.objects.using(alias).bulk_create([Showtime(
+        movie=movie, hall=hall, datetime=timezone.now(), language='kg', price=Decimal('300'),
+    )])
+    connections[alias].close()
+
+    start = threading.Barrier(threads)
+
+    def client(number):
+        latencies, errors = [], Counter()
+        start.wait()
+        try:
+            for seat in range(bookings):
+                began = time.perf_counter()
+                try:
+                    with transaction.atomic(using=alias):
+                        Booking.objects.using(alias).create(
+                            user=user, showtime=showtime, seats_json=[{'row': number, 'number': seat}],
+                            ticket_total=Decimal('300'), grand_total=Decimal('300'), status='confirmed',
+                        )
+                        Showtime.objects.using(alias).filter(pk=showtime.pk).update(seats_sold=F('seats_sold') + 1)
+                    latencies.append(time.perf_counter() - began)
+                except OperationalError as exc:
+                    errors[str(exc)] += 1
+                finally:
+                    # What django.db.close_old_connections does after each request
+                    connections[alias].close_if_unusable_or_obsolete()
+        finally:
+            connections[alias].close()
+        return latencies, errors
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(client, range(threads)))
+    elapsed = time.perf_counter() - began
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum((result_errors for _, result_errors in results), Counter())
+    sold = Showtime.objects.using(alias).filter(pk=showtime.pk).values_list('seats_sold', flat=True).get()
+    connections[alias].close()
+
+    def percentile(percent):
+        return round(latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)] * 1000, 1)
+
+    return {
+        'bookings': len(latencies),
+        'counter': sold,
+        'errors': dict(errors),
+        'seconds': round(elapsed, 2),
+        'per_second': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+        'p50_ms': percentile(50) if latencies else None,
+        'p95_ms': percentile(95) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+    }
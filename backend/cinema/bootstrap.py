@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .inventory import on_sale, snacks_version
+from .models import Snack
+from .seating import HallGrid, booked_seats, held_seats
+from .serializers import MovieSummarySerializer, ShowtimeSerializer, SnackSerializer
+
+
+def _timeout():
+    return getattr(settings, 'BOOTSTRAP_CACHE_SECONDS', 300)
+
+
+def hall_layout(hall):
+    """
+    The compiled seat layout of a hall, cached per hall. The key includes
+    the hall's updated_at, so editing the hall never serves a stale layout.
+    """
+    key = f'bootstrap:layout:{hall.pk}:{hall.updated_at.timestamp()}'
+    layout = cache.get(key)
+    if layout is None:
+        layout = HallGrid(hall.layout_json).describe()
+        layout['capacity'] = hall.capacity
+        cache.set(key, layout, _timeout())
+    return layout
+
+
+def available_snacks():
+    """
+    Serialized snacks on sale. The cache key is the snack table's version
+    (cinema.inventory.snacks_version), which moves when a snack is edited,
+    deleted, sells out or is restocked, so no process serves a stale list
+    even with a per-process cache.
+    """
+    updated_at, count = snacks_version()
+    key = f"bootstrap:snacks:{updated_at.timestamp() if updated_at else 0}:{count}"
+    snacks = cache.get(key)
+    if snacks is None:
+        # Serialized without a request so the cached image paths are host-independent
+        snacks = SnackSerializer(Snack.objects.filter(on_sale()), many=True).data
+        cache.set(key, snacks, _timeout())
+    return snacks
+
+
+def booking_bootstrap(showtime, request=None):
+    """
+    Everything the booking screen needs for one showtime.
+
+    ``showtime`` must come with its movie and hall (select_related). The
+    layout and snacks come from the cache; the occupancy and the snack
+    version are read from the database on every call (three queries).
+    """
+    snacks = available_snacks()
+    if request is not None:
+        snacks = [
+            dict(snack, image=request.build_absolute_uri(snack['image']) if snack['image'] else None)
+            for snack in snacks
+        ]
+    context = {'request': request}
+    return {
+        'showtime': ShowtimeSerializer(showtime, context=context).data,
+        'movie': MovieSummarySerializer(showtime.movie, context=context).data,
+        'hall_layout': hall_layout(showtime.hall),
+        'booked_seats': booked_seats(showtime),
+        'held_seats': held_seats(showtime),
+        'snacks': snacks,
+    }
@@ -0,0 +1,332 @@
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils._os import safe_join
+from PIL import Image
+
+from . import outbox
+from .models import Movie, Hall, Showtime, Snack
+from .recommendations import fill_fallback
+from .scheduling import detect_conflicts
+from .typeahead import title_index
+from .serializers import MovieImportSerializer, SnackImportSerializer, ShowtimeImportSerializer
+
+# Imported in this order so showtimes can reference movies from the same bundle
+KINDS = ('movies', 'snacks', 'showtimes')
+
+
+def _workers(workers):
+    return max(workers or getattr(settings, 'CATALOG_IMPORT_WORKERS', 4), 1)
+
+
+def _read_rows(path):
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as handle:
+            rows = json.load(handle)
+        if not isinstance(rows, list):
+            raise ValueError(f"{os.path.basename(path)} must contain a JSON array of objects")
+        return rows
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        # Empty cells mean "not given", so optional fields get their defaults
+        return [
+            {key: value for key, value in row.items() if value not in ('', None)}
+            for row in csv.DictReader(handle)
+        ]
+
+
+def read_bundle(directory):
+    """
+    Read ``movies``, ``snacks`` and ``showtimes`` rows from ``<kind>.csv`` or
+    ``<kind>.json`` files in ``directory``; missing files are skipped.
+    """
+    bundle = {}
+    for kind in KINDS:
+        for extension in ('.json', '.csv'):
+            path = os.path.join(directory, kind + extension)
+            if os.path.isfile(path):
+                bundle[kind] = _read_rows(path)
+                break
+    return bundle
+
+
+class ImportReport:
+    """Counts and per-row errors for one kind; rows are numbered from 1."""
+
+    def __init__(self, total):
+        self.total = total
+        self.created = 0
+        self.updated = 0
+        self.errors = {}
+
+    def error(self, index, errors):
+        self.errors.setdefault(index, {}).update(errors)
+
+    def as_dict(self):
+        return {
+            'rows': self.total,
+            'created': self.created,
+            'updated': self.updated,
+            'errors': [
+                {'row': index + 1, 'errors': errors}
+                for index, errors in sorted(self.errors.items())
+            ],
+        }
+
+
+def _validate(serializer_class, rows, report, workers):
+    """Validate rows in a thread pool; returns {index: validated data} for the valid ones."""
+    def check(row):
+        if not isinstance(row, dict):
+            return False, {'non_field_errors': ['Expected an object.']}
+        serializer = serializer_class(data=row)
+        if serializer.is_valid():
+            return True, dict(serializer.validated_data)
+        return False, serializer.errors
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(check, rows))
+
+    valid = {}
+    for index, (ok, result) in enumerate(results):
+        if ok:
+            valid[index] = result
+        else:
+            report.error(index, result)
+    return valid
+
+
+def _drop_duplicates(valid, natural_key, report):
+    # The first row with a natural key wins; later ones are reported
+    seen = {}
+    for index in sorted(valid):
+        key = natural_key(valid[index])
+        if key in seen:
+            report.error(index, {'non_field_errors': [f'Duplicate of row {seen[key] + 1}.']})
+            del valid[index]
+        else:
+            seen[key] = index
+
+
+def _store_images(directory, paths, field, upload_to, report, workers, dry_run):
+    """
+    Verify and store the bundle images referenced by ``paths`` ({index: path})
+    in a thread pool. Returns {index: stored name}; broken or missing images
+    are reported against their row.
+    """
+    def store(path):
+        try:
+            full_path = safe_join(directory, path)
+            with open(full_path, 'rb') as handle:
+                Image.open(handle).verify()
+                if dry_run:
+                    return True, path
+                handle.seek(0)
+                return True, default_storage.save(upload_to + os.path.basename(path), File(handle))
+        except (OSError, SuspiciousFileOperation, SyntaxError, ValueError) as exc:
+            return False, f'Cannot use image {path!r}: {exc}'
+
+    indexes = list(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(store, [paths[index] for index in indexes]))
+
+    stored = {}
+    for index, (ok, result) in zip(indexes, results):
+        if ok:
+            stored[index] = result
+        else:
+            report.error(index, {field: [result]})
+    return stored
+
+
+def _save(model, valid, existing, natural_key, report):
+    """
+    Create the rows without an existing match and update the others, with one
+    bulk INSERT and one bulk UPDATE, and publish the outbox events that the
+    skipped save signals would have. Returns the created instances.
+    """
+    name = model._meta.model_name
+    now = timezone.now()
+    to_create, to_update = [], []
+    for data in valid.values():
+        instance = existing.get(natural_key(data))
+        if instance is None:
+            to_create.append(model(**data))
+            continue
+        for field, value in data.items():
+            setattr(instance, field, value)
+        # bulk_update skips auto_now
+        instance.updated_at = now
+        to_update.append(instance)
+
+    model.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        fields = sorted({field for data in valid.values() for field in data} | {'updated_at'})
+        model.objects.bulk_update(to_update, fields, batch_size=500)
+    outbox.publish_many(f'{name}.created', name, [(instance.pk, {}) for instance in to_create])
+    outbox.publish_many(f'{name}.updated', name, [(instance.pk, {}) for instance in to_update])
+    report.created = len(to_create)
+    report.updated = len(to_update)
+    return to_create
+
+
+def _import_with_images(model, serializer_class, image_field, upload_to, natural_key, lookup,
+                        rows, directory, workers, dry_run):
+    report = ImportReport(len(rows))
+    valid = _validate(serializer_class, rows, report, workers)
+    _drop_duplicates(valid, natural_key, report)
+    existing = lookup(valid.values())
+
+    paths = {}
+    for index in list(valid):
+        path = valid[index].pop(image_field, None)
+        if path:
+            paths[index] = path
+        elif natural_key(valid[index]) not in existing:
+            report.error(index, {image_field: ['An image is required for new rows.']})
+            del valid[index]
+    images = _store_images(directory, paths, image_field, upload_to, report, workers, dry_run)
+    for index in list(valid):
+        if index in images:
+            valid[index][image_field] = images[index]
+        elif index in paths:
+            del valid[index]
+
+    created = _save(model, valid, existing, natural_key, report)
+    return report, created
+
+
+def _movie_key(data):
+    return data['title_ru'], data['release_date']
+
+
+def _existing_movies(rows):
+    titles = {data['title_ru'] for data in rows}
+    return {(movie.title_ru, movie.release_date): movie for movie in Movie.objects.filter(title_ru__in=titles)}
+
+
+def import_movies(rows, directory, workers=None, dry_run=False):
+    """
+    Upsert movies on (title_ru, release_date). The bulk writes send no save
+    signals, so what cinema.signals does for a saved movie is done here:
+    the typeahead index is rebuilt after commit and new titles get their
+    same-genre fallback neighbours.
+    """
+    report, created = _import_with_images(
+        Movie, MovieImportSerializer, 'poster', 'movie_posters/', _movie_key, _existing_movies,
+        rows, directory, _workers(workers), dry_run,
+    )
+    if not dry_run:
+        for movie in created:
+            fill_fallback(movie)
+    transaction.on_commit(title_index.invalidate)
+    return report
+
+
+def _snack_key(data):
+    return data['name_ru']
+
+
+def _existing_snacks(rows):
+    names = {data['name_ru'] for data in rows}
+    return {snack.name_ru: snack for snack in Snack.objects.filter(name_ru__in=names)}
+
+
+def import_snacks(rows, directory, workers=None, dry_run=False):
+    """Upsert snacks on name_ru."""
+    report, _ = _import_with_images(
+        Snack, SnackImportSerializer, 'image', 'snack_images/', _snack_key, _existing_snacks,
+        rows, directory, _workers(workers), dry_run,
+    )
+    return report
+
+
+def _showtime_key(data):
+    return data['hall'].pk, data['datetime']
+
+
+def import_showtimes(rows, directory=None, workers=None, dry_run=False):
+    """
+    Upsert showtimes on (hall, datetime). Movies are referenced by title_ru
+    and halls by name; rows that would overlap another showing in the same
+    hall are rejected.
+    """
+    report = ImportReport(len(rows))
+    valid = _validate(ShowtimeImportSerializer, rows, report, _workers(workers))
+
+    movies, halls = {}, {}
+    for movie in Movie.objects.filter(title_ru__in={data['movie'] for data in valid.values()}):
+        movies.setdefault(movie.title_ru, []).append(movie)
+    for hall in Hall.objects.filter(name__in={data['hall'] for data in valid.values()}):
+        halls.setdefault(hall.name, []).append(hall)
+
+    for index in list(valid):
+        data = valid[index]
+        errors = {}
+        for field, objects in (('movie', movies), ('hall', halls)):
+            matches = objects.get(data[field], [])
+            if len(matches) == 1:
+                data[field] = matches[0]
+            else:
+                errors[field] = ['Not found.' if not matches else 'Ambiguous; several match this name.']
+        if errors:
+            report.error(index, errors)
+            del valid[index]
+
+    _drop_duplicates(valid, _showtime_key, report)
+    existing = {
+        (showtime.hall_id, showtime.datetime): showtime
+        for showtime in Showtime.objects.filter(
+            hall__in={data['hall'] for data in valid.values()},
+            datetime__in={data['datetime'] for data in valid.values()},
+        )
+    }
+
+    indexes = sorted(valid)
+    conflicts = detect_conflicts(
+        [valid[index] for index in indexes],
+        exclude_ids=[showtime.pk for showtime in existing.values()],
+    )
+    for conflict in conflicts:
+        index = indexes[conflict['index']]
+        if index in valid:
+            report.error(index, {'datetime': ['Overlaps another showing in this hall.']})
+            del valid[index]
+
+    _save(Showtime, valid, existing, _showtime_key, report)
+    return report
+
+
+IMPORTERS = {
+    'movies': import_movies,
+    'snacks': import_snacks,
+    'showtimes': import_showtimes,
+}
+
+
+def import_catalog(directory, workers=None, dry_run=False):
+    """
+    Import a catalog bundle directory (see read_bundle).
+
+    Rows are validated in parallel and images are verified and stored off
+    the main thread; valid rows are written with bulk INSERT/UPDATE keyed on
+    each model's natural key. Invalid rows are reported and skipped without
+    affecting the rest. With ``dry_run`` everything is checked but nothing
+    is saved. Returns ``{kind: report}``.
+    """
+    bundle = read_bundle(directory)
+    reports = {}
+    with transaction.atomic():
+        for kind in KINDS:
+            if kind in bundle:
+                reports[kind] = IMPORTERS[kind](bundle[kind], directory, workers, dry_run).as_dict()
+        if dry_run:
+            transaction.set_rollback(True)
+    return reports
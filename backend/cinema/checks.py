@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cache backends that every worker process sees, with an atomic incr()
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+@register()
+def waiting_room_cache(app_configs, **kwargs):
+    """
+    The waiting room keeps the line, the open flag and the request counters
+    in the default cache. With a per-process cache every worker would run
+    its own line, admitting N times the configured rate, and rooms opened
+    by ``manage.py waiting_room`` would never reach the workers.
+    """
+    if not getattr(settings, 'WAITING_ROOM_ENABLED', False):
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in SHARED_CACHE_BACKENDS:
+        return []
+    return [Error(
+        f"WAITING_ROOM_ENABLED needs a cache shared by all worker processes, not {backend}.",
+        hint="Set REDIS_URL, or turn WAITING_ROOM_ENABLED off.",
+        id='cinema.E001',
+    )]
@@ -0,0 +1,126 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking
+
+FORMATS = ('csv', 'ndjson')
+
+# Booking columns, then one snack line (empty for bookings without snacks)
+BOOKING_FIELDS = [
+    ('id', 'booking_id'),
+    ('created_at', 'created_at'),
+    ('status', 'status'),
+    ('user__username', 'username'),
+    ('user__email', 'email'),
+    ('showtime_id', 'showtime_id'),
+    ('showtime__datetime', 'showtime'),
+    ('showtime__movie__title_kg', 'movie_kg'),
+    ('showtime__movie__title_ru', 'movie_ru'),
+    ('showtime__hall__name', 'hall'),
+    ('seats_json', 'seats'),
+    ('ticket_total', 'ticket_total'),
+    ('snack_total', 'snack_total'),
+    ('grand_total', 'grand_total'),
+]
+SNACK_FIELDS = [
+    ('snack_orders__snack__name_kg', 'snack'),
+    ('snack_orders__quantity', 'snack_quantity'),
+    ('snack_orders__subtotal', 'snack_subtotal'),
+]
+CSV_HEADER = [column for _, column in BOOKING_FIELDS + SNACK_FIELDS]
+
+CHUNK_SIZE = 2000
+
+
+def booking_lines(date_from=None, date_to=None, statuses=None):
+    """
+    One row per booking and snack line (bookings without snacks appear once),
+    ordered by booking, as a single joined query read in chunks through a
+    server-side cursor where the database supports it. Bookings of archived
+    showtimes are included through a UNION with the archive tables, as in
+    ``archive.booking_history``.
+
+    ``date_from``/``date_to`` are inclusive dates matched against the day the
+    booking was made, in the current time zone.
+    """
+    live = _filtered(Booking.objects.all(), date_from, date_to, statuses)
+    archived = _filtered(ArchivedBooking.objects.all(), date_from, date_to, statuses)
+    # The snack line id only orders the union; it is dropped from each row
+    fields = [field for field, _ in BOOKING_FIELDS + SNACK_FIELDS] + ['snack_orders__id']
+    lines = live.values_list(*fields).union(archived.values_list(*fields), all=True).order_by(
+        'created_at', 'id', 'snack_orders__id'
+    )
+    return (line[:-1] for line in lines.iterator(chunk_size=CHUNK_SIZE))
+
+
+def _filtered(queryset, date_from, date_to, statuses):
+    if date_from:
+        queryset = queryset.filter(created_at__gte=_day_start(date_from))
+    if date_to:
+        queryset = queryset.filter(created_at__lt=_day_start(date_to, days=1))
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def _day_start(day, days=0):
+    start = datetime.combine(day, time.min) + timedelta(days=days)
+    return timezone.make_aware(start)
+
+
+def _local(value):
+    return timezone.localtime(value) if isinstance(value, datetime) else value
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False)
+    return '' if value is None else value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(lines):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for line in lines:
+        yield writer.writerow([_cell(value) for value in line])
+
+
+def ndjson_stream(lines):
+    """One JSON object per booking, with its snack lines nested."""
+    booking_width = len(BOOKING_FIELDS)
+    current = None
+    for line in lines:
+        if current is None or current['booking_id'] != line[0]:
+            if current is not None:
+                yield json.dumps(current, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            current = {column: _local(value) for (_, column), value in zip(BOOKING_FIELDS, line)}
+            current['snacks'] = []
+        if line[booking_width] is not None:
+            current['snacks'].append({
+                'name': line[booking_width],
+                'quantity': line[booking_width + 1],
+                'subtotal': line[booking_width + 2],
+            })
+    if current is not None:
+        yield json.dumps(current, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_bookings(export_format='csv', **filters):
+    """Stream the bookings export as CSV or NDJSON text chunks."""
+    lines = booking_lines(**filters)
+    if export_format == 'ndjson':
+        return ndjson_stream(lines)
+    return csv_stream(lines)
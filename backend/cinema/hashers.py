@@ -0,0 +1,178 @@
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger('cinema.password_hashing')
+
+_lock = threading.Lock()
+_pool = None
+_slots = None
+_timing = threading.local()
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins at the moment. Please try again shortly.'
+    default_code = 'password_hashing_busy'
+
+
+def _encode(hasher_class, attributes, password, salt, *params):
+    # Runs in a pool process
+    hasher = hasher_class()
+    for name, value in attributes.items():
+        setattr(hasher, name, value)
+    return hasher.encode(password, salt, *params)
+
+
+def _executor():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            workers = getattr(settings, 'PASSWORD_HASH_WORKERS', 2)
+            # Spawned rather than forked: the web worker may be running threads
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _slots = threading.BoundedSemaphore(getattr(settings, 'PASSWORD_HASH_MAX_PENDING', workers * 4))
+        return _pool, _slots
+
+
+def start_pool():
+    """Start the pool's processes now rather than on the first sign-in."""
+    if not getattr(settings, 'PASSWORD_HASH_WORKERS', 2):
+        return
+    pool, _ = _executor()
+    futures = [pool.submit(int) for _ in range(pool._max_workers)]
+    try:
+        for future in futures:
+            future.result(timeout=getattr(settings, 'PASSWORD_HASH_TIMEOUT', 10))
+    except TimeoutError:
+        _discard(pool)
+        raise
+
+
+def _discard(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def hash_in_pool(hasher_class, attributes, password, salt, *params):
+    """
+    Run ``hasher_class().encode(password, salt, *params)`` in the password
+    hashing pool, so the CPU cost stays off the request workers.
+
+    At most PASSWORD_HASH_MAX_PENDING hashes per web process are running or
+    queued; a request that can't get a slot within
+    PASSWORD_HASH_QUEUE_TIMEOUT seconds fails with PasswordHashingBusy (503)
+    instead of piling up behind the others, as does a hash that takes longer
+    than PASSWORD_HASH_TIMEOUT seconds (the pool is then replaced, in case
+    it is stuck). With PASSWORD_HASH_WORKERS = 0 hashing runs inline.
+    """
+    started = time.perf_counter()
+    if not getattr(settings, 'PASSWORD_HASH_WORKERS', 2):
+        encoded = _encode(hasher_class, attributes, password, salt, *params)
+        _record(0, time.perf_counter() - started)
+        return encoded
+
+    pool, slots = _executor()
+    if not slots.acquire(timeout=getattr(settings, 'PASSWORD_HASH_QUEUE_TIMEOUT', 2)):
+        _record(time.perf_counter() - started, 0)
+        raise PasswordHashingBusy()
+    try:
+        queued = time.perf_counter()
+        future = pool.submit(_encode, hasher_class, attributes, password, salt, *params)
+        timeout = getattr(settings, 'PASSWORD_HASH_TIMEOUT', 10)
+        try:
+            encoded = future.result(timeout=timeout)
+        except TimeoutError:
+            logger.error("Password hash took over %s s; replacing the pool", timeout)
+            _discard(pool)
+            raise PasswordHashingBusy()
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM-killed); start a fresh pool next time
+            _discard(pool)
+            raise
+    finally:
+        slots.release()
+    _record(queued - started, time.perf_counter() - queued)
+    return encoded
+
+
+def _record(wait, duration):
+    _timing.wait = getattr(_timing, 'wait', 0.0) + wait
+    _timing.duration = getattr(_timing, 'duration', 0.0) + duration
+    _timing.count = getattr(_timing, 'count', 0) + 1
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """Django's PBKDF2 hasher, computed in the hashing pool."""
+
+    def encode(self, password, salt, iterations=None):
+        return hash_in_pool(PBKDF2PasswordHasher, {}, password, salt, iterations or self.iterations)
+
+
+class PooledScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Memory-hard scrypt, computed in the hashing pool, with its cost taken
+    from PASSWORD_SCRYPT_WORK_FACTOR (N), _BLOCK_SIZE (r) and _PARALLELISM
+    (p); the defaults are Django's. Changing them re-hashes each password at
+    its owner's next sign-in.
+    """
+
+    @property
+    def work_factor(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14)
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', 8)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', 5)
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        n, r, p = n or self.work_factor, r or self.block_size, p or self.parallelism
+        # scrypt needs 128 * N * r bytes; OpenSSL refuses more than 32 MiB unless allowed
+        return hash_in_pool(ScryptPasswordHasher, {'maxmem': 2 * 128 * n * r}, password, salt, n, r, p)
+
+
+class PasswordHashTimingMiddleware:
+    """
+    Report the time a request spent on password hashing: a Server-Timing
+    header (``pwhash`` for hashing, ``pwhash-wait`` for waiting for a pool
+    slot) and a line on the 'cinema.password_hashing' logger.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _timing.wait = _timing.duration = 0.0
+        _timing.count = 0
+        response = self.get_response(request)
+        if _timing.count:
+            wait_ms, duration_ms = _timing.wait * 1000, _timing.duration * 1000
+            response['Server-Timing'] = ', '.join(filter(None, [
+                response.get('Server-Timing'),
+                f'pwhash;dur={duration_ms:.1f}',
+                f'pwhash-wait;dur={wait_ms:.1f}',
+            ]))
+            logger.info(json.dumps({
+                'path': request.path,
+                'hashes': _timing.count,
+                'hash_ms': round(duration_ms, 1),
+                'wait_ms': round(wait_ms, 1),
+                'status': response.status_code,
+            }))
+        return response
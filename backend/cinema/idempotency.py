@@ -0,0 +1,141 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _claim(user, scope, key, digest):
+    """
+    Insert the key as in progress. Returns ``(record, True)`` if this request
+    owns it, or ``(existing, False)`` when another request got there first.
+    """
+    now = timezone.now()
+    ttl = timedelta(seconds=_setting('IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 3600))
+    stale = now - timedelta(seconds=_setting('IDEMPOTENCY_LOCK_SECONDS', 60))
+
+    # Expired keys, and in-progress keys whose request died, can be reused
+    IdempotencyKey.objects.filter(user=user, scope=scope, key=key).filter(
+        expires_at__lte=now
+    ).delete()
+    IdempotencyKey.objects.filter(
+        user=user, scope=scope, key=key, status='in_progress', created_at__lt=stale
+    ).delete()
+
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key, fingerprint=digest, expires_at=now + ttl
+            ), True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first(), False
+
+
+def _wait_for(record):
+    # A concurrent duplicate: wait for the first request to finish
+    deadline = time.monotonic() + _setting('IDEMPOTENCY_WAIT_SECONDS', 10)
+    while record is not None and record.status == 'in_progress' and time.monotonic() < deadline:
+        time.sleep(0.05)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Make a view method honour the Idempotency-Key header.
+
+    The first request with a key runs normally and its response is stored
+    with the request fingerprint. Retries with the same key get the stored
+    response back without running the view again; a retry that arrives
+    while the first request is still running waits for it. Reusing a key
+    for a different request body is rejected. Errors raised as exceptions
+    (e.g. validation) and 5xx responses release the key, so a retry runs
+    the view again. Requests without the header are not affected.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return method(self, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response(
+                    {'detail': f'{HEADER} must be at most 255 characters.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            digest = fingerprint(request)
+            record, owner = _claim(request.user, scope, key, digest)
+            if not owner and record is not None and record.fingerprint != digest:
+                return Response(
+                    {'detail': f'{HEADER} was already used for a different request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if not owner:
+                record = _wait_for(record)
+                if record is None:
+                    # The first attempt failed and released the key; run again
+                    record, owner = _claim(request.user, scope, key, digest)
+            if not owner:
+                if record is None or record.status == 'in_progress':
+                    return Response(
+                        {'detail': 'A request with this key is still being processed.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                return _replay(record)
+
+            try:
+                response = method(self, request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500:
+                # Server errors aren't final; let the client retry for real
+                record.delete()
+            else:
+                record.status = 'completed'
+                record.response_status = response.status_code
+                record.response_body = response.data
+                record.save(update_fields=['status', 'response_status', 'response_body'])
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches. Returns the number deleted."""
+    total = 0
+    now = timezone.now()
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        total += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
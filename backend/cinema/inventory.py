@@ -0,0 +1,160 @@
+import random
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q
+from django.utils import timezone
+
+from .models import Snack, SnackStock, SnackOrder
+
+
+def snacks_version():
+    """
+    Latest ``updated_at`` and row count of the snack table (one query).
+    Any edit, deletion or stock sell-out/restock changes it, so it keys the
+    caches of the snack list in every process.
+    """
+    version = Snack.objects.aggregate(updated_at=Max('updated_at'), count=Count('id'))
+    return version['updated_at'], version['count']
+
+
+def touch_snacks(snack_ids):
+    """Mark snacks as changed when their stock changes whether they're on sale."""
+    Snack.objects.filter(pk__in=list(snack_ids)).update(updated_at=timezone.now())
+
+
+def on_sale():
+    """
+    Filter for snacks that can be ordered: available and, when their stock
+    is tracked, with any shard left. Evaluated inside the listing query, so
+    sold-out snacks disappear without extra queries.
+    """
+    in_stock = Exists(SnackStock.objects.filter(snack=OuterRef('pk'), remaining__gt=0))
+    return Q(available=True) & (Q(track_stock=False) | in_stock)
+
+
+def set_stock(snack, quantity):
+    """
+    Set a snack's stock, spread evenly over SNACK_STOCK_SHARDS rows.
+    ``None`` stops tracking it.
+    """
+    shards = getattr(settings, 'SNACK_STOCK_SHARDS', 8)
+    with transaction.atomic():
+        SnackStock.objects.filter(snack=snack).delete()
+        if quantity is not None:
+            base, extra = divmod(quantity, shards)
+            SnackStock.objects.bulk_create([
+                SnackStock(snack=snack, shard=shard, remaining=base + (shard < extra))
+                for shard in range(shards)
+            ])
+        snack.track_stock = quantity is not None
+        Snack.objects.filter(pk=snack.pk).update(track_stock=snack.track_stock, updated_at=timezone.now())
+
+
+def _take(pk, remaining, needed):
+    """
+    Take up to ``needed`` from one shard with a conditional UPDATE. If a
+    concurrent checkout drained part of it since ``remaining`` was read,
+    the shard is read again and what is left is taken. Returns the amount
+    taken.
+    """
+    while needed and remaining:
+        take = min(remaining, needed)
+        if SnackStock.objects.filter(pk=pk, remaining__gte=take).update(remaining=F('remaining') - take):
+            return take
+        remaining = SnackStock.objects.filter(pk=pk).values_list('remaining', flat=True).first() or 0
+    return 0
+
+
+def reserve_snacks(items):
+    """
+    Take ``items`` ((snack, quantity) pairs) out of stock, inside the
+    caller's transaction. Snacks that don't track stock are skipped.
+
+    The shards with stock left are read with one query; each snack is then
+    taken from randomly chosen shards with conditional UPDATEs, which never
+    go below zero. A shard drained concurrently gives what it has left and
+    the rest is made up from the others.
+
+    Returns the ids of snacks that ran short; the caller must then roll
+    back its transaction, as part of the order may already be reserved.
+    """
+    wanted = Counter()
+    for snack, quantity in items:
+        if snack.track_stock:
+            wanted[snack.pk] += quantity
+    if not wanted:
+        return []
+
+    shards = defaultdict(list)
+    for pk, snack_id, remaining in SnackStock.objects.filter(
+        snack_id__in=list(wanted), remaining__gt=0
+    ).values_list('pk', 'snack_id', 'remaining'):
+        shards[snack_id].append((pk, remaining))
+
+    short = []
+    # Snacks and shards are updated in id order to keep lock order stable
+    for snack_id in sorted(wanted):
+        needed = wanted[snack_id]
+        candidates = shards[snack_id]
+        random.shuffle(candidates)
+        planned, left = [], needed
+        for pk, remaining in candidates:
+            if not left:
+                break
+            planned.append((pk, remaining))
+            left -= min(remaining, left)
+
+        # Make up for planned shards drained by concurrent checkouts
+        for pk, remaining in sorted(planned) + sorted(candidates[len(planned):]):
+            if not needed:
+                break
+            needed -= _take(pk, remaining, needed)
+        if needed:
+            short.append(snack_id)
+
+    if short:
+        return short
+    # Read after the takes, so concurrent checkouts are accounted for
+    in_stock = set(SnackStock.objects.filter(
+        snack_id__in=list(wanted), remaining__gt=0
+    ).values_list('snack_id', flat=True).distinct())
+    sold_out = set(wanted) - in_stock
+    if sold_out:
+        touch_snacks(sold_out)
+    return short
+
+
+def release_snacks(rows):
+    """
+    Put ``rows`` ((snack_id, quantity) pairs) back into stock, one UPDATE
+    per snack on a random shard. Snacks that don't track stock are ignored.
+    """
+    totals = Counter()
+    for snack_id, quantity in rows:
+        totals[snack_id] += quantity
+    if not totals:
+        return
+
+    shards = getattr(settings, 'SNACK_STOCK_SHARDS', 8)
+    released = []
+    for snack_id in sorted(totals):
+        stock = SnackStock.objects.filter(snack_id=snack_id)
+        updated = stock.filter(shard=random.randrange(shards)).update(remaining=F('remaining') + totals[snack_id])
+        if not updated:
+            # Stock set up before SNACK_STOCK_SHARDS was lowered; shard 0 always exists
+            updated = stock.filter(shard=0).update(remaining=F('remaining') + totals[snack_id])
+        if updated:
+            released.append(snack_id)
+    if released:
+        # A sold-out snack may be back on sale
+        touch_snacks(released)
+
+
+def release_booking_snacks(booking_ids):
+    """Return the snacks ordered with the given bookings to stock."""
+    release_snacks(
+        SnackOrder.objects.filter(booking_id__in=booking_ids, snack__track_stock=True)
+        .values_list('snack_id', 'quantity')
+    )
@@ -0,0 +1,91 @@
+import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import outbox
+from .availability import cancel_bookings
+from .models import Movie, Showtime, Booking, JobRun
+
+# status before -> status after, once the showtime has ended
+TRANSITIONS = [
+    ('confirmed', 'completed'),
+    ('pending', 'cancelled'),
+]
+
+
+def ended_showtimes(now):
+    """
+    Showtimes whose movie has finished by ``now``.
+
+    The end time is ``datetime + movie.duration``; rather than relying on
+    database-specific date arithmetic, one condition is built per distinct
+    movie duration (a handful of values), which keeps the filter on the
+    ``datetime`` index.
+    """
+    durations = Movie.objects.values_list('duration', flat=True).distinct()
+    conditions = [
+        Q(movie__duration=duration, datetime__lte=now - timedelta(minutes=duration))
+        for duration in durations
+    ]
+    if not conditions:
+        return Showtime.objects.none()
+    return Showtime.objects.filter(reduce(or_, conditions))
+
+
+def _transition(from_status, to_status, showtimes, now, batch_size):
+    processed = 0
+    pending = Booking.objects.filter(status=from_status, showtime__in=showtimes)
+    while True:
+        # Each batch commits on its own, so an interrupted run keeps its
+        # progress and the next run picks up the remaining rows
+        with transaction.atomic():
+            rows = list(pending.values_list('id', 'showtime_id')[:batch_size])
+            if not rows:
+                break
+            batch = Booking.objects.filter(id__in=[row[0] for row in rows], status=from_status)
+            if to_status == 'cancelled':
+                # Cancelling also gives the seats back to the showtime counters
+                processed += cancel_bookings(batch, now=now)
+            else:
+                processed += batch.update(status=to_status, updated_at=now)
+                outbox.publish_many(f'booking.{to_status}', 'booking', [
+                    (booking_id, {'showtime': str(showtime_id)}) for booking_id, showtime_id in rows
+                ])
+    return processed
+
+
+def run_booking_lifecycle(batch_size=None, now=None):
+    """
+    Move bookings of finished showtimes to their final status with set-based
+    UPDATEs in bounded batches (``Booking.save`` is never called).
+
+    Safe to rerun at any time: only bookings still in a source status are
+    touched. Each run is recorded as a ``JobRun``.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'BOOKING_LIFECYCLE_BATCH_SIZE', 1000)
+    if now is None:
+        now = timezone.now()
+
+    run = JobRun.objects.create(job='booking_lifecycle')
+    started = time.monotonic()
+
+    showtimes = ended_showtimes(now)
+    details = {}
+    for from_status, to_status in TRANSITIONS:
+        details[f'{from_status}_to_{to_status}'] = _transition(
+            from_status, to_status, showtimes, now, batch_size
+        )
+
+    run.details = details
+    run.rows_processed = sum(details.values())
+    run.duration_ms = int((time.monotonic() - started) * 1000)
+    run.finished_at = timezone.now()
+    run.save(update_fields=['details', 'rows_processed', 'duration_ms', 'finished_at'])
+    return run
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cinema.archive import archive_showtimes
+
+
+class Command(BaseCommand):
+    help = "Move past showtimes with their bookings and snack orders into the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help="Archive showtimes that started more than this many days ago (default: 90)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help="Showtimes moved per transaction (default: 200)"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        totals = archive_showtimes(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {totals['showtimes']} showtimes, {totals['bookings']} bookings "
+            f"and {totals['snack_orders']} snack orders older than {cutoff:%Y-%m-%d %H:%M}"
+        ))
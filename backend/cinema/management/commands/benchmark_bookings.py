@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from cinema.benchmark import concurrent_booking_inserts, scratch_sqlite
+from cinema_project.database import sqlite_profile
+
+# Django's SQLite defaults: rollback journal, fsync on every commit, a new
+# connection per request and deferred transactions
+PROFILES = {
+    'django-default': {'ENGINE': 'django.db.backends.sqlite3'},
+    'kiosk': sqlite_profile(None),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent booking inserts on scratch SQLite databases, with Django's "
+        "default settings and with the kiosk profile (DB_* / SQLITE_* variables apply)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent clients (default: 8)")
+        parser.add_argument('--bookings', type=int, default=50, help="Bookings per client (default: 50)")
+        parser.add_argument(
+            '--profile', action='append', choices=sorted(PROFILES),
+            help="Profile to run (repeatable; default: all)"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profile':<16} {'ok':>6} {'errors':>6} {'per sec':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+        )
+        for name in options['profile'] or list(PROFILES):
+            with scratch_sqlite(PROFILES[name]) as alias:
+                result = concurrent_booking_inserts(alias, options['threads'], options['bookings'])
+            self.stdout.write(
+                f"{name:<16} {result['bookings']:>6} {sum(result['errors'].values()):>6} "
+                f"{result['per_second']:>8} {result['p50_ms']!s:>8} {result['p95_ms']!s:>8} {result['max_ms']!s:>8}"
+            )
+            for error, count in result['errors'].items():
+                self.stdout.write(self.style.WARNING(f"  {count} x {error}"))
+            if result['counter'] != result['bookings']:
+                self.stdout.write(self.style.ERROR(
+                    f"  seats_sold is {result['counter']} after {result['bookings']} bookings"
+                ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from cinema.recommendations import compute_similar_movies
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar-movies recommendations from booking co-occurrence (run nightly from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help="Neighbours per movie (default: SIMILAR_MOVIES_TOP_K)")
+        parser.add_argument(
+            '--min-support', type=int,
+            help="Users who must have booked both movies (default: SIMILAR_MOVIES_MIN_SUPPORT)"
+        )
+
+    def handle(self, *args, **options):
+        run = compute_similar_movies(top_k=options['top_k'], min_support=options['min_support'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {run.rows_processed} movies "
+            f"({run.details['with_bookings']} from bookings) in {run.duration_ms} ms"
+        ))
@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cinema import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox events to their registered handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Events per batch (default: OUTBOX_BATCH_SIZE)")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop")
+        parser.add_argument('--purge-days', type=int, default=None, help="Also delete delivered events, and events no handler receives, older than this")
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = outbox.drain(options['batch_size'])
+            if delivered or not options['loop']:
+                self.stdout.write(f"Delivered {delivered} events")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        if options['purge_days'] is not None:
+            purged = outbox.purge(timezone.now() - timedelta(days=options['purge_days']))
+            self.stdout.write(f"Purged {purged} delivered or unhandled events")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cinema.availability import expire_holds
+
+
+class Command(BaseCommand):
+    help = "Delete expired seat holds and release their seats (run every minute from cron)"
+
+    def handle(self, *args, **options):
+        expired = expire_holds()
+        self.stdout.write(self.style.SUCCESS(f"Released {expired} expired seat holds"))
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from cinema.exports import FORMATS, export_bookings
+from cinema.models import Booking
+
+
+def _date(value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise CommandError(f"Invalid date '{value}'; use YYYY-MM-DD")
+    return day
+
+
+class Command(BaseCommand):
+    help = "Export bookings with their snack lines as CSV or NDJSON, streamed row by row"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--from', dest='date_from', help="First booking date, YYYY-MM-DD (inclusive)")
+        parser.add_argument('--to', dest='date_to', help="Last booking date, YYYY-MM-DD (inclusive)")
+        parser.add_argument(
+            '--status', action='append', default=[],
+            choices=[choice for choice, _ in Booking.STATUS_CHOICES],
+            help="Only bookings with this status; repeat for several"
+        )
+        parser.add_argument('--output', '-o', help="Write to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        chunks = export_bookings(
+            options['export_format'],
+            date_from=_date(options['date_from']) if options['date_from'] else None,
+            date_to=_date(options['date_to']) if options['date_to'] else None,
+            statuses=options['status'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.catalog_import import import_catalog
+
+
+class Command(BaseCommand):
+    help = "Import movies, snacks and showtimes from a bundle directory or zip (CSV/JSON files plus images)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', help="Directory or .zip with movies/snacks/showtimes .csv or .json files")
+        parser.add_argument('--dry-run', action='store_true', help="Validate everything but save nothing")
+        parser.add_argument('--workers', type=int, help="Threads for validation and image processing")
+
+    def handle(self, *args, **options):
+        path = options['bundle']
+        try:
+            if os.path.isdir(path):
+                reports = import_catalog(path, workers=options['workers'], dry_run=options['dry_run'])
+            elif zipfile.is_zipfile(path):
+                with tempfile.TemporaryDirectory() as directory:
+                    with zipfile.ZipFile(path) as archive:
+                        archive.extractall(directory)
+                    reports = import_catalog(directory, workers=options['workers'], dry_run=options['dry_run'])
+            else:
+                raise CommandError(f"{path} is neither a directory nor a zip file")
+        except ValueError as exc:
+            raise CommandError(f"Cannot read bundle: {exc}")
+
+        if not reports:
+            raise CommandError("No movies, snacks or showtimes files found in the bundle")
+
+        for kind, report in reports.items():
+            for error in report['errors']:
+                self.stdout.write(f"{kind} row {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+            style = self.style.WARNING if report['errors'] else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{kind}: {report['created']} created, {report['updated']} updated, "
+                f"{len(report['errors'])} rejected of {report['rows']}"
+            ))
+        if options['dry_run']:
+            self.stdout.write("Dry run: nothing was saved")
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cinema.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync tombstones older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help="Keep tombstones this many days (default: SYNC_TOMBSTONE_RETENTION_DAYS)"
+        )
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options['days'] is not None:
+            older_than = timezone.now() - timedelta(days=options['days'])
+        deleted = purge_tombstones(older_than)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones"))
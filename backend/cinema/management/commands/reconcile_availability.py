@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from cinema.availability import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Check showtime seats_sold/seats_held counters against bookings and holds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Repair the counters that drifted")
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(fix=options['fix'])
+        for showtime_id, stored, actual in drift:
+            self.stdout.write(
+                f"{showtime_id}: stored sold/held {stored[0]}/{stored[1]}, actual {actual[0]}/{actual[1]}"
+            )
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All showtime counters are in sync"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} showtimes"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} showtimes drifted; rerun with --fix to repair"))
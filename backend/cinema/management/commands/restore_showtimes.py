@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.archive import restore_showtimes
+
+
+class Command(BaseCommand):
+    help = "Move archived showtimes (with bookings and snack orders) back into the live tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--showtime', action='append', default=[], help="Archived showtime ID")
+        parser.add_argument(
+            '--booking', action='append', default=[],
+            help="Archived booking ID; its whole showtime is restored"
+        )
+
+    def handle(self, *args, **options):
+        if not options['showtime'] and not options['booking']:
+            raise CommandError("Pass at least one --showtime or --booking")
+
+        totals = restore_showtimes(options['showtime'], options['booking'])
+        if not totals['showtimes']:
+            raise CommandError("No matching archived showtimes found")
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {totals['showtimes']} showtimes, {totals['bookings']} bookings "
+            f"and {totals['snack_orders']} snack orders"
+        ))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from cinema.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = "Remind users of confirmed bookings whose showtime starts soon (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lead-minutes', type=int, default=None,
+            help="Remind about showtimes starting within this many minutes (default: REMINDER_LEAD_MINUTES)"
+        )
+        parser.add_argument('--workers', type=int, default=None, help="Concurrent sends (default: REMINDER_WORKERS)")
+
+    def handle(self, *args, **options):
+        lead = timedelta(minutes=options['lead_minutes']) if options['lead_minutes'] else None
+        run = send_reminders(lead=lead, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Reminded {run.details['users']} users about {run.rows_processed} bookings "
+            f"in {run.duration_ms} ms ({run.details['failed_users']} failed, "
+            f"{run.details['skipped_users']} without an email address)"
+        ))
@@ -0,0 +1,45 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cinema.querylog import summarize
+
+
+class Command(BaseCommand):
+    help = "Show the slowest query fingerprints from the slow-query log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help="Fingerprints to show (default: 10)")
+        parser.add_argument('--hours', type=float, help="Only entries from the last N hours")
+        parser.add_argument('--file', help="Log file (default: SLOW_QUERY_LOG_FILE)")
+        parser.add_argument('--plans', action='store_true', help="Print the captured EXPLAIN plans")
+
+    def handle(self, *args, **options):
+        path = options['file'] or getattr(settings, 'SLOW_QUERY_LOG_FILE', None)
+        if not path or not os.path.exists(path):
+            raise CommandError(f"No slow-query log at {path}")
+
+        since = timezone.now() - timedelta(hours=options['hours']) if options['hours'] else None
+        with open(path, encoding='utf-8') as handle:
+            summary = summarize(handle, since=since)
+
+        if not summary:
+            self.stdout.write(self.style.SUCCESS("No slow queries logged"))
+            return
+
+        for rank, group in enumerate(summary[:options['top']], 1):
+            self.stdout.write(self.style.WARNING(
+                f"#{rank} {group['count']}x, p95 {group['p95_ms']:.1f} ms, "
+                f"max {group['max_ms']:.1f} ms, total {group['total_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"  {group['fingerprint']}")
+            for route in group['routes']:
+                self.stdout.write(f"  route: {route}")
+            for origin in group['origins']:
+                self.stdout.write(f"  at: {origin}")
+            if options['plans'] and group['plan']:
+                for line in group['plan'].splitlines():
+                    self.stdout.write(f"    {line}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from cinema.lifecycle import run_booking_lifecycle
+
+
+class Command(BaseCommand):
+    help = "Complete confirmed bookings (and cancel stale pending ones) for showtimes that have ended"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Bookings updated per statement (default: BOOKING_LIFECYCLE_BATCH_SIZE)"
+        )
+
+    def handle(self, *args, **options):
+        run = run_booking_lifecycle(batch_size=options['batch_size'])
+        summary = ', '.join(f"{key}: {value}" for key, value in run.details.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {run.rows_processed} bookings in {run.duration_ms} ms ({summary})"
+        ))
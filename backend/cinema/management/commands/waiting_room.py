@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.models import Showtime
+from cinema.waiting_room import close_room, open_room
+
+
+class Command(BaseCommand):
+    help = "Open a showtime's waiting room ahead of an on-sale spike, or close it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('showtime', help="Showtime id")
+        parser.add_argument(
+            '--minutes', type=int,
+            help="Keep the room open this long (default: WAITING_ROOM_OPEN_MINUTES)"
+        )
+        parser.add_argument('--close', action='store_true', help="Let everyone into the booking flow again")
+
+    def handle(self, *args, **options):
+        try:
+            showtime = Showtime.objects.get(pk=options['showtime'])
+        except (Showtime.DoesNotExist, ValueError):
+            raise CommandError(f"Showtime {options['showtime']} not found")
+
+        if options['close']:
+            close_room(showtime.pk)
+            self.stdout.write(self.style.SUCCESS(f"Closed the waiting room of {showtime}"))
+            return
+        minutes = options['minutes']
+        open_room(showtime.pk, minutes * 60 if minutes is not None else None)
+        self.stdout.write(self.style.SUCCESS(f"Opened the waiting room of {showtime}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Run the startup warm-up in this process and report how long each phase takes"
+
+    def handle(self, *args, **options):
+        result = warm_up()
+        for phase in result['phases']:
+            line = f"{phase['name']:<15} {phase['ms']:>8.1f} ms"
+            if phase['ok']:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f"{line}  {phase['error']}"))
+        if result['status'] != 'ready':
+            raise CommandError(f"Warm-up failed after {result['total_ms']:.0f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Ready in {result['total_ms']:.0f} ms"))
@@ -0,0 +1,132 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+from .storage import is_hashed_name
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# One year; hashed names never change content
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _etag(name, stat):
+    if is_hashed_name(name):
+        # The content hash is in the name; stable across servers and deploys
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0].rsplit('.', 1)[-1]
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def _byte_range(header, size):
+    """
+    Parse a single-range Range header. Returns (start, end), None (invalid:
+    ignored, the whole file is sent) or False (unsatisfiable: 416).
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        # e.g. bytes=500-400: syntactically invalid (RFC 9110 14.1.1)
+        return None
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _read_range(handle, length, chunk_size=64 * 1024):
+    try:
+        while length > 0:
+            data = handle.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        handle.close()
+
+
+def _cache_headers(response, path, etag, stat):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if is_hashed_name(path)
+        else f"public, max-age={getattr(settings, 'MEDIA_CACHE_SECONDS', 3600)}"
+    )
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve an uploaded file with validators and long-lived caching.
+
+    Content-hashed names are marked immutable; ETag/If-None-Match and single
+    byte ranges are supported. When MEDIA_SENDFILE_HEADER is set (e.g.
+    ``X-Accel-Redirect`` for nginx), the body is left to the front proxy and
+    only the headers are produced here.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404("Invalid path")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("File not found")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found")
+
+    etag = _etag(path, stat)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        return _cache_headers(HttpResponseNotModified(), path, etag, stat)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    if sendfile_header:
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_SENDFILE_PREFIX', '/protected-media/')
+        response[sendfile_header] = prefix.rstrip('/') + '/' + path.lstrip('/')
+        return _cache_headers(response, path, etag, stat)
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = _byte_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _cache_headers(response, path, etag, stat)
+
+    handle = open(full_path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        handle.seek(start)
+        response = StreamingHttpResponse(
+            _read_range(handle, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(handle, content_type=content_type)
+    return _cache_headers(response, path, etag, stat)
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-19 14:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedShowtime',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('datetime', models.DateTimeField()),
+                ('language', models.CharField(choices=[('kg', 'Kyrgyz'), ('ru', 'Russian'), ('en', 'English'), ('original', 'Original')], max_length=10)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('hall', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_showtimes', to='cinema.hall')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_showtimes', to='cinema.movie')),
+            ],
+            options={
+                'ordering': ['datetime'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('seats_json', models.JSONField()),
+                ('snack_total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('ticket_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('grand_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('completed', 'Completed')], max_length=20)),
+                ('qr_code', models.ImageField(blank=True, null=True, upload_to='booking_qrcodes/')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+                ('showtime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='cinema.archivedshowtime')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedSnackOrder',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snack_orders', to='cinema.archivedbooking')),
+                ('snack', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='cinema.snack')),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 14:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0002_archive_tables'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(db_index=True, max_length=100)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('details', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'showtime'], name='cinema_book_status_1e3c46_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 14:27
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0003_booking_lifecycle'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('seats_json', models.JSONField(help_text='JSON array of held seats')),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('showtime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='cinema.showtime')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['showtime', 'expires_at'], name='cinema_seat_showtim_674322_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 14:28
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def count_seats(apps, schema_editor):
+    Showtime = apps.get_model('cinema', 'Showtime')
+    Booking = apps.get_model('cinema', 'Booking')
+    SeatHold = apps.get_model('cinema', 'SeatHold')
+
+    sold = Counter()
+    bookings = Booking.objects.filter(status__in=['pending', 'confirmed', 'completed'])
+    for showtime_id, seats_json in bookings.values_list('showtime_id', 'seats_json').iterator():
+        sold[showtime_id] += len(seats_json or [])
+    held = Counter()
+    holds = SeatHold.objects.filter(expires_at__gt=timezone.now())
+    for showtime_id, seats_json in holds.values_list('showtime_id', 'seats_json').iterator():
+        held[showtime_id] += len(seats_json or [])
+
+    for showtime_id in set(sold) | set(held):
+        Showtime.objects.filter(pk=showtime_id).update(
+            seats_sold=sold[showtime_id], seats_held=held[showtime_id]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0004_seat_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_held',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_sold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='showtime',
+            name='datetime',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
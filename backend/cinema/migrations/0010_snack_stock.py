@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 14:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0009_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snack',
+            name='track_stock',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='SnackStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('remaining', models.PositiveIntegerField(default=0)),
+                ('snack', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shards', to='cinema.snack')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('snack', 'shard'), name='unique_snack_stock_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0010_snack_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='similar_movies',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
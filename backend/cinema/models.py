@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 import uuid
 
@@ -37,8 +38,10 @@ class Movie(models.Model):
     poster = models.ImageField(upload_to='movie_posters/')
     release_date = models.DateField()
     is_showing = models.BooleanField(default=True)
+    # Precomputed by cinema.recommendations (manage.py compute_similar_movies)
+    similar_movies = models.JSONField(default=list, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.title_kg
@@ -65,11 +68,14 @@ class Showtime(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='showtimes')
     hall = models.ForeignKey(Hall, on_delete=models.CASCADE, related_name='showtimes')
-    datetime = models.DateTimeField()
+    datetime = models.DateTimeField(db_index=True)
     language = models.CharField(max_length=10, choices=LANGUAGE_CHOICES)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Denormalized availability, maintained by cinema.availability
+    seats_sold = models.PositiveIntegerField(default=0)
+    seats_held = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['datetime']
@@ -84,12 +90,31 @@ class Snack(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='snack_images/')
     available = models.BooleanField(default=True)
+    # Stock is counted in SnackStock shards (see cinema.inventory)
+    track_stock = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name_kg
 
+class SnackStock(models.Model):
+    """
+    One shard of a snack's stock. Checkouts take from a random shard, so
+    concurrent bookings rarely update the same row.
+    """
+    snack = models.ForeignKey(Snack, on_delete=models.CASCADE, related_name='stock_shards')
+    shard = models.PositiveSmallIntegerField()
+    remaining = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snack', 'shard'], name='unique_snack_stock_shard'),
+        ]
+    
+    def __str__(self):
+        return f"{self.snack.name_kg} #{self.shard}: {self.remaining}"
+
 class Booking(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -107,9 +132,15 @@ class Booking(models.Model):
     grand_total = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     qr_code = models.ImageField(upload_to='booking_qrcodes/', blank=True, null=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'showtime']),
+        ]
+    
     def __str__(self):
         return f"Booking {self.id} - {self.user.username}"
     
@@ -146,7 +177,7 @@ class News(models.Model):
     image = models.ImageField(upload_to='news_images/')
     published = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name_plural = "News"
@@ -160,7 +191,7 @@ class Gallery(models.Model):
     image_url = models.ImageField(upload_to='gallery/')
     caption_kg = models.CharField(max_length=255)
     caption_ru = models.CharField(max_length=255)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
     class Meta:
         verbose_name_plural = "Galleries"
@@ -182,3 +213,152 @@ class PasswordReset(models.Model):
     
     def is_valid(self):
         return not self.used and self.expires_at > timezone.now()
+
+class SeatHold(models.Model):
+    """Seats reserved for a user for a few minutes while they check out."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    showtime = models.ForeignKey(Showtime, on_delete=models.CASCADE, related_name='holds')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_holds')
+    seats_json = models.JSONField(help_text="JSON array of held seats")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['showtime', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Hold {self.id} until {self.expires_at.strftime('%Y-%m-%d %H:%M')}"
+
+class OutboxEvent(models.Model):
+    """
+    A change event written in the same transaction as the change itself and
+    delivered to handlers later by cinema.outbox.dispatch.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('dead', 'Dead'),
+    ]
+    
+    event_type = models.CharField(max_length=100)
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id}"
+
+class IdempotencyKey(models.Model):
+    """The stored outcome of a request made with an Idempotency-Key header."""
+    STATUS_CHOICES = [
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+class JobRun(models.Model):
+    """A record of one run of a scheduled maintenance job."""
+    job = models.CharField(max_length=100, db_index=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.job} at {self.started_at.strftime('%Y-%m-%d %H:%M')}"
+
+class Tombstone(models.Model):
+    """Marks a deleted catalog row so sync clients can drop their copy."""
+    model = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.model}:{self.object_id} deleted {self.deleted_at.strftime('%Y-%m-%d %H:%M')}"
+
+# Archive tier: past showtimes with their bookings and snack orders are moved
+# here by cinema.archive so the hot tables stay small.
+class ArchivedShowtime(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='archived_showtimes')
+    hall = models.ForeignKey(Hall, on_delete=models.CASCADE, related_name='archived_showtimes')
+    datetime = models.DateTimeField()
+    language = models.CharField(max_length=10, choices=Showtime.LANGUAGE_CHOICES)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['datetime']
+    
+    def __str__(self):
+        return f"{self.movie.title_kg} - {self.datetime.strftime('%Y-%m-%d %H:%M')} (archived)"
+
+class ArchivedBooking(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    showtime = models.ForeignKey(ArchivedShowtime, on_delete=models.CASCADE, related_name='bookings')
+    seats_json = models.JSONField()
+    snack_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    ticket_total = models.DecimalField(max_digits=10, decimal_places=2)
+    grand_total = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    qr_code = models.ImageField(upload_to='booking_qrcodes/', blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Archived booking {self.id}"
+
+class ArchivedSnackOrder(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, related_name='snack_orders')
+    snack = models.ForeignKey(Snack, on_delete=models.CASCADE, related_name='archived_orders')
+    quantity = models.PositiveIntegerField()
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.snack_id} (archived)"
@@ -0,0 +1,194 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# event type (or 'booking.*' / '*') -> list of handler callables
+_handlers = defaultdict(list)
+
+
+def handler(event_type):
+    """
+    Register a function to receive outbox events of ``event_type``.
+
+    Delivery is at-least-once, so handlers must be idempotent. Events of the
+    same aggregate (e.g. one booking) are delivered in the order written.
+
+        @outbox.handler('booking.created')
+        def send_confirmation(event):
+            ...
+    """
+    def register(func):
+        _handlers[event_type].append(func)
+        return func
+    return register
+
+
+def handlers_for(event_type):
+    prefix = event_type.split('.', 1)[0]
+    return _handlers.get(event_type, []) + _handlers.get(f'{prefix}.*', []) + _handlers.get('*', [])
+
+
+def _event(event_type, aggregate_type, aggregate_id, payload):
+    return OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=payload or {},
+    )
+
+
+def publish(event_type, aggregate_type, aggregate_id, payload=None):
+    """
+    Record an event. Call it inside the transaction that makes the change so
+    the event is stored if and only if the change commits.
+    """
+    event = _event(event_type, aggregate_type, aggregate_id, payload)
+    event.save()
+    return event
+
+
+def publish_many(event_type, aggregate_type, events):
+    """Record several events with one INSERT; ``events`` holds (id, payload) pairs."""
+    OutboxEvent.objects.bulk_create(
+        [_event(event_type, aggregate_type, aggregate_id, payload) for aggregate_id, payload in events],
+        batch_size=1000,
+    )
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_SECONDS', 10)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def _handled():
+    """Filter for the event types some registered handler receives."""
+    types = {event_type for event_type, funcs in _handlers.items() if funcs}
+    if '*' in types:
+        return Q()
+    condition = Q(event_type__in=[event_type for event_type in types if not event_type.endswith('.*')])
+    for event_type in types:
+        if event_type.endswith('.*'):
+            condition |= Q(event_type__startswith=event_type[:-1])
+    return condition
+
+
+def dispatch(batch_size=None):
+    """
+    Deliver one batch of pending events to their handlers, oldest first.
+
+    The batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so
+    concurrent dispatchers never deliver the same event. An event is only
+    delivered once every earlier pending event of its aggregate (same
+    aggregate_type and aggregate_id) is: events behind one waiting for a
+    retry are not selected, and events behind one claimed by another
+    dispatcher are held back. Delivered events are marked done with one
+    UPDATE; failures are retried with exponential backoff until
+    OUTBOX_MAX_ATTEMPTS, then marked dead.
+
+    Events without a registered handler stay pending rather than being
+    marked done unconsumed.
+
+    Returns ``(examined, delivered)``: the number of events tried (delivered
+    or failed) and delivered.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+    if not any(_handlers.values()):
+        return 0, 0
+    now = timezone.now()
+
+    pending = OutboxEvent.objects.filter(status='pending')
+    waiting_retry = pending.filter(
+        available_at__gt=now,
+        aggregate_type=OuterRef('aggregate_type'),
+        aggregate_id=OuterRef('aggregate_id'),
+        id__lt=OuterRef('id'),
+    )
+    with transaction.atomic():
+        events = list(
+            pending.filter(_handled(), available_at__lte=now)
+            .exclude(Exists(waiting_retry))
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0, 0
+
+        # Pending ids per aggregate, including those claimed elsewhere
+        queues = defaultdict(list)
+        for aggregate_type, aggregate_id, pk in pending.filter(
+            _handled(), aggregate_id__in={event.aggregate_id for event in events}, id__lte=events[-1].pk
+        ).order_by('id').values_list('aggregate_type', 'aggregate_id', 'id'):
+            queues[aggregate_type, aggregate_id].append(pk)
+
+        examined, delivered = 0, []
+        blocked = set()
+        for event in events:
+            key = (event.aggregate_type, event.aggregate_id)
+            if key in blocked or queues[key][0] != event.pk:
+                # An earlier event of the aggregate failed or is being delivered elsewhere
+                blocked.add(key)
+                continue
+            examined += 1
+            try:
+                # A savepoint per event, so a failing handler's writes are undone
+                with transaction.atomic():
+                    for func in handlers_for(event.event_type):
+                        func(event)
+            except Exception as exc:
+                logger.exception("Outbox handler failed for event %s", event.pk)
+                blocked.add(key)
+                event.attempts += 1
+                event.last_error = repr(exc)
+                if event.attempts >= max_attempts:
+                    event.status = 'dead'
+                else:
+                    event.available_at = now + _retry_delay(event.attempts)
+                event.save(update_fields=['attempts', 'last_error', 'status', 'available_at'])
+                continue
+            queues[key].pop(0)
+            delivered.append(event.pk)
+
+        if delivered:
+            OutboxEvent.objects.filter(pk__in=delivered).update(status='done', processed_at=timezone.now())
+    return examined, len(delivered)
+
+
+def drain(batch_size=None):
+    """
+    Dispatch batches until a batch has nothing left to try. Returns the
+    number of events delivered.
+    """
+    total = 0
+    while True:
+        examined, delivered = dispatch(batch_size)
+        total += delivered
+        if not examined:
+            return total
+
+
+def purge(older_than):
+    """
+    Delete delivered events processed before ``older_than``, and pending
+    events created before it that no registered handler receives: nothing
+    would ever deliver them. A handler added later gets the events of its
+    type that are still kept.
+    """
+    deleted, _ = OutboxEvent.objects.filter(status='done', processed_at__lt=older_than).delete()
+    handled = _handled()
+    if handled:  # an empty Q means a '*' handler receives everything
+        unhandled, _ = OutboxEvent.objects.filter(
+            status='pending', created_at__lt=older_than
+        ).exclude(handled).delete()
+        deleted += unhandled
+    return deleted
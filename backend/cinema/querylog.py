@@ -0,0 +1,199 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger('cinema.slow_queries')
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'IN \((?:(?:\?|%s), )*(?:\?|%s)\)')
+SPACE_RE = re.compile(r'\s+')
+READ_RE = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+# Values that say something about the query but nothing about the user
+SAFE_PARAM_TYPES = (bool, int, float, Decimal, datetime, date, UUID)
+
+_state = threading.local()
+
+
+def fingerprint(sql):
+    """Normalize a statement so runs with different values group together."""
+    sql = LITERAL_RE.sub('?', SPACE_RE.sub(' ', sql.strip()))
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def redact(params):
+    """Keep numbers, dates and ids; replace strings and anything else with a type tag."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact([value])[0] for key, value in params.items()}
+    redacted = []
+    for value in params:
+        if value is None or isinstance(value, SAFE_PARAM_TYPES):
+            redacted.append(value)
+        elif isinstance(value, (str, bytes)):
+            redacted.append(f'<{type(value).__name__}:{len(value)}>')
+        else:
+            redacted.append(f'<{type(value).__name__}>')
+    return redacted
+
+
+def _origin():
+    # The innermost frame in project code (not Django, DRF or this module)
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename \
+                and not frame.filename.endswith('querylog.py'):
+            return f'{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def _explain(connection, sql, params):
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif vendor == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    _state.explaining = True
+    try:
+        # A savepoint keeps a failing EXPLAIN from breaking the caller's transaction
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+    except Exception as exc:
+        return f'EXPLAIN failed: {exc}'
+    finally:
+        _state.explaining = False
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+class SlowQueryLogger:
+    """
+    A ``connection.execute_wrapper`` that logs statements slower than
+    SLOW_QUERY_MS as one JSON line each: route, ORM call site, SQL
+    fingerprint, redacted parameters and, with SLOW_QUERY_EXPLAIN, the
+    EXPLAIN plan of reads.
+    """
+
+    def __init__(self, connection, route=None):
+        self.connection = connection
+        self.route = route
+        self.threshold_ms = getattr(settings, 'SLOW_QUERY_MS', 200)
+        self.explain = getattr(settings, 'SLOW_QUERY_EXPLAIN', False)
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= self.threshold_ms:
+            self.record(sql, params, many, duration_ms)
+        return result
+
+    def record(self, sql, params, many, duration_ms):
+        route = self.route() if callable(self.route) else self.route
+        plan = None
+        if self.explain and not many and READ_RE.match(sql):
+            plan = _explain(self.connection, sql, params)
+        logger.warning(json.dumps({
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration_ms, 2),
+            'database': self.connection.alias,
+            'vendor': self.connection.vendor,
+            'route': route,
+            'origin': _origin(),
+            'fingerprint': fingerprint(sql),
+            'params': None if many else redact(params),
+            'plan': plan,
+        }, default=str))
+
+
+@contextmanager
+def slow_query_logging(route=None):
+    """Log slow queries on every database connection for the duration of the block."""
+    with ExitStack() as stack:
+        for alias in connections:
+            connection = connections[alias]
+            stack.enter_context(connection.execute_wrapper(SlowQueryLogger(connection, route)))
+        yield
+
+
+class SlowQueryLogMiddleware:
+    """Log the requests' slow queries with the route that ran them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', True):
+            return self.get_response(request)
+        with slow_query_logging(route=lambda: self._route(request)):
+            return self.get_response(request)
+
+    @staticmethod
+    def _route(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return f'{request.method} {request.path}'
+        return f'{request.method} {match.route or match.view_name}'
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(lines, since=None):
+    """
+    Aggregate slow-query log lines per fingerprint: count, p95/max duration,
+    the routes and call sites involved, and the latest plan. Sorted by
+    total time spent, worst first.
+    """
+    groups = {}
+    for line in lines:
+        try:
+            entry = json.loads(line[line.index('{'):])
+        except ValueError:
+            continue
+        if since is not None and entry.get('time', '') < since.isoformat():
+            continue
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'durations': [], 'routes': set(), 'origins': set(), 'plan': None,
+        })
+        group['durations'].append(entry['duration_ms'])
+        group['routes'].add(entry.get('route'))
+        group['origins'].add(entry.get('origin'))
+        group['plan'] = entry.get('plan') or group['plan']
+
+    summary = []
+    for group in groups.values():
+        durations = group.pop('durations')
+        group.update({
+            'count': len(durations),
+            'total_ms': round(sum(durations), 2),
+            'p95_ms': _percentile(durations, 95),
+            'max_ms': max(durations),
+            'routes': sorted(filter(None, group['routes'])),
+            'origins': sorted(filter(None, group['origins'])),
+        })
+        summary.append(group)
+    summary.sort(key=lambda group: group['total_ms'], reverse=True)
+    return summary
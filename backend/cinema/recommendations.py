@@ -0,0 +1,161 @@
+import heapq
+import math
+import time
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Movie, Booking, ArchivedBooking, JobRun
+
+
+def _viewings():
+    """Distinct (user, movie) pairs from live and archived bookings that weren't cancelled."""
+    for model in (Booking, ArchivedBooking):
+        yield from model.objects.exclude(status='cancelled').values_list(
+            'user_id', 'showtime__movie_id'
+        ).distinct().iterator(chunk_size=5000)
+
+
+def cooccurrence(pairs, max_movies_per_user=None):
+    """
+    Build the sparse user x movie matrix from ``pairs`` and multiply it by its
+    transpose: returns ``(counts, together)`` where ``counts[m]`` is the
+    number of users who booked movie m and ``together[a][b]`` the number who
+    booked both a and b.
+
+    Users with more than ``max_movies_per_user`` movies (staff test
+    accounts, resellers) are left out: they add little signal and cost
+    quadratically.
+    """
+    if max_movies_per_user is None:
+        max_movies_per_user = getattr(settings, 'SIMILAR_MOVIES_MAX_PER_USER', 200)
+    users = defaultdict(set)
+    for user_id, movie_id in pairs:
+        users[user_id].add(movie_id)
+
+    counts = Counter()
+    together = defaultdict(Counter)
+    for movies in users.values():
+        if len(movies) > max_movies_per_user:
+            continue
+        counts.update(movies)
+        for a, b in combinations(sorted(movies), 2):
+            together[a][b] += 1
+            together[b][a] += 1
+    return counts, together
+
+
+def similarities(counts, together, candidates, top_k, min_support=2):
+    """
+    Cosine similarity between the movies' user sets,
+    ``|A and B| / sqrt(|A| * |B|)``, keeping the ``top_k`` best neighbours
+    among ``candidates`` that were booked together at least ``min_support``
+    times. Returns ``{movie_id: [(score, neighbour_id)]}``, best first.
+    """
+    neighbours = {}
+    for movie_id, others in together.items():
+        scored = (
+            (shared / math.sqrt(counts[movie_id] * counts[other]), other)
+            for other, shared in others.items()
+            if shared >= min_support and other in candidates
+        )
+        neighbours[movie_id] = heapq.nlargest(top_k, scored, key=lambda item: (item[0], str(item[1])))
+    return neighbours
+
+
+def _summary(movie, score, source):
+    return {
+        'id': str(movie.pk),
+        'title_kg': movie.title_kg,
+        'title_ru': movie.title_ru,
+        'poster': default_storage.url(movie.poster.name) if movie.poster else None,
+        'genre': movie.genre,
+        'score': round(score, 4),
+        'source': source,
+    }
+
+
+def _fallback(movie, candidates, popularity, exclude, limit):
+    """
+    For movies with too few co-bookings (new titles above all): showing
+    movies of the same genre and language, then of the same genre, most
+    booked first.
+    """
+    if limit <= 0:
+        return []
+    ranked = sorted(
+        (
+            candidate for candidate in candidates.values()
+            if candidate.pk != movie.pk and candidate.pk not in exclude and candidate.genre == movie.genre
+        ),
+        key=lambda candidate: (
+            candidate.language != movie.language, -popularity[candidate.pk], -candidate.release_date.toordinal()
+        ),
+    )
+    return [_summary(candidate, 0.0, 'genre') for candidate in ranked[:limit]]
+
+
+def neighbours_for(movie, candidates, popularity, scored, top_k):
+    """The stored ``similar_movies`` list of one movie."""
+    similar = [
+        _summary(candidates[neighbour_id], score, 'bookings')
+        for score, neighbour_id in scored
+    ]
+    exclude = {neighbour_id for _, neighbour_id in scored}
+    return similar + _fallback(movie, candidates, popularity, exclude, top_k - len(similar))
+
+
+def compute_similar_movies(top_k=None, min_support=None, batch_size=500):
+    """
+    Recompute every movie's ``similar_movies``: the showing movies most often
+    booked by the same people, topped up with same-genre titles. Meant to
+    run nightly; recorded as a ``JobRun``.
+
+    The pairs are read once and the similarity is computed in memory on
+    sparse co-occurrence counts, so the cost grows with bookings per user
+    rather than users x movies.
+    """
+    if top_k is None:
+        top_k = getattr(settings, 'SIMILAR_MOVIES_TOP_K', 8)
+    if min_support is None:
+        min_support = getattr(settings, 'SIMILAR_MOVIES_MIN_SUPPORT', 2)
+
+    run = JobRun.objects.create(job='similar_movies')
+    started = time.monotonic()
+
+    counts, together = cooccurrence(_viewings())
+    movies = list(Movie.objects.defer('similar_movies', 'synopsis_kg', 'synopsis_ru'))
+    candidates = {movie.pk: movie for movie in movies if movie.is_showing}
+    scored = similarities(counts, together, candidates, top_k, min_support)
+
+    for movie in movies:
+        movie.similar_movies = neighbours_for(movie, candidates, counts, scored.get(movie.pk, []), top_k)
+    # bulk_update leaves updated_at alone: recommendations aren't a catalog edit
+    Movie.objects.bulk_update(movies, ['similar_movies'], batch_size=batch_size)
+
+    run.details = {
+        'movies': len(movies),
+        'with_bookings': sum(1 for movie in movies if scored.get(movie.pk)),
+        'pairs': sum(len(others) for others in together.values()) // 2,
+    }
+    run.rows_processed = len(movies)
+    run.duration_ms = int((time.monotonic() - started) * 1000)
+    run.finished_at = timezone.now()
+    run.save(update_fields=['details', 'rows_processed', 'duration_ms', 'finished_at'])
+    return run
+
+
+def fill_fallback(movie):
+    """Give a newly added movie same-genre neighbours until the next nightly run."""
+    candidates = {
+        candidate.pk: candidate
+        for candidate in Movie.objects.filter(is_showing=True, genre=movie.genre)
+        .exclude(pk=movie.pk).defer('similar_movies', 'synopsis_kg', 'synopsis_ru')
+    }
+    movie.similar_movies = _fallback(
+        movie, candidates, Counter(), set(), getattr(settings, 'SIMILAR_MOVIES_TOP_K', 8)
+    )
+    Movie.objects.filter(pk=movie.pk).update(similar_movies=movie.similar_movies)
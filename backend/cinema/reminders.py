@@ -0,0 +1,145 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Booking, JobRun
+
+logger = logging.getLogger(__name__)
+
+
+class EmailSender:
+    """
+    Send reminders by email through Django's EMAIL_BACKEND, so the console
+    and file-based backends work for local testing.
+    """
+
+    def send(self, recipient, bookings):
+        lines = [f"Hello {recipient['name'] or recipient['username']},", "", "Your showing starts soon:"]
+        for booking in bookings:
+            start = timezone.localtime(booking['datetime'])
+            lines.append(
+                f"- {booking['title_kg']} / {booking['title_ru']}, {start:%Y-%m-%d %H:%M}, "
+                f"{booking['hall']}, seats: {booking['seats']}"
+            )
+        connection = get_connection(fail_silently=False)
+        EmailMessage(
+            subject="Univer Cinema: your showing starts soon",
+            body="\n".join(lines),
+            to=[recipient['email']],
+            connection=connection,
+        ).send()
+
+
+def get_sender():
+    return import_string(getattr(settings, 'REMINDER_SENDER', 'cinema.reminders.EmailSender'))()
+
+
+def due_bookings(now, lead):
+    """
+    Confirmed, not yet reminded bookings whose showtime starts within
+    ``lead`` from ``now``, with everything needed for the message, in one
+    query (backed by the Showtime.datetime index).
+    """
+    return Booking.objects.filter(
+        status='confirmed',
+        reminder_sent_at__isnull=True,
+        showtime__datetime__gt=now,
+        showtime__datetime__lte=now + lead,
+    ).values(
+        'id', 'user_id', 'seats_json',
+        'user__username', 'user__first_name', 'user__email',
+        'showtime__datetime', 'showtime__movie__title_kg',
+        'showtime__movie__title_ru', 'showtime__hall__name',
+    )
+
+
+def _group_by_user(rows):
+    recipients = {}
+    bookings = defaultdict(list)
+    for row in rows:
+        recipients[row['user_id']] = {
+            'username': row['user__username'],
+            'name': row['user__first_name'],
+            'email': row['user__email'],
+        }
+        bookings[row['user_id']].append({
+            'id': row['id'],
+            'datetime': row['showtime__datetime'],
+            'title_kg': row['showtime__movie__title_kg'],
+            'title_ru': row['showtime__movie__title_ru'],
+            'hall': row['showtime__hall__name'],
+            'seats': len(row['seats_json'] or []),
+        })
+    return recipients, bookings
+
+
+def send_reminders(lead=None, now=None, sender=None, workers=None):
+    """
+    Remind every user with a confirmed booking that starts within ``lead``.
+
+    Due bookings are fetched in one query and grouped per user, so a user
+    with several bookings gets one message. Bookings are claimed (locked
+    with SKIP LOCKED and their ``reminder_sent_at`` set, in one transaction)
+    before sending, which keeps reruns and overlapping runs from sending
+    twice; claims of failed sends are undone so the next run retries them.
+    Users without an email address are skipped and their bookings stay
+    claimed, so they aren't picked up again on every run. Messages go out
+    through a thread pool of REMINDER_WORKERS. The run is recorded as a
+    JobRun.
+    """
+    if lead is None:
+        lead = timedelta(minutes=getattr(settings, 'REMINDER_LEAD_MINUTES', 120))
+    if now is None:
+        now = timezone.now()
+    if sender is None:
+        sender = get_sender()
+    if workers is None:
+        workers = getattr(settings, 'REMINDER_WORKERS', 4)
+
+    run = JobRun.objects.create(job='showtime_reminders')
+    started = time.monotonic()
+
+    with transaction.atomic():
+        rows = list(due_bookings(now, lead).select_for_update(skip_locked=True, of=('self',)))
+        Booking.objects.filter(id__in=[row['id'] for row in rows]).update(reminder_sent_at=timezone.now())
+
+    recipients, bookings = _group_by_user(rows)
+    skipped = [user_id for user_id, recipient in recipients.items() if not recipient['email']]
+    for user_id in skipped:
+        del recipients[user_id]
+
+    def deliver(user_id):
+        try:
+            sender.send(recipients[user_id], bookings[user_id])
+            return user_id, True
+        except Exception:
+            logger.exception("Sending reminder to user %s failed", user_id)
+            return user_id, False
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = list(pool.map(deliver, recipients))
+
+    failed = [user_id for user_id, ok in results if not ok]
+    if failed:
+        Booking.objects.filter(
+            id__in=[booking['id'] for user_id in failed for booking in bookings[user_id]]
+        ).update(reminder_sent_at=None)
+
+    run.details = {
+        'users': len(results) - len(failed), 'failed_users': len(failed), 'skipped_users': len(skipped),
+    }
+    run.rows_processed = sum(len(bookings[user_id]) for user_id, ok in results if ok)
+    run.duration_ms = int((time.monotonic() - started) * 1000)
+    run.finished_at = timezone.now()
+    run.save(update_fields=['details', 'rows_processed', 'duration_ms', 'finished_at'])
+    return run
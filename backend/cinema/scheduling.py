@@ -0,0 +1,142 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+
+from .models import Movie, Showtime
+
+
+def get_cleaning_buffer():
+    # Minutes a hall stays blocked after a showing for cleaning/turnover
+    return timedelta(minutes=getattr(settings, 'SHOWTIME_CLEANING_BUFFER_MINUTES', 15))
+
+
+def _interval(start, duration, buffer):
+    return start, start + timedelta(minutes=duration) + buffer
+
+
+def _existing_intervals(hall_ids, window_start, window_end, buffer, exclude_ids=()):
+    """
+    Fetch the busy intervals of already scheduled showtimes that could overlap
+    the given window, for all affected halls, in a single query.
+    """
+    longest = Movie.objects.aggregate(longest=Max('duration'))['longest'] or 0
+    queryset = Showtime.objects.filter(
+        hall_id__in=hall_ids,
+        datetime__lt=window_end,
+        datetime__gt=window_start - timedelta(minutes=longest) - buffer,
+    ).exclude(id__in=list(exclude_ids))
+
+    intervals = defaultdict(list)
+    for row in queryset.values('id', 'hall_id', 'datetime', 'movie__duration'):
+        start, end = _interval(row['datetime'], row['movie__duration'], buffer)
+        intervals[row['hall_id']].append((start, end, 'existing', row['id']))
+    return intervals
+
+
+def _candidate_intervals(candidates, buffer):
+    intervals = defaultdict(list)
+    for index, candidate in enumerate(candidates):
+        start, end = _interval(candidate['datetime'], candidate['movie'].duration, buffer)
+        intervals[candidate['hall'].pk].append((start, end, 'new', index))
+    return intervals
+
+
+def _conflict(entry, other):
+    start, end, _, index = entry
+    conflict = {
+        'index': index,
+        'start': start,
+        'end': end,
+    }
+    if other[2] == 'new':
+        conflict['conflicts_with'] = {'index': other[3]}
+    else:
+        conflict['conflicts_with'] = {'id': other[3]}
+    conflict['conflicts_with'].update({'start': other[0], 'end': other[1]})
+    return conflict
+
+
+def detect_conflicts(candidates, exclude_ids=(), buffer=None):
+    """
+    Check a batch of showtimes against each other and against the showtimes
+    already stored for the same halls.
+
+    Each candidate is a mapping with ``movie``, ``hall`` and ``datetime``
+    (e.g. a serializer's validated data). A hall is considered busy from the
+    start of a showing until the movie ends plus the cleaning buffer.
+
+    Existing rows are loaded with one query and every hall is checked with a
+    sweep over its intervals sorted by start time, so the cost is
+    O(n log n + k) for n showtimes and k conflicts. Returns a list of
+    conflicts, each referencing the candidate by its index in the batch.
+    """
+    if not candidates:
+        return []
+
+    if buffer is None:
+        buffer = get_cleaning_buffer()
+
+    new = _candidate_intervals(candidates, buffer)
+    window_start = min(start for entries in new.values() for start, _, _, _ in entries)
+    window_end = max(end for entries in new.values() for _, end, _, _ in entries)
+    existing = _existing_intervals(new.keys(), window_start, window_end, buffer, exclude_ids)
+
+    conflicts = []
+    for hall_id, entries in new.items():
+        # Sort by start; new entries go first on ties so they are reported
+        timeline = sorted(entries + existing.get(hall_id, []), key=lambda e: (e[0], e[2] != 'new'))
+        active = []  # heap of (end, position, entry) for intervals still running
+        for position, entry in enumerate(timeline):
+            while active and active[0][0] <= entry[0]:
+                heapq.heappop(active)
+            for _, _, other in active:
+                if entry[2] == 'new':
+                    conflicts.append(_conflict(entry, other))
+                elif other[2] == 'new':
+                    conflicts.append(_conflict(other, entry))
+            heapq.heappush(active, (entry[1], position, entry))
+
+    conflicts.sort(key=lambda c: (c['index'], c['start']))
+    return conflicts
+
+
+def filter_conflicts(candidates, buffer=None):
+    """
+    Greedily keep the candidates that fit around the existing schedule and
+    around each other, in chronological order per hall.
+
+    Returns ``(accepted, rejected)`` lists of candidates.
+    """
+    if not candidates:
+        return [], []
+
+    if buffer is None:
+        buffer = get_cleaning_buffer()
+
+    new = _candidate_intervals(candidates, buffer)
+    window_start = min(start for entries in new.values() for start, _, _, _ in entries)
+    window_end = max(end for entries in new.values() for _, end, _, _ in entries)
+    existing = _existing_intervals(new.keys(), window_start, window_end, buffer)
+
+    accepted_indexes = set()
+    for hall_id, entries in new.items():
+        busy = sorted(existing.get(hall_id, []))
+        busy_pos = 0
+        last_end = None
+        for start, end, _, index in sorted(entries):
+            # Skip existing intervals that finished before this one starts
+            while busy_pos < len(busy) and busy[busy_pos][1] <= start:
+                busy_pos += 1
+            if busy_pos < len(busy) and busy[busy_pos][0] < end:
+                continue
+            if last_end is not None and start < last_end:
+                continue
+            accepted_indexes.add(index)
+            last_end = end
+
+    accepted = [c for i, c in enumerate(candidates) if i in accepted_indexes]
+    rejected = [c for i, c in enumerate(candidates) if i not in accepted_indexes]
+    return accepted, rejected
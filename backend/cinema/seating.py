@@ -0,0 +1,212 @@
+import string
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import SOLD_STATUSES, adjust_counters, delete_holds
+from .models import Showtime, Booking, SeatHold
+
+ROW_LABELS = string.ascii_uppercase
+
+
+def row_label(row):
+    return ROW_LABELS[row] if row < len(ROW_LABELS) else str(row + 1)
+
+
+def seat_position(seat):
+    """
+    Turn a stored seat (``{'row': 'A', 'number': 3}``, or the frontend's
+    ``{'row': 1, 'seatNumber': 3}``) into 0-based ``(row, column)``.
+    Returns None for entries that can't be placed on the grid.
+    """
+    if not isinstance(seat, dict):
+        return None
+    row = seat.get('row')
+    number = seat.get('number', seat.get('seatNumber'))
+    try:
+        if isinstance(row, str) and not row.isdigit():
+            row = ROW_LABELS.index(row.upper())
+        else:
+            row = int(row) - 1
+        column = int(number) - 1
+    except (TypeError, ValueError):
+        return None
+    if row < 0 or column < 0:
+        return None
+    return row, column
+
+
+class SeatsUnavailable(Exception):
+    """Some of the requested seats are booked or held by someone else."""
+
+    def __init__(self, seats):
+        super().__init__(f'{len(seats)} seat(s) no longer available')
+        self.seats = seats
+
+
+class HallGrid:
+    """
+    A hall's seat layout compiled from ``Hall.layout_json``.
+
+    Occupancy is kept as one integer bitmask per row (bit ``c`` set means
+    seat ``c`` is taken), so testing a block of seats is a single AND.
+    Supported layout keys: ``rows``, ``seatsPerRow``, ``type`` and the
+    optional ``rowTypes`` (row label -> seat type) and ``blocked`` (seats
+    that don't exist, e.g. aisles).
+    """
+
+    def __init__(self, layout):
+        self.rows = int(layout.get('rows', 0))
+        self.columns = int(layout.get('seatsPerRow', 0))
+        default_type = layout.get('type', 'standard')
+        row_types = layout.get('rowTypes', {})
+        self.row_types = [row_types.get(row_label(r), default_type) for r in range(self.rows)]
+        self.occupied = [0] * self.rows
+        self.mark(layout.get('blocked', []))
+
+    def mark(self, seats):
+        for seat in seats:
+            position = seat_position(seat)
+            if position and position[0] < self.rows and position[1] < self.columns:
+                self.occupied[position[0]] |= 1 << position[1]
+
+    def describe(self):
+        """The compiled layout for seat-map clients: per-row labels and types, and blocked seats."""
+        return {
+            'rows': self.rows,
+            'seatsPerRow': self.columns,
+            'rowLabels': [row_label(row) for row in range(self.rows)],
+            'rowTypes': self.row_types,
+            'blocked': [
+                {'row': row_label(row), 'number': column + 1}
+                for row, mask in enumerate(self.occupied)
+                for column in range(self.columns)
+                if mask >> column & 1
+            ],
+        }
+
+    def free_count(self):
+        full = (1 << self.columns) - 1
+        return sum(bin(full & ~mask).count('1') for mask in self.occupied)
+
+    def best_block(self, party_size, row_from=None, row_to=None, centre=True, seat_type=None):
+        """
+        Find the best block of ``party_size`` adjacent free seats in one row.
+
+        Blocks are scored by distance from the middle of the row and from
+        the ideal viewing row (about two thirds of the way back); with
+        ``centre`` the horizontal distance weighs more. Lower is better.
+        Returns ``(row, first_column, score)`` or None.
+        """
+        if party_size < 1 or party_size > self.columns:
+            return None
+
+        first_row = max((row_from or 1) - 1, 0)
+        last_row = min((row_to or self.rows) - 1, self.rows - 1)
+        ideal_start = (self.columns - party_size) / 2
+        ideal_row = (self.rows - 1) * 2 / 3
+        column_weight = 2.0 if centre else 1.0
+        full = (1 << self.columns) - 1
+
+        best = None
+        for row in range(first_row, last_row + 1):
+            if seat_type and self.row_types[row] != seat_type:
+                continue
+            # Bit c of `starts` survives only if seats c .. c+party_size-1
+            # are all free, so every candidate block in the row is found
+            # with party_size word operations
+            free = full & ~self.occupied[row]
+            starts = free
+            for shift in range(1, party_size):
+                starts &= free >> shift
+            if not starts:
+                continue
+            
+            # Within a row the best block is the one starting nearest to the
+            # centred position: the highest start at or left of it, or the
+            # lowest start right of it
+            column = None
+            for candidate in self._nearest_bits(starts, ideal_start):
+                if column is None or abs(candidate - ideal_start) < abs(column - ideal_start):
+                    column = candidate
+            offset = abs(column - ideal_start) / max(self.columns, 1)
+            score = column_weight * offset + abs(row - ideal_row) / max(self.rows, 1)
+            if best is None or score < best[2]:
+                best = (row, column, score)
+        return best
+
+    @staticmethod
+    def _nearest_bits(mask, position):
+        split = int(position) + 1
+        left = mask & ((1 << split) - 1)
+        right = mask >> split << split
+        if left:
+            yield left.bit_length() - 1
+        if right:
+            yield (right & -right).bit_length() - 1
+
+
+def active_holds(showtime, exclude_user=None):
+    holds = SeatHold.objects.filter(showtime=showtime, expires_at__gt=timezone.now())
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    return holds
+
+
+def booked_seats(showtime):
+    seats = []
+    for seats_json in Booking.objects.filter(
+        showtime=showtime, status__in=SOLD_STATUSES
+    ).values_list('seats_json', flat=True):
+        seats.extend(seats_json)
+    return seats
+
+
+def held_seats(showtime, exclude_user=None):
+    seats = []
+    for seats_json in active_holds(showtime, exclude_user).values_list('seats_json', flat=True):
+        seats.extend(seats_json)
+    return seats
+
+
+def occupancy_grid(showtime, exclude_user=None):
+    grid = HallGrid(showtime.hall.layout_json)
+    grid.mark(booked_seats(showtime))
+    grid.mark(held_seats(showtime, exclude_user))
+    return grid
+
+
+def claim_seats(showtime, seats, user=None):
+    """
+    Lock the showtime row and check that ``seats`` are neither booked nor
+    held by anyone but ``user``; raises SeatsUnavailable otherwise. Call it
+    in the transaction that then books or holds the seats: concurrent
+    claims on the showtime wait for the lock, so two of them can't both
+    pass the check.
+    """
+    list(Showtime.objects.select_for_update().filter(pk=showtime.pk).values_list('pk'))
+    taken = {seat_position(seat) for seat in booked_seats(showtime) + held_seats(showtime, exclude_user=user)}
+    unavailable = [seat for seat in seats if seat_position(seat) in taken]
+    if unavailable:
+        raise SeatsUnavailable(unavailable)
+
+
+def hold_seats(showtime, user, seats):
+    """
+    Hold seats for a user for SEAT_HOLD_MINUTES, replacing any hold the user
+    already has on this showtime. Raises SeatsUnavailable if someone else
+    took any of them first.
+    """
+    with transaction.atomic():
+        claim_seats(showtime, seats, user)
+        delete_holds(SeatHold.objects.filter(showtime=showtime, user=user))
+        hold = SeatHold.objects.create(
+            showtime=showtime,
+            user=user,
+            seats_json=seats,
+            expires_at=timezone.now() + timedelta(minutes=getattr(settings, 'SEAT_HOLD_MINUTES', 10)),
+        )
+        adjust_counters(showtime.id, held=len(seats))
+    return hold
@@ -1,9 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import (
     Movie, Hall, Showtime, Snack, 
-    Booking, SnackOrder, News, Gallery
+    Booking, SnackOrder, News, Gallery, SeatHold
 )
+from .scheduling import detect_conflicts
+from . import outbox
+from .availability import adjust_counters, delete_holds
+from .inventory import reserve_snacks, set_stock
+from .seating import SeatsUnavailable, claim_seats
+from .tickets import sign_ticket
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,10 +41,40 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
+class UpcomingShowtimeSerializer(serializers.ModelSerializer):
+    """A showtime embedded in a movie card (see MovieViewSet)."""
+    hall_name = serializers.CharField(source='hall.name', read_only=True)
+    seats_available = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Showtime
+        fields = ['id', 'datetime', 'language', 'price', 'hall_name', 'seats_available']
+    
+    def get_seats_available(self, obj):
+        return max(obj.hall.capacity - obj.seats_sold - obj.seats_held, 0)
+
 class MovieSerializer(serializers.ModelSerializer):
+    """
+    ``similar_movies`` (stored on the row, see cinema.recommendations) is
+    only included when the context has ``include_similar``; the prefetched
+    ``showtimes`` when it has ``include_showtimes``.
+    """
     class Meta:
         model = Movie
         fields = '__all__'
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('include_similar'):
+            fields.pop('similar_movies', None)
+        if self.context.get('include_showtimes'):
+            fields['showtimes'] = UpcomingShowtimeSerializer(source='upcoming_showtimes', many=True, read_only=True)
+        return fields
+
+class MovieSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Movie
+        fields = ['id', 'title_kg', 'title_ru', 'genre', 'language', 'duration', 'poster', 'release_date']
 
 class HallSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,19 +85,68 @@ class ShowtimeSerializer(serializers.ModelSerializer):
     movie_title_kg = serializers.CharField(source='movie.title_kg', read_only=True)
     movie_title_ru = serializers.CharField(source='movie.title_ru', read_only=True)
     hall_name = serializers.CharField(source='hall.name', read_only=True)
+    seats_available = serializers.SerializerMethodField()
     
     class Meta:
         model = Showtime
         fields = '__all__'
+        read_only_fields = ['seats_sold', 'seats_held']
         extra_kwargs = {
             'movie': {'write_only': True},
             'hall': {'write_only': True}
         }
+    
+    def get_seats_available(self, obj):
+        return max(obj.hall.capacity - obj.seats_sold - obj.seats_held, 0)
+    
+    def validate(self, data):
+        # Bulk imports check the whole batch at once instead (see ShowtimeViewSet.bulk)
+        if not self.context.get('check_conflicts', True):
+            return data
+        
+        candidate = {
+            'movie': data.get('movie', getattr(self.instance, 'movie', None)),
+            'hall': data.get('hall', getattr(self.instance, 'hall', None)),
+            'datetime': data.get('datetime', getattr(self.instance, 'datetime', None)),
+        }
+        exclude_ids = [self.instance.id] if self.instance else []
+        conflicts = detect_conflicts([candidate], exclude_ids=exclude_ids)
+        if conflicts:
+            raise serializers.ValidationError({
+                'conflicts': [
+                    "Hall is busy until {end} with showtime {id}.".format(
+                        end=c['conflicts_with']['end'].isoformat(),
+                        id=c['conflicts_with']['id'],
+                    )
+                    for c in conflicts
+                ]
+            })
+        return data
 
 class SnackSerializer(serializers.ModelSerializer):
+    # Setting a stock starts tracking it; null stops tracking (see cinema.inventory)
+    stock = serializers.IntegerField(write_only=True, required=False, allow_null=True, min_value=0)
+    
     class Meta:
         model = Snack
         fields = '__all__'
+        read_only_fields = ['track_stock']
+    
+    def create(self, validated_data):
+        has_stock = 'stock' in validated_data
+        stock = validated_data.pop('stock', None)
+        snack = super().create(validated_data)
+        if has_stock:
+            set_stock(snack, stock)
+        return snack
+    
+    def update(self, instance, validated_data):
+        has_stock = 'stock' in validated_data
+        stock = validated_data.pop('stock', None)
+        snack = super().update(instance, validated_data)
+        if has_stock:
+            set_stock(snack, stock)
+        return snack
 
 class SnackOrderSerializer(serializers.ModelSerializer):
     snack_name_kg = serializers.CharField(source='snack.name_kg', read_only=True)
@@ -71,7 +157,9 @@ class SnackOrderSerializer(serializers.ModelSerializer):
         model = SnackOrder
         fields = '__all__'
         extra_kwargs = {
-            'booking': {'write_only': True}
+            # Nested in BookingCreateSerializer, which sets both
+            'booking': {'write_only': True, 'required': False},
+            'subtotal': {'required': False},
         }
     
     def create(self, validated_data):
@@ -87,11 +175,21 @@ class BookingSerializer(serializers.ModelSerializer):
     movie_title_ru = serializers.CharField(source='showtime.movie.title_ru', read_only=True)
     datetime = serializers.DateTimeField(source='showtime.datetime', read_only=True)
     hall_name = serializers.CharField(source='showtime.hall.name', read_only=True)
+    ticket = serializers.SerializerMethodField()
     
     class Meta:
         model = Booking
         fields = '__all__'
-        read_only_fields = ['grand_total', 'status', 'qr_code']
+        # Seats, showtime and status only change through booking creation,
+        # cancellation and deletion, which keep the showtime counters in step
+        read_only_fields = [
+            'user', 'showtime', 'seats_json', 'ticket_total', 'snack_total', 'grand_total',
+            'status', 'qr_code', 'reminder_sent_at',
+        ]
+    
+    def get_ticket(self, obj):
+        # Signed payload to encode in the ticket QR code
+        return sign_ticket(obj)
     
     def create(self, validated_data):
         # Calculate ticket_total based on showtime price and number of seats
@@ -104,6 +202,22 @@ class BookingSerializer(serializers.ModelSerializer):
         
         return super().create(validated_data)
 
+class BookingHistorySerializer(serializers.Serializer):
+    # Rows from cinema.archive.booking_history (live and archived bookings)
+    id = serializers.UUIDField()
+    showtime = serializers.UUIDField(source='showtime_id')
+    movie_title_kg = serializers.CharField()
+    movie_title_ru = serializers.CharField()
+    datetime = serializers.DateTimeField()
+    hall_name = serializers.CharField()
+    seats_json = serializers.JSONField()
+    snack_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    ticket_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    grand_total = serializers.DecimalField(max_digits=10, decimal_places=2)
+    status = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    archived = serializers.BooleanField()
+
 class BookingCreateSerializer(serializers.ModelSerializer):
     snack_orders = SnackOrderSerializer(many=True, write_only=True, required=False)
     
@@ -131,13 +245,39 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         # Set grand_total
         validated_data['grand_total'] = validated_data['ticket_total'] + validated_data.get('snack_total', 0)
         
-        # Create booking
-        booking = Booking.objects.create(**validated_data)
-        
-        # Create snack orders
-        for snack_order_data in snack_orders_data:
-            snack_order_data['booking'] = booking
-            SnackOrder.objects.create(**snack_order_data)
+        with transaction.atomic():
+            # Seats must not be booked already or held by someone else;
+            # checked under the showtime's row lock so that concurrent
+            # checkouts can't both take them
+            try:
+                claim_seats(showtime, seats, user=validated_data.get('user'))
+            except SeatsUnavailable:
+                raise serializers.ValidationError({'seats_json': "Some of the selected seats are no longer available."})
+            
+            # Create booking
+            booking = Booking.objects.create(**validated_data)
+            adjust_counters(showtime.id, sold=len(seats))
+            
+            # Create snack orders
+            for snack_order_data in snack_orders_data:
+                snack_order_data['booking'] = booking
+                SnackOrder.objects.create(**snack_order_data)
+            
+            short = reserve_snacks(
+                (data['snack'], data.get('quantity', 1)) for data in snack_orders_data
+            )
+            if short:
+                # Raising inside the atomic block rolls back the partial reservation
+                raise serializers.ValidationError({'snack_orders': "Some of the selected snacks are sold out."})
+            
+            # The seats are booked now; the checkout hold is no longer needed
+            delete_holds(SeatHold.objects.filter(showtime=booking.showtime, user=booking.user))
+            
+            outbox.publish('booking.created', 'booking', booking.id, {
+                'showtime': str(showtime.id),
+                'user': booking.user_id,
+                'seats': len(seats),
+            })
         
         return booking
 
@@ -151,6 +291,52 @@ class GallerySerializer(serializers.ModelSerializer):
         model = Gallery
         fields = '__all__'
 
+class BestSeatsSerializer(serializers.Serializer):
+    party_size = serializers.IntegerField(min_value=1, max_value=20)
+    row_from = serializers.IntegerField(min_value=1, required=False)
+    row_to = serializers.IntegerField(min_value=1, required=False)
+    centre = serializers.BooleanField(default=True)
+    seat_type = serializers.CharField(required=False)
+    hold = serializers.BooleanField(default=False)
+
+class CheckInSerializer(serializers.Serializer):
+    tickets = serializers.ListField(child=serializers.CharField(), allow_empty=False, max_length=1000)
+    showtime = serializers.UUIDField(required=False)
+
+class MovieImportSerializer(serializers.Serializer):
+    """One movie row of a catalog import; ``poster`` is a path in the bundle."""
+    title_kg = serializers.CharField(max_length=255)
+    title_ru = serializers.CharField(max_length=255)
+    synopsis_kg = serializers.CharField()
+    synopsis_ru = serializers.CharField()
+    trailer = serializers.URLField()
+    genre = serializers.ChoiceField(choices=Movie.GENRE_CHOICES)
+    language = serializers.ChoiceField(choices=Movie.LANGUAGE_CHOICES)
+    duration = serializers.IntegerField(min_value=1)
+    release_date = serializers.DateField()
+    is_showing = serializers.BooleanField(default=True)
+    poster = serializers.CharField(required=False, allow_blank=True)
+
+class SnackImportSerializer(serializers.Serializer):
+    """One snack row of a catalog import; ``image`` is a path in the bundle."""
+    name_kg = serializers.CharField(max_length=100)
+    name_ru = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    available = serializers.BooleanField(default=True)
+    image = serializers.CharField(required=False, allow_blank=True)
+
+class ShowtimeImportSerializer(serializers.Serializer):
+    """One showtime row of a catalog import; movie and hall are referenced by title_ru and name."""
+    movie = serializers.CharField(max_length=255)
+    hall = serializers.CharField(max_length=100)
+    datetime = serializers.DateTimeField()
+    language = serializers.ChoiceField(choices=Showtime.LANGUAGE_CHOICES)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+
+class CatalogImportSerializer(serializers.Serializer):
+    bundle = serializers.FileField(help_text="Zip with movies/snacks/showtimes .csv or .json files and images")
+    dry_run = serializers.BooleanField(default=False)
+
 class PasswordResetSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
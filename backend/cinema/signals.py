@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from . import outbox
+from .models import Movie, Hall, Showtime, Snack, News, Gallery, Tombstone
+from .recommendations import fill_fallback
+from .typeahead import title_index
+
+# Catalog models whose changes are published to the outbox
+CATALOG_MODELS = [Movie, Hall, Showtime, Snack, News, Gallery]
+
+
+def publish_catalog_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    name = sender._meta.model_name
+    outbox.publish(f"{name}.{'created' if created else 'updated'}", name, instance.pk)
+
+
+def publish_catalog_delete(sender, instance, **kwargs):
+    name = sender._meta.model_name
+    outbox.publish(f'{name}.deleted', name, instance.pk)
+
+
+def record_tombstone(sender, instance, **kwargs):
+    # Lets delta-sync clients (cinema.sync) learn about the deletion
+    Tombstone.objects.create(model=sender._meta.model_name, object_id=str(instance.pk))
+
+
+def update_title_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: title_index.update(instance))
+
+
+def add_similar_fallback(sender, instance, created, raw=False, **kwargs):
+    # New titles have no bookings yet; show same-genre movies until the nightly job
+    if created and not raw and not instance.similar_movies:
+        fill_fallback(instance)
+
+
+def remove_from_title_index(sender, instance, **kwargs):
+    movie_id = instance.pk
+    transaction.on_commit(lambda: title_index.remove(movie_id))
+
+
+# Connected per model: a receiver for every sender would also disable
+# fast deletes of bookings and snack orders
+for model in CATALOG_MODELS:
+    post_save.connect(publish_catalog_save, sender=model, dispatch_uid=f'outbox-save-{model._meta.model_name}')
+    post_delete.connect(publish_catalog_delete, sender=model, dispatch_uid=f'outbox-delete-{model._meta.model_name}')
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone-{model._meta.model_name}')
+
+post_save.connect(update_title_index, sender=Movie, dispatch_uid='typeahead-save')
+post_delete.connect(remove_from_title_index, sender=Movie, dispatch_uid='typeahead-delete')
+
+post_save.connect(add_similar_fallback, sender=Movie, dispatch_uid='similar-movies-fallback')
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 12
+HASH_SUFFIX_RE = re.compile(r'\.[0-9a-f]{%d}$' % HASH_LENGTH)
+
+
+def is_hashed_name(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return bool(HASH_SUFFIX_RE.search(stem))
+
+
+def content_hash(content):
+    sha = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()[:HASH_LENGTH]
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Media storage that puts a hash of the file's content in its name, e.g.
+    ``movie_posters/poster.3f2a9c1b7d4e.jpg``.
+
+    A URL then always refers to the same bytes, so it can be cached forever,
+    and uploading identical content twice reuses the stored file.
+    """
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        stem, ext = os.path.splitext(filename)
+        stem = HASH_SUFFIX_RE.sub('', stem)
+        hashed = os.path.join(directory, f'{stem}.{content_hash(content)}{ext}')
+        if self.exists(hashed):
+            return hashed
+        return super()._save(hashed, content)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is picked from the content in _save, so only
+        # hashed names (a concurrent save of the same bytes) need the usual
+        # collision handling
+        if not is_hashed_name(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
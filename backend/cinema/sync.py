@@ -0,0 +1,136 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+from django.utils import timezone
+
+from .inventory import on_sale
+from .models import Movie, Showtime, Snack, News, Gallery, Tombstone
+from .serializers import (
+    MovieSerializer, ShowtimeSerializer, SnackSerializer, NewsSerializer, GallerySerializer
+)
+
+
+class SyncSource:
+    """
+    How one model is synced: the indexed timestamp that moves when a row
+    changes, and which rows clients may see. Changed rows that are not (or
+    no longer) visible are sent to clients as deletions, and so are rows
+    matching ``expired(since, now)``: those that dropped out of sight with
+    the passing of time rather than by being changed.
+    """
+
+    def __init__(self, model, serializer_class, changed_field='updated_at', visible=None,
+                 expired=None, select_related=()):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.changed_field = changed_field
+        self.visible = visible
+        self.expired = expired
+        self.select_related = select_related
+
+    @property
+    def name(self):
+        return self.model._meta.model_name
+
+    def _visibility(self, now):
+        if self.visible is None:
+            return Value(True, output_field=BooleanField())
+        return ExpressionWrapper(self.visible(now), output_field=BooleanField())
+
+    def changes(self, since, now, context):
+        """
+        Serialized visible rows changed since ``since`` (all visible rows when
+        ``since`` is None) and the ids of changed rows that are hidden, from
+        one range scan on the changed_field index.
+        """
+        queryset = self.model.objects.select_related(*self.select_related)
+        if since is None:
+            if self.visible is not None:
+                queryset = queryset.filter(self.visible(now))
+            return self.serializer_class(queryset, many=True, context=context).data, []
+
+        changed = queryset.filter(**{f'{self.changed_field}__gte': since}).annotate(
+            sync_visible=self._visibility(now)
+        )
+        updated, hidden = [], []
+        for row in changed:
+            (updated if row.sync_visible else hidden).append(row)
+        hidden = [str(row.pk) for row in hidden]
+        if self.expired is not None:
+            hidden += [
+                str(pk) for pk in self.model.objects.filter(self.expired(since, now)).values_list('pk', flat=True)
+            ]
+        return (
+            self.serializer_class(updated, many=True, context=context).data,
+            list(dict.fromkeys(hidden)),
+        )
+
+
+SOURCES = {
+    'movies': SyncSource(Movie, MovieSerializer),
+    'showtimes': SyncSource(
+        Showtime, ShowtimeSerializer,
+        visible=lambda now: Q(datetime__gte=now),
+        # Started since the last sync: gone from the schedule without a change
+        expired=lambda since, now: Q(datetime__gte=since, datetime__lt=now),
+        select_related=('movie', 'hall'),
+    ),
+    # Stock changes that move a snack on or off sale touch its updated_at
+    'snacks': SyncSource(Snack, SnackSerializer, visible=lambda now: on_sale()),
+    'news': SyncSource(News, NewsSerializer, visible=lambda now: Q(published=True)),
+    # Gallery items are only ever added and removed
+    'gallery': SyncSource(Gallery, GallerySerializer, changed_field='created_at'),
+}
+
+
+def tombstone_horizon(now):
+    # Deletions older than this have been purged, so older cursors can't be served
+    return now - timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def changes_since(since=None, sources=None, context=None):
+    """
+    Collect catalog changes for a delta-sync client.
+
+    Returns ``{'cursor', 'reset', 'changes'}`` where ``changes`` maps each
+    source to ``{'updated': [...], 'deleted': [ids]}``. Without ``since``, or
+    when ``since`` predates the kept tombstones, ``reset`` is true and
+    ``updated`` holds the full visible catalog: clients replace their copy.
+
+    The new cursor trails the current time by SYNC_CURSOR_LAG_SECONDS, so
+    rows written by transactions that were still running during this sync
+    are picked up next time; clients must treat rows as upserts.
+    """
+    now = timezone.now()
+    names = list(sources or SOURCES)
+    reset = since is None or since < tombstone_horizon(now)
+    if reset:
+        since = None
+
+    deleted = defaultdict(list)
+    if since is not None:
+        models = {SOURCES[name].name: name for name in names}
+        for model, object_id in Tombstone.objects.filter(
+            model__in=list(models), deleted_at__gte=since
+        ).values_list('model', 'object_id'):
+            deleted[models[model]].append(object_id)
+
+    changes = {}
+    for name in names:
+        updated, hidden = SOURCES[name].changes(since, now, context or {})
+        changes[name] = {'updated': updated, 'deleted': deleted[name] + hidden}
+
+    lag = timedelta(seconds=getattr(settings, 'SYNC_CURSOR_LAG_SECONDS', 5))
+    cursor = now - lag if since is None else max(now - lag, since)
+    # 'Z' rather than '+00:00' keeps the cursor safe to paste into a query string
+    return {'cursor': cursor.isoformat().replace('+00:00', 'Z'), 'reset': reset, 'changes': changes}
+
+
+def purge_tombstones(older_than=None):
+    """Delete tombstones past the retention period. Returns the number deleted."""
+    if older_than is None:
+        older_than = tombstone_horizon(timezone.now())
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=older_than).delete()
+    return deleted
@@ -1,3 +1,1281 @@
-from django.test import TestCase
+import difflib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.contrib.auth.hashers import make_password
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from cinema_project.database import database_config
+
+from . import hashers, outbox, warmup
+from .hashers import PasswordHashingBusy
+from .admin import EstimatedCountPaginator
+from .archive import archive_showtimes, restore_showtimes
+from .availability import cancel_bookings, reconcile_counters
+from .benchmark import concurrent_booking_inserts, scratch_sqlite
+from .catalog_import import import_catalog
+from .checks import waiting_room_cache
+from .inventory import _take, reserve_snacks, set_stock
+from .models import Movie, Hall, Showtime, Snack, SnackStock, Booking, SnackOrder, News, Gallery, OutboxEvent, Tombstone
+from .lifecycle import run_booking_lifecycle
+from .querylog import fingerprint, redact, slow_query_logging, summarize
+from .reminders import send_reminders
+from .recommendations import compute_similar_movies, fill_fallback
+from .scheduling import detect_conflicts, filter_conflicts
+from .seating import HallGrid, SeatsUnavailable, hold_seats
+from .sync import changes_since
+from .tickets import CheckInRegistry, sign_ticket
+from .typeahead import title_index
+from .waiting_room import PASS_HEADER, open_room
+from .warmup import warm_up
+
+# Wall-clock budgets depend on the machine, so they are only checked on
+# request (PERF_BUDGET_MS=1), scaled by PERF_BUDGET_SCALE on slow machines;
+# query budgets are always checked
+TIME_BUDGETS = os.environ.get('PERF_BUDGET_MS') == '1'
+BUDGET_SCALE = float(os.environ.get('PERF_BUDGET_SCALE', '1'))
+
+
+def sql_diff(queries):
+    """
+    Diff "each statement once" against what was executed, with repeat
+    counts: the changed lines are the repeated statements, which is what
+    an N+1 regression looks like. All executed SQL follows the diff.
+    """
+    counts = Counter(fingerprint(query['sql']) for query in queries)
+    diff = difflib.unified_diff(
+        [f'1x {statement}' for statement in counts],
+        [f'{count}x {statement}' for statement, count in counts.items()],
+        'each statement once', 'executed', lineterm='', n=0,
+    )
+    executed = [f'{number}. {query["sql"]}' for number, query in enumerate(queries, 1)]
+    return '\n'.join(list(diff) + ['', 'Executed SQL:'] + executed)
+
+
+def create_movie(title, genre='drama', duration=90, **fields):
+    return Movie.objects.create(
+        title_kg=title, title_ru=title, synopsis_kg='Синопсис', synopsis_ru='Синопсис',
+        trailer='https://example.com/trailer', genre=genre, language='kg', duration=duration,
+        poster='movie_posters/poster.jpg', release_date=date(2024, 1, 1), **fields
+    )
+
+
+def create_hall(name='Hall 1'):
+    return Hall.objects.create(
+        name=name, capacity=120, layout_json={'rows': 10, 'seatsPerRow': 12, 'type': 'standard'}
+    )
+
+
+def create_showtime(movie, hall, start):
+    return Showtime.objects.create(movie=movie, hall=hall, datetime=start, language='kg', price=Decimal('300'))
+
+
+def create_snack(name, available=True):
+    return Snack.objects.create(
+        name_kg=name, name_ru=name, price=Decimal('100'), image='snack_images/snack.jpg', available=available
+    )
+
+
+def create_booking(user, showtime, *seats, status='confirmed'):
+    """A booking of ``seats`` given as ``(row, number)``; counters are left alone."""
+    total = Decimal('300') * len(seats)
+    return Booking.objects.create(
+        user=user, showtime=showtime, seats_json=[{'row': row, 'number': number} for row, number in seats],
+        ticket_total=total, grand_total=total, status=status,
+    )
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    API tests with an empty cache and a DRF client, and query budgets for
+    the routes they call. Each test class seeds only the rows it needs.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertWithinBudget(self, method, url, max_queries, max_ms=None, data=None, user=None, status_code=200):
+        """
+        Request ``url`` and fail if it runs more than ``max_queries`` queries
+        or, with PERF_BUDGET_MS=1, takes longer than ``max_ms`` (scaled by
+        PERF_BUDGET_SCALE). On a query-count failure the message shows the
+        executed SQL as a diff against its distinct statements.
+        """
+        if user is not None:
+            self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data, format='json')
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.assertEqual(response.status_code, status_code, getattr(response, 'data', None))
+        if len(queries) > max_queries:
+            self.fail(
+                f"{method.upper()} {url} ran {len(queries)} queries, budget is {max_queries}:\n"
+                f"{sql_diff(queries.captured_queries)}"
+            )
+        if TIME_BUDGETS and max_ms is not None:
+            budget_ms = max_ms * BUDGET_SCALE
+            self.assertLessEqual(
+                elapsed_ms, budget_ms,
+                f"{method.upper()} {url} took {elapsed_ms:.0f} ms, budget is {budget_ms:.0f} ms"
+            )
+        return response
+
+
+class PerformanceBudgetTestCase(QueryBudgetTestCase):
+    """
+    Routes measured against a catalog of realistic size: 40 movies, 4 halls,
+    two weeks of showtimes, ~1000 bookings, news and gallery items.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'pass')
+        others = User.objects.bulk_create(
+            [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(60)]
+        )
+
+        cls.movies = Movie.objects.bulk_create([
+            Movie(
+                title_kg=f'Кино {i}', title_ru=f'Фильм {i}',
+                synopsis_kg='Синопсис', synopsis_ru='Синопсис',
+                trailer='https://example.com/trailer', genre=Movie.GENRE_CHOICES[i % 10][0],
+                language=Movie.LANGUAGE_CHOICES[i % 4][0], duration=90 + i % 40,
+                poster=f'movie_posters/{i}.jpg', release_date=date(2024, 1, 1) + timedelta(days=i),
+                is_showing=i < 30,
+            )
+            for i in range(40)
+        ])
+        cls.halls = Hall.objects.bulk_create([
+            Hall(name=f'Hall {i}', capacity=120, layout_json={'rows': 10, 'seatsPerRow': 12, 'type': 'standard'})
+            for i in range(4)
+        ])
+
+        cls.day = timezone.localdate() + timedelta(days=1)
+        showtimes = []
+        for day in range(14):
+            for hall_index, hall in enumerate(cls.halls):
+                for slot in range(5):
+                    start = timezone.make_aware(
+                        datetime.combine(cls.day + timedelta(days=day), datetime.min.time())
+                    ) + timedelta(hours=10 + slot * 3)
+                    showtimes.append(Showtime(
+                        movie=cls.movies[(day * 20 + hall_index * 5 + slot) % 30], hall=hall,
+                        datetime=start, language='kg', price=Decimal('300'),
+                    ))
+        cls.showtimes = Showtime.objects.bulk_create(showtimes)
+        cls.showtime = cls.showtimes[0]
+
+        cls.snacks = Snack.objects.bulk_create([
+            Snack(name_kg=f'Закуска {i}', name_ru=f'Закуска {i}', price=Decimal('100') + i,
+                  image=f'snack_images/{i}.jpg', available=i < 10)
+            for i in range(12)
+        ])
+
+        bookings = []
+        for index in range(1000):
+            showtime = cls.showtimes[index % 60]
+            owner = cls.user if index % 40 == 0 else others[index % 60]
+            bookings.append(Booking(
+                user=owner, showtime=showtime,
+                seats_json=[{'row': 'ABCDEFGHIJ'[index // 60 % 10], 'number': index // 600 + 1}],
+                ticket_total=Decimal('300'), snack_total=Decimal('0'), grand_total=Decimal('300'),
+                status='confirmed',
+            ))
+        bookings = Booking.objects.bulk_create(bookings)
+        SnackOrder.objects.bulk_create([
+            SnackOrder(booking=booking, snack=cls.snacks[i % 10], quantity=1, subtotal=Decimal('100'))
+            for booking in bookings if booking.user_id == cls.user.id
+            for i in range(2)
+        ])
+
+        News.objects.bulk_create([
+            News(title_kg=f'Жаңылык {i}', title_ru=f'Новость {i}', content_kg='Текст', content_ru='Текст',
+                 image=f'news_images/{i}.jpg', published=i < 25)
+            for i in range(30)
+        ])
+        Gallery.objects.bulk_create([
+            Gallery(image_url=f'gallery/{i}.jpg', caption_kg=f'Сүрөт {i}', caption_ru=f'Фото {i}')
+            for i in range(40)
+        ])
+
+
+class CatalogRouteBudgetTests(PerformanceBudgetTestCase):
+
+    def test_movie_list(self):
+        response = self.assertWithinBudget('get', '/api/movies/', max_queries=1, max_ms=150)
+        self.assertEqual(len(response.data), 40)
+
+    def test_movie_list_showing(self):
+        response = self.assertWithinBudget('get', '/api/movies/?showing=true', max_queries=1, max_ms=150)
+        self.assertEqual(len(response.data), 30)
+
+    def test_movie_detail(self):
+        self.assertWithinBudget('get', f'/api/movies/{self.movies[0].id}/', max_queries=1, max_ms=50)
+
+    def test_movie_list_with_showtimes(self):
+        response = self.assertWithinBudget(
+            'get', '/api/movies/?showing=true&include=showtimes&showtimes=3', max_queries=2
+        )
+        self.assertEqual(len(response.data), 30)
+        for movie in response.data:
+            expected = Showtime.objects.filter(movie_id=movie['id'], datetime__gte=timezone.now())[:3]
+            self.assertEqual([showtime['id'] for showtime in movie['showtimes']], [str(s.id) for s in expected])
+
+        response = self.assertWithinBudget(
+            'get', f'/api/movies/?include=showtimes&showtime_date={self.day.isoformat()}&showtime_language=kg',
+            max_queries=2,
+        )
+        self.assertEqual(sum(len(movie['showtimes']) for movie in response.data), 20)
+        self.assertEqual(self.client.get('/api/movies/?include=showtimes&showtime_date=soon').status_code, 400)
+
+    def test_movie_typeahead(self):
+        title_index.build()
+        response = self.assertWithinBudget('get', '/api/movies/typeahead/?q=film 1', max_queries=0)
+        self.assertEqual(response.data[0]['title_ru'], 'Фильм 1')
+        self.assertEqual(len(response.data), 8)
+
+    @override_settings(TYPEAHEAD_CHECK_SECONDS=0)
+    def test_typeahead_sees_changes_from_other_processes(self):
+        title_index.build()
+        # update() sends no signals, like a write made by another worker
+        Movie.objects.filter(pk=self.movies[1].pk).update(title_ru='Зеркало', updated_at=timezone.now())
+        self.assertEqual([movie['title_ru'] for movie in title_index.search('zerk')], ['Зеркало'])
+        Movie.objects.filter(pk=self.movies[1].pk).delete()
+        self.assertEqual(title_index.search('zerk'), [])
+
+    def test_showtime_list_by_date(self):
+        response = self.assertWithinBudget(
+            'get', f'/api/showtimes/?date={self.day.isoformat()}', max_queries=1, max_ms=150
+        )
+        self.assertEqual(len(response.data), 20)
+
+    def test_upcoming_showtimes(self):
+        response = self.assertWithinBudget('get', '/api/showtimes/', max_queries=1, max_ms=400)
+        self.assertEqual(len(response.data), 280)
+
+    def test_snack_list(self):
+        self.assertWithinBudget('get', '/api/snacks/', max_queries=1, max_ms=50)
+
+    def test_news_list(self):
+        response = self.assertWithinBudget('get', '/api/news/', max_queries=1, max_ms=100)
+        self.assertEqual(len(response.data), 25)
+
+    def test_gallery_list(self):
+        self.assertWithinBudget('get', '/api/gallery/', max_queries=1, max_ms=100)
+
+
+class SchedulingTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.hall = create_hall()
+        cls.movie = create_movie('Кино', duration=90)
+        cls.showtime = create_showtime(cls.movie, cls.hall, cls.at(0, 10))
+
+    @staticmethod
+    def at(days, hours):
+        day = timezone.localdate() + timedelta(days=1 + days)
+        return timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=hours)
+
+    def candidates(self):
+        # A 90-minute movie keeps the hall busy for 105 minutes with the cleaning buffer
+        hall, movie = self.hall, self.movie
+        return [
+            {'movie': movie, 'hall': hall, 'datetime': self.at(0, 11)},  # during the 10:00 showing
+            {'movie': movie, 'hall': hall, 'datetime': self.at(20, 10)},
+            {'movie': movie, 'hall': hall, 'datetime': self.at(20, 11)},  # during the one above
+            {'movie': movie, 'hall': hall, 'datetime': self.at(20, 12.75)},  # right after it
+        ]
+
+    def test_conflicts_within_the_batch_and_with_the_schedule(self):
+        conflicts = detect_conflicts(self.candidates())
+        self.assertEqual([conflict['index'] for conflict in conflicts], [0, 2])
+        self.assertEqual(conflicts[0]['conflicts_with']['id'], self.showtime.id)
+        self.assertEqual(conflicts[1]['conflicts_with']['index'], 1)
+
+        accepted, rejected = filter_conflicts(self.candidates())
+        self.assertEqual([c['datetime'] for c in accepted], [self.at(20, 10), self.at(20, 12.75)])
+        self.assertEqual([c['datetime'] for c in rejected], [self.at(0, 11), self.at(20, 11)])
+
+    def test_bulk_create_is_all_or_nothing(self):
+        payload = [
+            {'movie': c['movie'].id, 'hall': c['hall'].id, 'datetime': c['datetime'].isoformat(),
+             'language': 'kg', 'price': '300.00'}
+            for c in self.candidates()
+        ]
+        count = Showtime.objects.count()
+        self.client.force_authenticate(self.admin)
+        response = self.client.post('/api/showtimes/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([conflict['index'] for conflict in response.data['conflicts']], [0, 2])
+        self.assertEqual(Showtime.objects.count(), count)
+
+        response = self.client.post('/api/showtimes/bulk/', [payload[1], payload[3]], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Showtime.objects.count(), count + 2)
+
+
+class BookingRouteBudgetTests(PerformanceBudgetTestCase):
+
+    def test_seat_map(self):
+        response = self.assertWithinBudget(
+            'get', f'/api/showtimes/{self.showtime.id}/seats/', max_queries=3, max_ms=100
+        )
+        self.assertTrue(response.data['booked_seats'])
+
+    def test_booking_bootstrap(self):
+        url = f'/api/showtimes/{self.showtime.id}/bootstrap/'
+        self.assertWithinBudget('get', url, max_queries=5, max_ms=100)
+        # Layout and snacks now come from the cache; only their version is checked
+        self.assertWithinBudget('get', url, max_queries=4, max_ms=100)
+
+    def test_booking_list(self):
+        response = self.assertWithinBudget('get', '/api/bookings/', max_queries=2, max_ms=150, user=self.user)
+        self.assertEqual(len(response.data), 25)
+        self.assertEqual(len(response.data[0]['snack_orders']), 2)
+
+    def test_booking_create(self):
+        self.assertWithinBudget(
+            'post', '/api/bookings/', max_queries=12, max_ms=150, user=self.user, status_code=201,
+            data={
+                'showtime': str(self.showtimes[100].id),
+                'seats_json': [{'row': 'E', 'number': 5}, {'row': 'E', 'number': 6}],
+                'ticket_total': '600.00',
+            },
+        )
+
+    def test_booking_create_with_idempotency_key(self):
+        self.client.force_authenticate(self.user)
+        data = {
+            'showtime': str(self.showtimes[100].id),
+            'seats_json': [{'row': 'E', 'number': 5}], 'ticket_total': '300.00',
+        }
+
+        def post(body, key='checkout-1'):
+            return self.client.post('/api/bookings/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+        first = post(data)
+        self.assertEqual(first.status_code, 201)
+        retry = post(data)
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.filter(showtime=self.showtimes[100]).count(), 1)
+
+        # The same key for another body is refused
+        other = post({**data, 'seats_json': [{'row': 'E', 'number': 6}]})
+        self.assertEqual(other.status_code, 422)
+
+        # A rejected request doesn't use up its key
+        self.assertEqual(post(data, key='checkout-2').status_code, 400)
+        self.assertEqual(post({**data, 'seats_json': [{'row': 'E', 'number': 7}]}, key='checkout-2').status_code, 201)
+
+    def test_booking_update_cannot_move_seats(self):
+        booking = Booking.objects.filter(user=self.user, showtime=self.showtime).first()
+        sold = Showtime.objects.get(pk=self.showtime.pk).seats_sold
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/api/bookings/{booking.pk}/', {
+            'seats_json': [{'row': 'J', 'number': 1}, {'row': 'J', 'number': 2}],
+            'showtime': str(self.showtimes[1].id), 'status': 'cancelled',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        booking.refresh_from_db()
+        self.assertEqual((booking.showtime_id, booking.status, len(booking.seats_json)), (self.showtime.pk, 'confirmed', 1))
+        self.assertEqual(Showtime.objects.get(pk=self.showtime.pk).seats_sold, sold)
+
+    def test_best_block(self):
+        grid = HallGrid({'rows': 10, 'seatsPerRow': 12, 'rowTypes': {'A': 'vip'}})
+        # Centred in the row two thirds of the way back (G), then the rows next to it
+        self.assertEqual(grid.best_block(4), (6, 4, 0))
+        grid.mark([{'row': 'G', 'number': 6}])
+        self.assertEqual(grid.best_block(4)[:2], (5, 4))
+        self.assertEqual(grid.best_block(4, row_from=8)[:2], (7, 4))
+        self.assertEqual(grid.best_block(4, seat_type='vip')[:2], (0, 4))
+        self.assertEqual(grid.best_block(2, row_from=7, row_to=7)[:2], (6, 6))
+        self.assertIsNone(grid.best_block(13))
+
+    def test_best_seats_skips_other_users_holds(self):
+        url = f'/api/showtimes/{self.showtimes[100].id}/best-seats/'
+        self.client.force_authenticate(self.user)
+        response = self.client.post(url, {'party_size': 4, 'hold': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['seats'], [{'row': 'G', 'number': number} for number in range(5, 9)])
+        self.assertIn('hold', response.data)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(url, {'party_size': 4}, format='json')
+        self.assertEqual(response.data['seats'][0], {'row': 'F', 'number': 5})
+
+    def test_seats_held_by_someone_else_are_rechecked(self):
+        showtime = Showtime.objects.select_related('hall').get(pk=self.showtimes[100].pk)
+        seats = [{'row': 'E', 'number': 5}, {'row': 'E', 'number': 6}]
+        hold_seats(showtime, self.admin, seats)
+
+        # A stale grid suggested the same block: holding it again fails
+        with self.assertRaises(SeatsUnavailable) as raised:
+            hold_seats(showtime, self.user, [{'row': 'E', 'number': 6}, {'row': 'E', 'number': 7}])
+        self.assertEqual(raised.exception.seats, [{'row': 'E', 'number': 6}])
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            '/api/bookings/', {'showtime': str(showtime.id), 'seats_json': seats, 'ticket_total': '600.00'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('seats_json', response.data)
+
+        # The holder can book them, and nobody can hold them afterwards
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            '/api/bookings/', {'showtime': str(showtime.id), 'seats_json': seats, 'ticket_total': '600.00'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        with self.assertRaises(SeatsUnavailable):
+            hold_seats(showtime, self.user, seats)
+        showtime.refresh_from_db()
+        self.assertEqual(showtime.seats_held, 0)
+
+
+    def test_archive_restore_round_trip(self):
+        cutoff = self.showtime.datetime + timedelta(minutes=1)
+        archived_ids = list(Showtime.objects.filter(datetime__lt=cutoff).values_list('id', flat=True))
+        bookings = Booking.objects.filter(showtime_id__in=archived_ids).count()
+        with CaptureQueriesContext(connection) as ctx:
+            moved = archive_showtimes(cutoff)
+        self.assertEqual((moved['showtimes'], moved['bookings']), (len(archived_ids), bookings))
+        self.assertFalse(Showtime.objects.filter(id__in=archived_ids).exists())
+        # Sync and outbox see the showtimes as deleted, recorded per batch
+        # rather than by the per-row delete receivers
+        inserts = Counter(
+            table for query in ctx.captured_queries
+            for table in ('cinema_tombstone', 'cinema_outboxevent')
+            if query['sql'].startswith(f'INSERT INTO "{table}"')
+        )
+        self.assertEqual(inserts, {'cinema_tombstone': 1, 'cinema_outboxevent': 1})
+        self.assertEqual(Tombstone.objects.filter(model='showtime').count(), len(archived_ids))
+        self.assertEqual(
+            OutboxEvent.objects.filter(event_type='showtime.deleted').count(), len(archived_ids)
+        )
+
+        # History pages through live and archived bookings together
+        self.client.force_authenticate(self.user)
+        first = self.client.get('/api/bookings/history/').data
+        self.assertEqual((first['count'], len(first['results'])), (25, 20))
+        rest = self.client.get('/api/bookings/history/', {'page': 2}).data['results']
+        self.assertEqual(len(rest), 5)
+        self.assertTrue(any(row['archived'] for row in first['results'] + rest))
+
+        restore_showtimes(showtime_ids=archived_ids)
+        self.assertEqual(Booking.objects.filter(showtime_id__in=archived_ids).count(), bookings)
+        self.assertFalse(Tombstone.objects.filter(model='showtime').exists())
+        self.assertEqual(SnackOrder.objects.filter(booking__user=self.user).count(), 50)
+        # Restored showtimes get their counters recounted from the bookings
+        self.assertEqual(reconcile_counters(archived_ids), [])
+        showtime = Showtime.objects.get(pk=self.showtime.pk)
+        self.assertEqual(showtime.seats_sold, Booking.objects.filter(showtime=showtime).count())
+
+    def test_export_includes_archived_bookings(self):
+        booking = Booking.objects.filter(user=self.user, showtime=self.showtime).first()
+        archive_showtimes(self.showtime.datetime + timedelta(minutes=1))
+        self.assertFalse(Booking.objects.filter(pk=booking.pk).exists())
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/exports/bookings.ndjson')
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 1000)
+        exported = next(line for line in lines if line['booking_id'] == str(booking.pk))
+        self.assertEqual(len(exported['snacks']), 2)
+
+
+class BookingLifecycleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com')
+        start = timezone.now().replace(microsecond=0)
+        cls.showtime = create_showtime(create_movie('Кино', duration=90), create_hall(), start)
+        cls.running = create_showtime(create_movie('Узун кино', duration=105), create_hall('Hall 2'), start)
+        for number in range(1, 4):
+            create_booking(cls.user, cls.showtime, ('A', number))
+        create_booking(cls.user, cls.running, ('A', 1))
+
+    def test_finished_showtimes_get_final_statuses(self):
+        pending = create_booking(self.user, self.showtime, ('J', 1), ('J', 2), status='pending')
+        reconcile_counters([self.showtime.id], fix=True)
+        self.assertEqual(Showtime.objects.get(pk=self.showtime.pk).seats_sold, 5)
+
+        # The 90-minute showing has ended, the 105-minute one hasn't
+        now = self.showtime.datetime + timedelta(minutes=100)
+        run = run_booking_lifecycle(batch_size=2, now=now)
+        self.assertEqual(run.details, {'confirmed_to_completed': 3, 'pending_to_cancelled': 1})
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'cancelled')
+        self.assertEqual(Booking.objects.filter(showtime=self.showtime, status='completed').count(), 3)
+        self.assertFalse(Booking.objects.filter(showtime=self.running).exclude(status='confirmed').exists())
+        # Cancelling gave the seats back
+        self.assertEqual(Showtime.objects.get(pk=self.showtime.pk).seats_sold, 3)
+
+        self.assertEqual(run_booking_lifecycle(now=now).rows_processed, 0)
+
+
+class SnackStockTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com')
+        cls.showtime = create_showtime(create_movie('Кино'), create_hall(), timezone.now() + timedelta(days=1))
+        cls.snack = create_snack('Попкорн')
+        create_snack('Суу')
+
+    def setUp(self):
+        super().setUp()
+        set_stock(self.snack, 3)
+
+    def book(self, quantity, seat, status_code=201):
+        return self.assertWithinBudget(
+            'post', '/api/bookings/', max_queries=20, user=self.user, status_code=status_code,
+            data={
+                'showtime': str(self.showtime.id),
+                'seats_json': [{'row': 'F', 'number': seat}],
+                'ticket_total': '300.00',
+                'snack_orders': [{'snack': str(self.snack.id), 'quantity': quantity}],
+            },
+        )
+
+    def remaining(self):
+        return sum(SnackStock.objects.filter(snack=self.snack).values_list('remaining', flat=True))
+
+    def test_stock_is_spread_over_shards(self):
+        self.assertEqual(SnackStock.objects.filter(snack=self.snack).count(), 8)
+        self.assertEqual(self.remaining(), 3)
+
+    def test_sold_out_snack_is_rejected_and_hidden(self):
+        bootstrap_url = f'/api/showtimes/{self.showtime.id}/bootstrap/'
+        self.assertIn(str(self.snack.id), [snack['id'] for snack in self.client.get(bootstrap_url).data['snacks']])
+        self.book(2, seat=1)
+        self.assertEqual(self.remaining(), 1)
+
+        response = self.book(2, seat=2, status_code=400)
+        self.assertIn('snack_orders', response.data)
+        # Nothing of the failed booking is kept
+        self.assertEqual(self.remaining(), 1)
+        self.assertFalse(Booking.objects.filter(
+            showtime=self.showtime, seats_json=[{'row': 'F', 'number': 2}]
+        ).exists())
+
+        self.book(1, seat=3)
+        response = self.assertWithinBudget('get', '/api/snacks/', max_queries=1)
+        self.assertNotIn(str(self.snack.id), [snack['id'] for snack in response.data])
+        # The cached booking-screen list moves on too, in every process
+        self.assertNotIn(str(self.snack.id), [snack['id'] for snack in self.client.get(bootstrap_url).data['snacks']])
+
+    def test_partly_drained_shard_gives_what_is_left(self):
+        set_stock(self.snack, 16)
+        shard = SnackStock.objects.filter(snack=self.snack).first()
+        # Read as 5 before a concurrent checkout left 2
+        self.assertEqual(_take(shard.pk, 5, 4), 2)
+        shard.refresh_from_db()
+        self.assertEqual(shard.remaining, 0)
+        self.assertEqual(reserve_snacks([(Snack.objects.get(pk=self.snack.pk), 14)]), [])
+        self.assertEqual(self.remaining(), 0)
+
+    def test_cancelling_releases_stock(self):
+        self.book(3, seat=4)
+        cancel_bookings(Booking.objects.filter(showtime=self.showtime, seats_json=[{'row': 'F', 'number': 4}]))
+        self.assertEqual(self.remaining(), 3)
+        response = self.client.get('/api/snacks/')
+        self.assertIn(str(self.snack.id), [snack['id'] for snack in response.data])
+
+
+class ReminderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.showtime = create_showtime(create_movie('Кино'), create_hall(), timezone.now() + timedelta(days=1))
+        later = create_showtime(cls.showtime.movie, cls.showtime.hall, cls.showtime.datetime + timedelta(hours=3))
+        for number, username in enumerate(('viewer', 'other'), 1):
+            user = User.objects.create_user(username, f'{username}@example.com')
+            create_booking(user, cls.showtime, ('A', number))
+            create_booking(user, later, ('A', number))
+
+    class Sender:
+        def __init__(self, fail=()):
+            self.fail, self.sent = set(fail), []
+
+        def send(self, recipient, bookings):
+            if recipient['username'] in self.fail:
+                raise ConnectionError('SMTP down')
+            self.sent.append((recipient['username'], len(bookings)))
+
+    def remind(self, sender):
+        return send_reminders(lead=timedelta(hours=2), now=self.showtime.datetime - timedelta(hours=1), sender=sender)
+
+    def test_each_booking_is_reminded_once(self):
+        silent = User.objects.create_user('silent', email='')
+        booking = Booking.objects.create(
+            user=silent, showtime=self.showtime, seats_json=[{'row': 'J', 'number': 12}],
+            ticket_total=Decimal('300'), grand_total=Decimal('300'), status='confirmed',
+        )
+        due = Booking.objects.filter(showtime=self.showtime)
+
+        sender = self.Sender(fail={'viewer'})
+        with self.assertLogs('cinema.reminders', 'ERROR'):
+            run = self.remind(sender)
+        self.assertEqual(run.details, {'users': 1, 'failed_users': 1, 'skipped_users': 1})
+        self.assertEqual(sender.sent, [('other', 1)])
+        self.assertNotIn('silent', [username for username, _ in sender.sent])
+        # Only the failed user's bookings are left for the next run
+        self.assertEqual(
+            set(due.filter(reminder_sent_at__isnull=True).values_list('user__username', flat=True)), {'viewer'}
+        )
+        booking.refresh_from_db()
+        self.assertIsNotNone(booking.reminder_sent_at)
+
+        sender = self.Sender()
+        self.remind(sender)
+        self.assertEqual([username for username, _ in sender.sent], ['viewer'])
+        self.remind(sender)
+        self.assertEqual(len(sender.sent), 1)
+
+
+class CheckInTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('viewer', 'viewer@example.com')
+        movie, hall = create_movie('Кино'), create_hall()
+        cls.showtime = create_showtime(movie, hall, timezone.now() + timedelta(minutes=20))
+        cls.other_showtime = create_showtime(movie, hall, timezone.now() + timedelta(hours=5))
+        cls.bookings = [create_booking(user, cls.showtime, ('A', number)) for number in range(1, 4)]
+
+    def test_admits_once_across_processes(self):
+        first, cancelled, other = [sign_ticket(booking) for booking in self.bookings]
+        Booking.objects.filter(pk=self.bookings[1].pk).update(status='cancelled')
+        registry = CheckInRegistry()
+        results = registry.check_in([first, first, cancelled, 'forged'])
+        self.assertEqual([result['status'] for result in results], ['admitted', 'duplicate', 'rejected', 'invalid'])
+        self.assertEqual(Booking.objects.get(pk=self.bookings[0].pk).status, 'completed')
+
+        # Answered from memory in this process, from the database in another
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.check_in([first])[0]['status'], 'duplicate')
+        self.assertEqual(CheckInRegistry().check_in([first])[0]['status'], 'duplicate')
+        self.assertEqual(
+            registry.check_in([other], showtime_id=self.other_showtime.id)[0]['status'], 'wrong_showtime'
+        )
+
+    def test_tickets_only_open_the_door_around_the_showing(self):
+        self.showtime.datetime = timezone.now() + timedelta(hours=3)
+        self.showtime.save()
+        booking = Booking.objects.select_related('showtime').get(pk=self.bookings[0].pk)
+        self.assertEqual(CheckInRegistry().check_in([sign_ticket(booking)])[0]['status'], 'outside_window')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'confirmed')
+
+
+class AdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        hall = create_hall()
+        start = timezone.now() + timedelta(days=1)
+        cls.showtimes = [
+            create_showtime(create_movie(f'Кино {i}'), hall, start + timedelta(hours=3 * i)) for i in range(3)
+        ]
+        snack = create_snack('Попкорн')
+        cls.bookings = []
+        for i in range(6):
+            user = User.objects.create_user(f'user{i}')
+            booking = create_booking(user, cls.showtimes[i % 3], ('A', i + 1), ('A', i + 11))
+            SnackOrder.objects.create(booking=booking, snack=snack, quantity=1, subtotal=Decimal('100'))
+            cls.bookings.append(booking)
+        reconcile_counters(fix=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists_run_a_fixed_number_of_queries(self):
+        # Session, user, the page of rows with their related objects, and the
+        # list filters; no query per row
+        for url, queries in (
+            ('/admin/cinema/booking/', 4),
+            ('/admin/cinema/snackorder/', 4),
+            ('/admin/cinema/showtime/', 5),
+        ):
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_estimated_count_is_exact_outside_postgresql(self):
+        paginator = EstimatedCountPaginator(Booking.objects.order_by('pk'), 2)
+        paginator.estimate_threshold = 0
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 6)
+
+    def run_action(self, action, bookings):
+        return self.client.post('/admin/cinema/booking/', {
+            'action': action, '_selected_action': [str(booking.pk) for booking in bookings],
+        })
+
+    def test_cancel_action_releases_seats(self):
+        self.run_action('cancel_bookings', self.bookings[:2])
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[booking.pk] for booking in self.bookings[:3]], ['cancelled', 'cancelled', 'confirmed'])
+        # Each of the first two showtimes had two bookings of two seats
+        self.assertEqual(
+            list(Showtime.objects.filter(pk__in=[s.pk for s in self.showtimes]).order_by('datetime')
+                 .values_list('seats_sold', flat=True)),
+            [2, 2, 4],
+        )
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_complete_action_is_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.run_action('mark_completed', self.bookings)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "cinema_booking"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Booking.objects.filter(status='completed').count(), 6)
+        self.assertEqual(OutboxEvent.objects.filter(event_type='booking.completed').count(), 6)
+
+
+class MediaTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        os.makedirs(os.path.join(media_root, 'movie_posters'))
+        self.name = 'movie_posters/poster.3f2a9c1b7d4e.jpg'
+        with open(os.path.join(media_root, self.name), 'wb') as poster:
+            poster.write(bytes(range(256)) * 4)
+
+    def test_hashed_files_are_immutable_and_revalidate(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"3f2a9c1b7d4e"')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH='"3f2a9c1b7d4e"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=-4')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+        # Invalid ranges are ignored, unsatisfiable ones refused
+        self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=500-400').status_code, 200)
+        self.assertEqual(self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=2000-').status_code, 416)
+        # A stale If-Range gets the whole file
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+
+class CatalogImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_hall()
+        cls.drama = create_movie('Драма')
+
+    def setUp(self):
+        media_root, self.bundle = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(shutil.rmtree, self.bundle)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = Path(media_root)
+        for name, colour in (('poster.png', 'red'), ('popcorn.png', 'yellow')):
+            Image.new('RGB', (4, 4), colour).save(os.path.join(self.bundle, name))
+
+        movie = {
+            'title_kg': 'Тоолор', 'title_ru': 'Горы', 'synopsis_kg': 'Синопсис', 'synopsis_ru': 'Синопсис',
+            'trailer': 'https://example.com/mountains', 'genre': 'drama', 'language': 'kg',
+            'duration': 110, 'release_date': '2025-03-01', 'poster': 'poster.png',
+        }
+        self.write('movies', [
+            movie,
+            {**movie, 'title_ru': 'Ноль', 'duration': 0},
+            {**movie, 'title_kg': 'Дубль'},
+            {**movie, 'title_ru': 'Без постера', 'poster': ''},
+        ])
+        self.write('snacks', [{'name_kg': 'Попкорн', 'name_ru': 'Попкорн', 'price': '150.00', 'image': 'popcorn.png'}])
+        self.write('showtimes', [{
+            'movie': 'Горы', 'hall': 'Hall 1', 'datetime': '2030-01-01T18:00:00+06:00', 'language': 'kg', 'price': '300',
+        }])
+
+    def write(self, kind, rows):
+        with open(os.path.join(self.bundle, f'{kind}.json'), 'w', encoding='utf-8') as handle:
+            json.dump(rows, handle, ensure_ascii=False)
+
+    def media_files(self):
+        return sorted(str(path.relative_to(self.media_root)) for path in self.media_root.rglob('*') if path.is_file())
+
+    def test_invalid_rows_are_reported_and_the_rest_saved(self):
+        reports = import_catalog(self.bundle)
+        movies = reports['movies']
+        self.assertEqual((movies['created'], movies['updated']), (1, 0))
+        errors = {error['row']: error['errors'] for error in movies['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4])
+        self.assertIn('duration', errors[2])
+        self.assertEqual(errors[3]['non_field_errors'], ['Duplicate of row 1.'])
+        self.assertIn('poster', errors[4])
+        self.assertEqual((reports['snacks']['created'], reports['showtimes']['created']), (1, 1))
+        self.assertTrue(Showtime.objects.filter(movie__title_ru='Горы').exists())
+
+    def test_reimport_updates_by_natural_key(self):
+        import_catalog(self.bundle)
+        self.write('snacks', [{'name_kg': 'Попкорн чоң', 'name_ru': 'Попкорн', 'price': '180.00'}])
+        reports = import_catalog(self.bundle)
+        self.assertEqual((reports['movies']['created'], reports['movies']['updated']), (0, 1))
+        self.assertEqual((reports['snacks']['created'], reports['snacks']['updated']), (0, 1))
+        self.assertEqual((reports['showtimes']['created'], reports['showtimes']['updated']), (0, 1))
+        self.assertEqual(Movie.objects.filter(title_ru='Горы').count(), 1)
+        snack = Snack.objects.get(name_ru='Попкорн')
+        # Rows without an image keep the stored one
+        self.assertEqual((snack.name_kg, snack.price), ('Попкорн чоң', Decimal('180.00')))
+        self.assertTrue(snack.image.name.startswith('snack_images/popcorn.'))
+
+    def test_dry_run_writes_nothing(self):
+        reports = import_catalog(self.bundle, dry_run=True)
+        self.assertEqual(reports['movies']['created'], 1)
+        self.assertFalse(Movie.objects.filter(title_ru='Горы').exists())
+        self.assertFalse(Snack.objects.exists())
+        self.assertEqual(self.media_files(), [])
+
+    def test_images_are_stored_under_hashed_names(self):
+        import_catalog(self.bundle)
+        poster = Movie.objects.get(title_ru='Горы').poster.name
+        self.assertRegex(poster, r'^movie_posters/poster\.[0-9a-f]{12}\.png$')
+        self.assertEqual(self.media_files(), sorted([poster, Snack.objects.get().image.name]))
+
+    def test_new_movies_get_what_the_save_signals_would_give(self):
+        title_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            import_catalog(self.bundle)
+        movie = Movie.objects.get(title_ru='Горы')
+        self.assertEqual([neighbour['id'] for neighbour in movie.similar_movies], [str(self.drama.pk)])
+        self.assertEqual([found['title_ru'] for found in title_index.search('gory')], ['Горы'])
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.delivered = []
+        self.failing = set()
+        saved = {event_type: list(funcs) for event_type, funcs in outbox._handlers.items()}
+        self.addCleanup(lambda: (outbox._handlers.clear(), outbox._handlers.update(saved)))
+        outbox._handlers.clear()
+
+        @outbox.handler('booking.*')
+        def record(event):
+            if event.pk in self.failing:
+                raise RuntimeError('handler down')
+            self.delivered.append(event.pk)
+
+    def publish(self, event_type, aggregate_type, aggregate_id):
+        return outbox.publish(event_type, aggregate_type, aggregate_id).pk
+
+    def test_failures_hold_back_only_their_aggregate(self):
+        first = self.publish('booking.created', 'booking', 1)
+        second = self.publish('booking.cancelled', 'booking', 1)
+        other = self.publish('booking.created', 'booking', 2)
+        same_id = self.publish('booking.created', 'showing', 1)
+        self.failing.add(first)
+
+        # batch_size=1: a batch that only fails doesn't end the drain
+        with self.assertLogs('cinema.outbox', 'ERROR'):
+            self.assertEqual(outbox.drain(batch_size=1), 2)
+        self.assertEqual(self.delivered, [other, same_id])
+        failed = OutboxEvent.objects.get(pk=first)
+        self.assertEqual((failed.status, failed.attempts), ('pending', 1))
+        self.assertGreater(failed.available_at, timezone.now())
+
+        # Once the retry is due and succeeds, the aggregate continues in order
+        self.failing.clear()
+        OutboxEvent.objects.filter(pk=first).update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), 2)
+        self.assertEqual(self.delivered[2:], [first, second])
+
+    def test_events_without_handlers_stay_pending(self):
+        unhandled = self.publish('movie.updated', 'movie', 1)
+        handled = self.publish('booking.created', 'booking', 1)
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(self.delivered, [handled])
+        self.assertEqual(OutboxEvent.objects.get(pk=unhandled).status, 'pending')
+
+    def test_purge_drops_old_delivered_and_unhandled_events(self):
+        delivered = self.publish('booking.created', 'booking', 1)
+        outbox.drain()
+        unhandled = self.publish('movie.updated', 'movie', 1)
+        failing = self.publish('booking.cancelled', 'booking', 1)
+        recent = self.publish('movie.created', 'movie', 2)
+        self.failing.add(failing)
+        with self.assertLogs('cinema.outbox', 'ERROR'):
+            outbox.drain()
+        cutoff = timezone.now()
+        old = cutoff - timedelta(days=2)
+        OutboxEvent.objects.filter(pk__in=[delivered, unhandled, failing]).update(created_at=old)
+        OutboxEvent.objects.filter(pk=delivered).update(processed_at=old)
+
+        self.assertEqual(outbox.purge(cutoff - timedelta(days=1)), 2)
+        # Handled events waiting for a retry and recent unhandled ones stay
+        self.assertEqual(set(OutboxEvent.objects.values_list('pk', flat=True)), {failing, recent})
+
+        outbox.handler('*')(lambda event: None)
+        OutboxEvent.objects.filter(pk=recent).update(created_at=old)
+        self.assertEqual(outbox.purge(cutoff - timedelta(days=1)), 0)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_events_die_after_max_attempts(self):
+        first = self.publish('booking.created', 'booking', 1)
+        second = self.publish('booking.completed', 'booking', 1)
+        self.failing.add(first)
+        with self.assertLogs('cinema.outbox', 'ERROR'):
+            self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(OutboxEvent.objects.get(pk=first).status, 'dead')
+        self.assertEqual(self.delivered, [second])
+
+
+class CatalogSyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        movie, hall = create_movie('Кино'), create_hall()
+        cls.removed_movie = create_movie('Эски кино')
+        start = timezone.now() + timedelta(days=1)
+        cls.showtimes = [create_showtime(movie, hall, start + timedelta(hours=3 * i)) for i in range(3)]
+        cls.snacks = [create_snack('Попкорн'), create_snack('Суу'), create_snack('Чипсы', available=False)]
+
+    def setUp(self):
+        super().setUp()
+        self.since = timezone.now() - timedelta(hours=1)
+        # The fixture was written just now; make it older than the cursor
+        for model in (Movie, Showtime, Snack):
+            model.objects.update(updated_at=self.since - timedelta(hours=1))
+
+    def test_first_sync_is_a_reset(self):
+        data = changes_since(sources=['showtimes', 'snacks'])
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['changes']['showtimes']['updated']), 3)
+        self.assertEqual(len(data['changes']['snacks']['updated']), 2)
+
+    def test_deleted_rows_are_reported_from_tombstones(self):
+        movie_id = self.removed_movie.pk
+        Movie.objects.get(pk=movie_id).delete()
+        data = changes_since(self.since, ['movies'])
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['changes']['movies']['deleted'], [str(movie_id)])
+        # Cursors older than the kept tombstones get a full resync
+        self.assertTrue(changes_since(timezone.now() - timedelta(days=60), ['movies'])['reset'])
+
+    def test_showtimes_that_started_are_deleted(self):
+        # update() leaves updated_at alone: the showtime just passed
+        showtime = self.showtimes[0]
+        Showtime.objects.filter(pk=showtime.pk).update(datetime=timezone.now() - timedelta(minutes=10))
+        Showtime.objects.filter(pk=self.showtimes[1].pk).update(datetime=self.since - timedelta(minutes=10))
+        data = changes_since(self.since, ['showtimes'])
+        self.assertEqual(data['changes']['showtimes']['deleted'], [str(showtime.pk)])
+
+    def test_sold_out_snacks_are_deleted(self):
+        snack = self.snacks[0]
+        set_stock(snack, 1)
+        reserve_snacks([(Snack.objects.get(pk=snack.pk), 1)])
+        data = changes_since(self.since, ['snacks'])
+        self.assertEqual(data['changes']['snacks']['deleted'], [str(snack.pk)])
+        self.assertEqual(data['changes']['snacks']['updated'], [])
+
+
+@override_settings(WAITING_ROOM_ENABLED=True, WAITING_ROOM_SESSIONS=2, WAITING_ROOM_PASS_SECONDS=60)
+class WaitingRoomTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com')
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(1, 4)])
+        movie, hall = create_movie('Кино'), create_hall()
+        start = timezone.now() + timedelta(days=1)
+        cls.showtime = create_showtime(movie, hall, start)
+        cls.other_showtime = create_showtime(movie, hall, start + timedelta(hours=3))
+
+    def setUp(self):
+        super().setUp()
+        open_room(self.showtime.id)
+        self.seats_url = f'/api/showtimes/{self.showtime.id}/seats/'
+        self.room_url = f'/api/showtimes/{self.showtime.id}/waiting-room/'
+
+    def join_as(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(self.room_url).data
+
+    def test_booking_flow_needs_a_pass_while_open(self):
+        response = self.client.get(self.seats_url)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.data['waiting_room'].endswith(self.room_url))
+        self.assertEqual(self.client.post(self.room_url).status_code, 401)
+
+        self.client.force_authenticate(self.user)
+        admitted = self.assertWithinBudget('post', self.room_url, max_queries=0).data
+        self.assertEqual(admitted['status'], 'admitted')
+        response = self.client.get(self.seats_url, HTTP_X_BOOKING_PASS=admitted['pass'])
+        self.assertEqual(response.status_code, 200)
+        # Passes are per showtime and per user
+        other = f'/api/showtimes/{self.other_showtime.id}/seats/'
+        open_room(self.other_showtime.id)
+        self.assertEqual(self.client.get(other, HTTP_X_BOOKING_PASS=admitted['pass']).status_code, 429)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(self.seats_url, HTTP_X_BOOKING_PASS=admitted['pass']).status_code, 429)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.seats_url, HTTP_X_BOOKING_PASS=admitted['pass']).status_code, 429)
+
+    def test_booking_body_that_is_not_an_object_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/bookings/', [{'showtime': self.showtime.id}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/bookings/', 5, format='json').status_code, 400)
+
+    def test_line_is_fifo_at_a_steady_rate(self):
+        first, second, third = User.objects.filter(username__in=['user1', 'user2', 'user3']).order_by('username')
+        self.assertEqual(self.join_as(first)['status'], 'admitted')
+        # One admission every 30 seconds keeps at most two passes valid
+        waiting = self.join_as(second)
+        self.assertEqual((waiting['status'], waiting['position'], waiting['estimated_wait_seconds']), ('waiting', 1, 30))
+        behind = self.join_as(third)
+        self.assertEqual((behind['position'], behind['estimated_wait_seconds']), (2, 60))
+
+        self.client.force_authenticate(second)
+        response = self.client.get(self.room_url, {'token': waiting['token']})
+        self.assertEqual(response.data['status'], 'waiting')
+        response = self.client.get(self.room_url, {'token': waiting['token'] + 'x'})
+        self.assertEqual(response.status_code, 400)
+        # Tokens can't be polled by someone else
+        self.client.force_authenticate(third)
+        self.assertEqual(self.client.get(self.room_url, {'token': waiting['token']}).status_code, 400)
+
+    def test_joining_again_keeps_the_place(self):
+        self.join_as(self.admin)
+        place = self.join_as(self.user)
+        self.assertEqual(self.join_as(self.user)['position'], place['position'])
+        self.assertEqual(self.join_as(User.objects.get(username='user1'))['position'], place['position'] + 1)
+
+    def test_booking_create_is_admission_controlled(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/bookings/', {'showtime': str(self.showtime.id)}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_needs_a_shared_cache(self):
+        self.assertEqual([error.id for error in waiting_room_cache(None)], ['cinema.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(waiting_room_cache(None), [])
+
+
+class PasswordHashingTests(TestCase):
+
+    def test_sign_in_reports_hash_time_and_upgrades_to_scrypt(self):
+        user = User.objects.create_user('legacy', 'legacy@example.com')
+        user.password = make_password('Secret123!', hasher='pbkdf2_sha256')
+        user.save()
+
+        with self.assertLogs('cinema.password_hashing', 'INFO'):
+            response = self.client.post('/api/token/', {'username': 'legacy', 'password': 'Secret123!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('pwhash;dur=', response['Server-Timing'])
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+    def test_stuck_hash_fails_fast(self):
+        release = threading.Event()
+
+        class Stuck:
+            def encode(self, *args):
+                release.wait(5)
+
+        pool = ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+        self.addCleanup(release.set)
+        with override_settings(PASSWORD_HASH_TIMEOUT=0.05), \
+                mock.patch.object(hashers, '_executor', return_value=(pool, threading.BoundedSemaphore(1))), \
+                self.assertLogs('cinema.password_hashing', 'ERROR'):
+            with self.assertRaises(PasswordHashingBusy):
+                hashers.hash_in_pool(Stuck, {}, 'Secret123!', 'salt')
+
+
+class SimilarMoviesTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movies = [
+            create_movie(f'Кино {i}', genre=genre)
+            for i, genre in enumerate(['drama', 'drama', 'comedy', 'drama', 'action', 'drama'])
+        ]
+        hall = create_hall()
+        start = timezone.now() - timedelta(days=1)
+        showtimes = [
+            create_showtime(movie, hall, start + timedelta(hours=3 * i)) for i, movie in enumerate(cls.movies[:3])
+        ]
+        # Everyone saw the first movie; more of them saw the second than the third
+        for i in range(4):
+            user = User.objects.create_user(f'user{i}')
+            create_booking(user, showtimes[0], ('A', i + 1))
+            create_booking(user, showtimes[1], ('A', i + 1))
+            if i < 2:
+                create_booking(user, showtimes[2], ('A', i + 1))
+
+    def test_neighbours_are_served_from_the_row(self):
+        run = compute_similar_movies(top_k=5)
+        self.assertEqual(run.rows_processed, 6)
+        self.assertTrue(run.details['with_bookings'])
+
+        movie = self.movies[0]
+        response = self.assertWithinBudget('get', f'/api/movies/{movie.id}/', max_queries=1)
+        similar = response.data['similar_movies']
+        self.assertLessEqual(len(similar), 5)
+        self.assertEqual(
+            [(neighbour['id'], neighbour['source']) for neighbour in similar[:2]],
+            [(str(self.movies[1].pk), 'bookings'), (str(self.movies[2].pk), 'bookings')],
+        )
+        self.assertNotIn(str(movie.id), [neighbour['id'] for neighbour in similar])
+        scores = [neighbour['score'] for neighbour in similar if neighbour['source'] == 'bookings']
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        response = self.client.get('/api/movies/')
+        self.assertNotIn('similar_movies', response.data[0])
+        response = self.assertWithinBudget('get', '/api/movies/?include=similar', max_queries=1)
+        self.assertIn('similar_movies', response.data[0])
+
+    def test_new_title_falls_back_to_genre(self):
+        movie = self.movies[0]
+        fill_fallback(movie)
+        self.assertTrue(movie.similar_movies)
+        genres = Movie.objects.filter(id__in=[neighbour['id'] for neighbour in movie.similar_movies]).values_list(
+            'genre', flat=True
+        )
+        self.assertEqual(set(genres), {movie.genre})
+
+
+class WarmUpTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.showtime = create_showtime(create_movie('Кино'), create_hall(), timezone.now() + timedelta(hours=2))
+        create_snack('Попкорн')
+
+    def test_warm_up_primes_caches_and_reports_ready(self):
+        with self.assertLogs('cinema.warmup', 'INFO'):
+            result = warm_up()
+        self.assertEqual(result['status'], 'ready', result)
+        self.assertEqual(
+            [phase['name'] for phase in result['phases']],
+            ['code', 'urls', 'database', 'password_pool', 'movies', 'hall_layouts', 'schedule', 'snacks'],
+        )
+        # The booking bootstrap now finds layout and snacks in the cache
+        self.assertWithinBudget('get', f'/api/showtimes/{self.showtime.id}/bootstrap/', max_queries=4)
+
+        response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'ready')
+
+    def test_health_answers_warming_until_done(self):
+        self.addCleanup(warmup._state.update, status='not_run')
+        release = threading.Event()
+        with mock.patch.object(warmup, 'PHASES', [('database', lambda: release.wait(5), True)]):
+            with self.assertLogs('cinema.warmup', 'INFO'):
+                thread = warmup.start_warm_up()
+                response = self.client.get('/api/health/')
+                self.assertEqual((response.status_code, response.data['status']), (503, 'warming'))
+                release.set()
+                thread.join(5)
+        self.assertEqual(self.client.get('/api/health/').status_code, 200)
+
+    def test_preloading_master_starts_nothing_that_forks_badly(self):
+        self.addCleanup(warmup._state.update, status='not_run')
+        with mock.patch.dict(os.environ, {'CINEMA_PREFORK_PID': str(os.getpid())}), \
+                mock.patch.object(warmup, 'start_warm_up') as start, \
+                mock.patch.object(warmup.connections, 'close_all') as close_all:
+            warmup.warm_up_application(object())
+        start.assert_not_called()
+        close_all.assert_called_once_with()
+        # Workers inherit 'warming' until their post_fork warm-up finishes
+        self.assertEqual(self.client.get('/api/health/').status_code, 503)
+
+
+class DatabaseProfileTests(unittest.TestCase):
+    # Not a django.test case: the benchmark connects to a scratch database
+    # under its own alias and never touches the test database
+
+    def test_profiles_from_environment(self):
+        sqlite = database_config(Path('/srv'), {})
+        self.assertEqual(sqlite['NAME'], '/srv/db.sqlite3')
+        self.assertEqual(sqlite['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA journal_mode=WAL', sqlite['OPTIONS']['init_command'])
+
+        pooled = database_config(Path('/srv'), {'DB_ENGINE': 'postgres', 'DB_POOL': 'true', 'DB_POOL_MAX_SIZE': '20'})
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(database_config(Path('/srv'), {'DB_ENGINE': 'postgres'})['CONN_MAX_AGE'], 600)
+
+    def test_concurrent_booking_benchmark(self):
+        with scratch_sqlite(database_config(Path('/unused'), {})) as alias:
+            result = concurrent_booking_inserts(alias, threads=4, bookings=5)
+        self.assertEqual(result['bookings'], 20)
+        self.assertEqual(result['counter'], 20)
+        self.assertEqual(result['errors'], {})
+
+
+class SlowQueryLogTests(TestCase):
+
+    def test_slow_queries_are_logged_with_plan(self):
+        with override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN=True), self.assertLogs('cinema.slow_queries') as logs:
+            with slow_query_logging(route='test'):
+                list(Movie.objects.filter(title_ru='Фильм 1', duration__gte=90))
+
+        summary = summarize(logs.output)
+        self.assertEqual(len(summary), 1)
+        self.assertIn('"title_ru" = %s', summary[0]['fingerprint'])
+        self.assertEqual(summary[0]['routes'], ['test'])
+        self.assertTrue(summary[0]['origins'][0].startswith('cinema/tests.py'))
+        self.assertTrue(summary[0]['plan'])
+        self.assertNotIn('Фильм 1', ''.join(logs.output))
+
+    def test_plans_are_opt_in(self):
+        with override_settings(SLOW_QUERY_MS=0), self.assertLogs('cinema.slow_queries') as logs:
+            with CaptureQueriesContext(connection) as ctx, slow_query_logging(route='test'):
+                list(Movie.objects.filter(duration__gte=90))
+        self.assertIsNone(summarize(logs.output)[0]['plan'])
+        self.assertFalse(any(query['sql'].startswith('EXPLAIN') for query in ctx.captured_queries))
+
+    def test_redact(self):
+        self.assertEqual(redact(['secret@example.com', 5, None]), ['<str:18>', 5, None])
+
+    def test_fingerprint_groups_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'"),
+            fingerprint("SELECT * FROM t WHERE id IN (4) AND name = 'y'"),
+        )
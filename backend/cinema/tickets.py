@@ -0,0 +1,150 @@
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox
+from .models import Booking
+
+TICKET_SALT = 'cinema.tickets'
+
+
+def sign_ticket(booking):
+    """
+    Build the signed payload embedded in a booking's QR code.
+
+    Everything door staff need (showtime, hall, seats, start time) travels in
+    the ticket itself, so it can be verified from the signature alone.
+    """
+    payload = {
+        'b': str(booking.id),
+        's': str(booking.showtime_id),
+        'h': str(booking.showtime.hall_id),
+        't': int(booking.showtime.datetime.timestamp()),
+        'seats': booking.seats_json,
+    }
+    return signing.dumps(payload, salt=TICKET_SALT, compress=True)
+
+
+def verify_ticket(token):
+    """
+    Check a ticket's signature without touching the database.
+
+    Returns the decoded payload or raises ``django.core.signing.BadSignature``.
+    """
+    return signing.loads(token, salt=TICKET_SALT)
+
+
+def door_window(start):
+    """When tickets for a showing starting at ``start`` are let in."""
+    opens = start - timedelta(minutes=getattr(settings, 'CHECKIN_OPENS_MINUTES', 60))
+    closes = start + timedelta(minutes=getattr(settings, 'CHECKIN_CLOSES_MINUTES', 180))
+    return opens, closes
+
+
+class CheckInRegistry:
+    """
+    Per-showtime sets of bookings this process has seen admitted, so that
+    repeated scans at the door are answered from memory.
+
+    The database stays authoritative: tickets not in the set are admitted
+    with a locked UPDATE of their booking, and a booking already
+    ``completed`` (admitted by another process) is reported as a duplicate.
+    The lock only guards the sets; the database work runs outside it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._admitted = {}
+        self._starts = {}
+
+    def _evict(self):
+        # Forget showtimes that started long ago; their doors are closed
+        horizon = timezone.now() - timedelta(
+            hours=getattr(settings, 'CHECKIN_REGISTRY_RETENTION_HOURS', 12)
+        )
+        for showtime_id, start in list(self._starts.items()):
+            if start < horizon:
+                self._admitted.pop(showtime_id, None)
+                self._starts.pop(showtime_id, None)
+
+    def check_in(self, tickets, showtime_id=None):
+        """
+        Admit a batch of scanned tickets, e.g. a live scan or the backlog of
+        a device that was offline.
+
+        Returns one result per ticket, in order, with a ``status`` of
+        ``admitted``, ``duplicate``, ``invalid``, ``wrong_showtime``,
+        ``outside_window`` (too early or too late, see CHECKIN_OPENS_MINUTES
+        and CHECKIN_CLOSES_MINUTES) or ``rejected`` (booking not confirmed,
+        e.g. cancelled).
+        """
+        now = timezone.now()
+        results = []
+        payloads = []
+        for token in tickets:
+            try:
+                payload = verify_ticket(token)
+            except signing.BadSignature:
+                results.append({'status': 'invalid'})
+                continue
+            result = {
+                'booking': payload['b'],
+                'showtime': payload['s'],
+                'seats': payload['seats'],
+            }
+            results.append(result)
+            start = datetime.fromtimestamp(payload['t'], tz=dt_timezone.utc)
+            opens, closes = door_window(start)
+            if showtime_id is not None and payload['s'] != str(showtime_id):
+                result['status'] = 'wrong_showtime'
+            elif not opens <= now <= closes:
+                result['status'] = 'outside_window'
+            else:
+                payloads.append((result, start))
+
+        candidates = {}
+        with self._lock:
+            self._evict()
+            for result, start in payloads:
+                admitted = self._admitted.get(result['showtime'], ())
+                if result['booking'] in admitted or result['booking'] in candidates:
+                    result['status'] = 'duplicate'
+                else:
+                    candidates[result['booking']] = (result['showtime'], start)
+        if not candidates:
+            return results
+
+        # Only confirmed bookings can be admitted; the row locks make a
+        # concurrent scan of the same ticket see it completed
+        with transaction.atomic():
+            statuses = {
+                str(booking_id): booking_status for booking_id, booking_status in
+                Booking.objects.select_for_update().filter(id__in=list(candidates)).values_list('id', 'status')
+            }
+            confirmed = [booking_id for booking_id in candidates if statuses.get(booking_id) == 'confirmed']
+            if confirmed:
+                Booking.objects.filter(id__in=confirmed).update(status='completed', updated_at=now)
+                outbox.publish_many('booking.checked_in', 'booking', [
+                    (booking_id, {'showtime': candidates[booking_id][0]}) for booking_id in confirmed
+                ])
+
+        with self._lock:
+            for result, _ in payloads:
+                if 'status' in result:
+                    continue
+                booking_status = statuses.get(result['booking'])
+                if booking_status not in ('confirmed', 'completed'):
+                    result['status'] = 'rejected'
+                    continue
+                result['status'] = 'admitted' if booking_status == 'confirmed' else 'duplicate'
+                showtime, start = candidates[result['booking']]
+                self._admitted.setdefault(showtime, set()).add(result['booking'])
+                self._starts[showtime] = start
+        return results
+
+
+checkin_registry = CheckInRegistry()
@@ -0,0 +1,168 @@
+import bisect
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+
+from .models import Movie
+
+# Russian and Kyrgyz Cyrillic to Latin, as people usually type it
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'ң': 'ng',
+    'о': 'o', 'ө': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ү': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+# Spellings that differ between transliteration habits, folded to one form
+# (applied to both the index and the query)
+LATIN_FOLDS = [
+    ('shch', 'sh'), ('sch', 'sh'), ('kh', 'h'), ('ts', 'c'), ('zh', 'j'), ('ng', 'n'),
+    ('ya', 'ia'), ('yu', 'iu'), ('yo', 'io'), ('ye', 'e'), ('y', 'i'),
+    ('w', 'v'), ('x', 'ks'), ('q', 'k'),
+]
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase words joined by single spaces, without punctuation; ё is е."""
+    return ' '.join(WORD_RE.findall(text.casefold().replace('ё', 'е')))
+
+
+def fold_latin(text):
+    for spelling, folded in LATIN_FOLDS:
+        text = text.replace(spelling, folded)
+    return text
+
+
+def search_forms(text):
+    """The forms a title is indexed under: as written, and transliterated."""
+    text = normalize(text)
+    return {text, fold_latin(text.translate(TRANSLIT))}
+
+
+class TitleIndex:
+    """
+    A sorted array of normalized and transliterated title suffixes (one per
+    word start) of the movies that are showing, searched by prefix with
+    bisect. Writers build a new array and swap it in, so searches never
+    lock.
+
+    Saves and deletes in this process update the index in place (see
+    cinema.signals). Every TYPEAHEAD_CHECK_SECONDS each process compares
+    the movie table's version (latest ``updated_at`` and row count) with the
+    one it built from, and rebuilds when another process changed it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None  # sorted [(key, word_position, movie_id)]
+        self._movies = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _entries_for(movie):
+        entries = set()
+        for title in (movie.title_kg, movie.title_ru):
+            for form in search_forms(title):
+                words = form.split(' ')
+                for position in range(len(words)):
+                    entries.add((' '.join(words[position:]), position, movie.pk))
+        return entries
+
+    @staticmethod
+    def _summary(movie):
+        return {
+            'id': str(movie.pk),
+            'title_kg': movie.title_kg,
+            'title_ru': movie.title_ru,
+            'poster': default_storage.url(movie.poster.name) if movie.poster else None,
+        }
+
+    @staticmethod
+    def _table_version():
+        version = Movie.objects.aggregate(updated_at=Max('updated_at'), count=Count('id'))
+        return version['updated_at'], version['count']
+
+    def build(self):
+        """Load every showing movie (two queries)."""
+        # Read before the movies: a change in between makes the next check rebuild
+        version = self._table_version()
+        movies = Movie.objects.filter(is_showing=True).only('id', 'title_kg', 'title_ru', 'poster')
+        entries = set()
+        summaries = {}
+        for movie in movies:
+            entries |= self._entries_for(movie)
+            summaries[movie.pk] = self._summary(movie)
+        with self._lock:
+            self._entries = sorted(entries)
+            self._movies = summaries
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def update(self, movie):
+        """Add, refresh or (when no longer showing) drop one movie."""
+        with self._lock:
+            if self._entries is None:
+                return
+            entries = [entry for entry in self._entries if entry[2] != movie.pk]
+            movies = dict(self._movies)
+            movies.pop(movie.pk, None)
+            if movie.is_showing:
+                for entry in self._entries_for(movie):
+                    bisect.insort(entries, entry)
+                movies[movie.pk] = self._summary(movie)
+            self._entries, self._movies = entries, movies
+
+    def remove(self, movie_id):
+        with self._lock:
+            if self._entries is None:
+                return
+            self._entries = [entry for entry in self._entries if entry[2] != movie_id]
+            self._movies = {pk: summary for pk, summary in self._movies.items() if pk != movie_id}
+
+    def invalidate(self):
+        """Rebuild on the next search, e.g. after bulk writes that send no signals."""
+        self._version = None
+        self._checked_at = 0.0
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._entries is not None:
+            if now - self._checked_at < getattr(settings, 'TYPEAHEAD_CHECK_SECONDS', 5):
+                return
+            self._checked_at = now
+            if self._table_version() == self._version:
+                return
+        self.build()
+
+    def search(self, query, limit=8):
+        """
+        Movies with a title word starting with ``query`` (in Cyrillic or
+        Latin), titles that start with it first.
+        """
+        self._ensure_fresh()
+        entries, movies = self._entries, self._movies
+        prefixes = {form for form in search_forms(query) if form}
+        if not prefixes:
+            return []
+
+        best = {}
+        for prefix in prefixes:
+            start = bisect.bisect_left(entries, (prefix,))
+            for key, position, movie_id in entries[start:start + limit * 20]:
+                if not key.startswith(prefix):
+                    break
+                if position < best.get(movie_id, (position + 1,))[0]:
+                    best[movie_id] = (position, key)
+        ranked = sorted(best, key=lambda movie_id: best[movie_id])
+        return [movies[movie_id] for movie_id in ranked[:limit]]
+
+
+title_index = TitleIndex()
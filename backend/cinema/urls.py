@@ -28,5 +28,13 @@ urlpatterns = [
     path('auth/password-reset/confirm/', views.PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
     
     # Additional endpoints
+    path('health/', views.health, name='health'),
     path('showtimes/<uuid:showtime_id>/seats/', views.available_seats, name='available-seats'),
+    path('showtimes/<uuid:showtime_id>/bootstrap/', views.booking_bootstrap_view, name='booking-bootstrap'),
+    path('showtimes/<uuid:showtime_id>/best-seats/', views.best_seats, name='best-seats'),
+    path('showtimes/<uuid:showtime_id>/waiting-room/', views.waiting_room, name='waiting-room'),
+    path('check-in/', views.check_in, name='check-in'),
+    path('sync/', views.catalog_sync, name='catalog-sync'),
+    path('catalog/import/', views.catalog_import, name='catalog-import'),
+    path('exports/bookings.<str:export_format>', views.bookings_export, name='bookings-export'),
 ] 
\ No newline at end of file
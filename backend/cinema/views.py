@@ -1,34 +1,77 @@
 from django.shortcuts import render, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.contrib.auth.password_validation import validate_password
+from django.core import signing
 from django.core.exceptions import ValidationError
 from django.utils.crypto import get_random_string
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes, action
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework import status, viewsets, generics
+from rest_framework import status, viewsets, generics, serializers
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import PageNumberPagination
 
+from collections.abc import Mapping
 from datetime import timedelta
+import tempfile
 import uuid
+import zipfile
 
 from .models import (
     Movie, Hall, Showtime, Snack, 
     Booking, SnackOrder, News, Gallery, PasswordReset
 )
+from . import outbox
+from .archive import booking_history
+from .bootstrap import booking_bootstrap
+from .catalog_import import import_catalog
+from .exports import FORMATS, export_bookings
+from .availability import SOLD_STATUSES, release_bookings
+from .idempotency import idempotent
+from .inventory import on_sale, release_booking_snacks
+from .scheduling import detect_conflicts
+from .sync import SOURCES as SYNC_SOURCES, changes_since
+from .seating import SeatsUnavailable, occupancy_grid, booked_seats, held_seats, hold_seats, row_label
+from .tickets import checkin_registry
+from .typeahead import title_index
+from .warmup import is_ready, report as warmup_report
+from .waiting_room import admission_required, check_admission, join, queue_status
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, MovieSerializer,
     HallSerializer, ShowtimeSerializer, SnackSerializer,
-    BookingSerializer, BookingCreateSerializer, SnackOrderSerializer,
+    BookingSerializer, BookingCreateSerializer, BookingHistorySerializer, SnackOrderSerializer,
     NewsSerializer, GallerySerializer, PasswordResetSerializer,
-    PasswordResetConfirmSerializer
+    PasswordResetConfirmSerializer, CheckInSerializer, BestSeatsSerializer,
+    CatalogImportSerializer
 )
 
+class AtomicWriteMixin:
+    """
+    Run create/update/destroy in a transaction, so the outbox events written
+    by cinema.signals commit together with the change.
+    """
+    
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+    
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+
 # Create your views here.
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -45,6 +88,7 @@ def api_root(request, format=None):
             'snacks': reverse('snack-list', request=request, format=format),
             'news': reverse('news-list', request=request, format=format),
             'gallery': reverse('gallery-list', request=request, format=format),
+            'sync': reverse('catalog-sync', request=request, format=format),
             'auth': {
                 'register': reverse('user-register', request=request, format=format),
                 'me': reverse('user-me', request=request, format=format),
@@ -73,7 +117,7 @@ class UserProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 # Movie views
-class MovieViewSet(viewsets.ModelViewSet):
+class MovieViewSet(AtomicWriteMixin, viewsets.ModelViewSet):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = [AllowAny]
@@ -109,10 +153,75 @@ class MovieViewSet(viewsets.ModelViewSet):
                 Q(title_kg__icontains=search) | Q(title_ru__icontains=search)
             )
         
+        if not self._include_similar():
+            queryset = queryset.defer('similar_movies')
+        if self._include_showtimes():
+            queryset = queryset.prefetch_related(self._upcoming_showtimes())
         return queryset
+    
+    def _includes(self):
+        return set(self.request.query_params.get('include', '').split(','))
+    
+    def _include_similar(self):
+        # Always on the movie page; on lists with ?include=similar
+        return self.action == 'retrieve' or 'similar' in self._includes()
+    
+    def _include_showtimes(self):
+        return self.action in ['list', 'retrieve'] and 'showtimes' in self._includes()
+    
+    def _upcoming_showtimes(self):
+        """
+        ?include=showtimes embeds each movie's next showtimes, so a page of
+        movie cards needs one request. ``showtimes`` sets how many per movie
+        (MOVIE_SHOWTIMES_PER_MOVIE by default), ``showtime_date`` and
+        ``showtime_language`` narrow them down.
+        
+        The sliced Prefetch is a single query for all movies: Django limits
+        it per movie with a ROW_NUMBER() window.
+        """
+        params = self.request.query_params
+        default = getattr(settings, 'MOVIE_SHOWTIMES_PER_MOVIE', 5)
+        try:
+            limit = min(max(int(params.get('showtimes', default)), 1), getattr(settings, 'MOVIE_SHOWTIMES_MAX', 20))
+        except ValueError:
+            limit = default
+        
+        showtimes = Showtime.objects.select_related('hall').filter(datetime__gte=timezone.now())
+        day = params.get('showtime_date')
+        if day:
+            try:
+                day = parse_date(day)
+            except ValueError:
+                day = None
+            if day is None:
+                raise serializers.ValidationError({'showtime_date': 'Use the YYYY-MM-DD format.'})
+            showtimes = showtimes.filter(datetime__date=day)
+        language = params.get('showtime_language')
+        if language:
+            showtimes = showtimes.filter(language=language)
+        return Prefetch('showtimes', queryset=showtimes.order_by('datetime')[:limit], to_attr='upcoming_showtimes')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_similar'] = self._include_similar()
+        context['include_showtimes'] = self._include_showtimes()
+        return context
+    
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """
+        Title suggestions for the search box, answered from memory. Matches
+        word prefixes of showing movies in Kyrgyz or Russian, also when
+        typed in Latin transliteration.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+        return Response(title_index.search(request.query_params.get('q', ''), limit=limit))
 
 # Hall views
-class HallViewSet(viewsets.ModelViewSet):
+class HallViewSet(AtomicWriteMixin, viewsets.ModelViewSet):
     queryset = Hall.objects.all()
     serializer_class = HallSerializer
     permission_classes = [AllowAny]
@@ -123,18 +232,48 @@ class HallViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 # Showtime views
-class ShowtimeViewSet(viewsets.ModelViewSet):
+class ShowtimeViewSet(AtomicWriteMixin, viewsets.ModelViewSet):
     queryset = Showtime.objects.all()
     serializer_class = ShowtimeSerializer
     permission_classes = [AllowAny]
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk']:
             self.permission_classes = [IsAdminUser]
         return super().get_permissions()
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create a batch of showtimes (e.g. a month-long schedule import).
+        
+        The batch is checked against itself and the existing schedule in one
+        pass; if any showtime overlaps another in the same hall, nothing is
+        created and every conflict is reported.
+        """
+        serializer = ShowtimeSerializer(
+            data=request.data, many=True,
+            context={'request': request, 'check_conflicts': False}
+        )
+        serializer.is_valid(raise_exception=True)
+        
+        conflicts = detect_conflicts(serializer.validated_data)
+        if conflicts:
+            return Response({'conflicts': conflicts}, status=status.HTTP_409_CONFLICT)
+        
+        with transaction.atomic():
+            showtimes = Showtime.objects.bulk_create(
+                [Showtime(**data) for data in serializer.validated_data]
+            )
+            # bulk_create sends no signals, so publish the events here
+            outbox.publish_many('showtime.created', 'showtime', [(showtime.id, {}) for showtime in showtimes])
+        return Response(
+            ShowtimeSerializer(showtimes, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+    
     def get_queryset(self):
-        queryset = Showtime.objects.all()
+        queryset = Showtime.objects.select_related('movie', 'hall')
         
         # Filter by movie
         movie_id = self.request.query_params.get('movie', None)
@@ -162,7 +301,7 @@ class ShowtimeViewSet(viewsets.ModelViewSet):
         return queryset
 
 # Snack views
-class SnackViewSet(viewsets.ModelViewSet):
+class SnackViewSet(AtomicWriteMixin, viewsets.ModelViewSet):
     queryset = Snack.objects.all()
     serializer_class = SnackSerializer
     permission_classes = [AllowAny]
@@ -173,26 +312,73 @@ class SnackViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
     
     def get_queryset(self):
-        return Snack.objects.filter(available=True)
+        if self.action in ['list', 'retrieve']:
+            # Sold-out snacks drop out within the same query
+            return Snack.objects.filter(on_sale())
+        return Snack.objects.all()
 
 # Booking views
+class BookingHistoryPagination(PageNumberPagination):
+    page_size = settings.BOOKING_HISTORY_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.BOOKING_HISTORY_MAX_PAGE_SIZE
+
 class BookingViewSet(viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user)
+        return Booking.objects.filter(user=self.request.user).select_related(
+            'showtime__movie', 'showtime__hall'
+        ).prefetch_related(
+            Prefetch('snack_orders', queryset=SnackOrder.objects.select_related('snack'))
+        )
     
     def get_serializer_class(self):
         if self.action == 'create':
             return BookingCreateSerializer
         return BookingSerializer
     
+    def create(self, request, *args, **kwargs):
+        # Checked before an Idempotency-Key is claimed, so a client sent to
+        # the waiting room can retry with the same key once admitted
+        showtime_id = request.data.get('showtime') if isinstance(request.data, Mapping) else None
+        denied = check_admission(request, showtime_id)
+        if denied is not None:
+            return denied
+        return self._create(request, *args, **kwargs)
+    
+    @idempotent('bookings')
+    def _create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, status='confirmed')
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            booking_id = instance.id
+            if instance.status in SOLD_STATUSES:
+                # Read before the delete cascades to the snack orders
+                release_booking_snacks([booking_id])
+            instance.delete()
+            if instance.status in SOLD_STATUSES:
+                release_bookings([(instance.showtime_id, instance.seats_json)])
+            outbox.publish('booking.deleted', 'booking', booking_id, {'showtime': str(instance.showtime_id)})
+    
+    @action(detail=False, methods=['get'], pagination_class=BookingHistoryPagination)
+    def history(self, request):
+        """
+        The user's full booking history, including bookings that have been
+        moved to the archive tables, newest first, a page at a time
+        (`page`, `page_size`).
+        """
+        page = self.paginate_queryset(booking_history(request.user))
+        serializer = BookingHistorySerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 # News views
-class NewsViewSet(viewsets.ModelViewSet):
+class NewsViewSet(AtomicWriteMixin, viewsets.ModelViewSet):
     queryset = News.objects.all()
     serializer_class = NewsSerializer
     permission_classes = [AllowAny]
@@ -206,7 +392,7 @@ class NewsViewSet(viewsets.ModelViewSet):
         return News.objects.filter(published=True)
 
 # Gallery views
-class GalleryViewSet(viewsets.ModelViewSet):
+class GalleryViewSet(AtomicWriteMixin, viewsets.ModelViewSet):
     queryset = Gallery.objects.all()
     serializer_class = GallerySerializer
     permission_classes = [AllowAny]
@@ -295,14 +481,9 @@ class PasswordResetConfirmView(APIView):
 # Check available seats for a showtime
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@admission_required
 def available_seats(request, showtime_id):
-    showtime = get_object_or_404(Showtime, id=showtime_id)
-    bookings = Booking.objects.filter(showtime=showtime, status__in=['confirmed', 'pending'])
-    
-    # Get all booked seats
-    booked_seats = []
-    for booking in bookings:
-        booked_seats.extend(booking.seats_json)
+    showtime = get_object_or_404(Showtime.objects.select_related('movie', 'hall'), id=showtime_id)
     
     # Get hall layout
     hall_layout = showtime.hall.layout_json
@@ -310,5 +491,233 @@ def available_seats(request, showtime_id):
     return Response({
         'showtime': ShowtimeSerializer(showtime).data,
         'hall_layout': hall_layout,
-        'booked_seats': booked_seats
+        'booked_seats': booked_seats(showtime),
+        'held_seats': held_seats(showtime)
+    })
+
+# Everything the booking screen needs, in one request
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@admission_required
+def booking_bootstrap_view(request, showtime_id):
+    showtime = get_object_or_404(Showtime.objects.select_related('movie', 'hall'), id=showtime_id)
+    return Response(booking_bootstrap(showtime, request))
+
+# Suggest (and optionally hold) the best block of seats for a group
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@admission_required
+def best_seats(request, showtime_id):
+    serializer = BestSeatsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    options = serializer.validated_data
+    
+    if options['hold'] and not request.user.is_authenticated:
+        return Response(
+            {'detail': 'Authentication is required to hold seats.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    showtime = get_object_or_404(Showtime.objects.select_related('hall'), id=showtime_id)
+    user = request.user if request.user.is_authenticated else None
+    grid = occupancy_grid(showtime, exclude_user=user)
+    best = grid.best_block(
+        options['party_size'],
+        row_from=options.get('row_from'),
+        row_to=options.get('row_to'),
+        centre=options['centre'],
+        seat_type=options.get('seat_type'),
+    )
+    if best is None:
+        return Response(
+            {'detail': 'No block of adjacent seats matches the request.'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    row, column, score = best
+    seats = [
+        {'row': row_label(row), 'number': column + number + 1}
+        for number in range(options['party_size'])
+    ]
+    data = {
+        'seats': seats,
+        'seat_type': grid.row_types[row],
+        'score': round(score, 4),
+    }
+    if options['hold']:
+        try:
+            hold = hold_seats(showtime, request.user, seats)
+        except SeatsUnavailable:
+            # Taken by a concurrent request since the grid was read
+            return Response(
+                {'detail': 'The suggested seats were just taken. Please try again.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        data['hold'] = {'id': hold.id, 'expires_at': hold.expires_at}
+    return Response(data)
+
+# Readiness for load balancers and deploy scripts
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def health(request):
+    """
+    200 once this process has warmed up (503 while warming or if a required
+    warm-up phase failed), with the time each warm-up phase took.
+    """
+    data = warmup_report()
+    return Response(data, status=status.HTTP_200_OK if is_ready() else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+# Virtual waiting room in front of the booking flow during on-sale spikes
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def waiting_room(request, showtime_id):
+    """
+    POST takes a place in the line (one per user); GET ?token= polls it.
+    Both answer either ``{'status': 'waiting', 'token', 'position',
+    'estimated_wait_seconds', 'retry_after'}`` or ``{'status': 'admitted',
+    'pass', 'expires_at'}``; the pass goes in the X-Booking-Pass header of
+    the signed-in user's booking-flow requests.
+    """
+    if request.method == 'POST':
+        return Response(join(showtime_id, request.user.pk))
+    
+    token = request.query_params.get('token')
+    if not token:
+        return Response({'token': 'This parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return Response(queue_status(showtime_id, token, request.user.pk))
+    except signing.BadSignature as exc:
+        return Response({'token': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+# Ticket check-in at the door
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def check_in(request):
+    """
+    Admit a batch of scanned tickets.
+    
+    Tickets are verified by signature alone; scanners that were offline can
+    upload everything they scanned in one request. Pass `showtime` to reject
+    tickets for other showings.
+    """
+    serializer = CheckInSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    results = checkin_registry.check_in(
+        serializer.validated_data['tickets'],
+        showtime_id=serializer.validated_data.get('showtime')
+    )
+    return Response({
+        'admitted': sum(1 for result in results if result['status'] == 'admitted'),
+        'results': results
     })
+
+# Accounting export of bookings with their snack lines
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def bookings_export(request, export_format):
+    """
+    Stream all bookings as CSV (one row per snack line) or NDJSON (one
+    object per booking). Filters: `from`/`to` (YYYY-MM-DD, inclusive,
+    booking date) and `status` (comma-separated).
+    """
+    if export_format not in FORMATS:
+        return Response(
+            {'detail': f"Unsupported format. Use one of: {', '.join(FORMATS)}."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    filters = {}
+    for param, key in (('from', 'date_from'), ('to', 'date_to')):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                filters[key] = parse_date(value)
+            except ValueError:
+                filters[key] = None
+            if filters[key] is None:
+                return Response(
+                    {param: 'Use the YYYY-MM-DD format.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+    statuses = [value for value in request.query_params.get('status', '').split(',') if value]
+    valid_statuses = {choice for choice, _ in Booking.STATUS_CHOICES}
+    if set(statuses) - valid_statuses:
+        return Response(
+            {'status': f"Unknown status. Use any of: {', '.join(sorted(valid_statuses))}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    filters['statuses'] = statuses
+    
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        export_bookings(export_format, **filters),
+        content_type=f'{content_type}; charset=utf-8'
+    )
+    stamp = timezone.localdate().isoformat()
+    response['Content-Disposition'] = f'attachment; filename="bookings-{stamp}.{export_format}"'
+    return response
+
+# Bulk catalog import
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser, FormParser])
+def catalog_import(request):
+    """
+    Import a zip bundle of movies/snacks/showtimes (.csv or .json) with the
+    images they reference. Valid rows are saved; invalid ones are reported
+    per row. Pass `dry_run` to only validate.
+    """
+    serializer = CatalogImportSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            with zipfile.ZipFile(serializer.validated_data['bundle']) as archive:
+                archive.extractall(directory)
+            reports = import_catalog(directory, dry_run=serializer.validated_data['dry_run'])
+    except zipfile.BadZipFile:
+        return Response({'bundle': 'Not a zip file.'}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError as e:
+        return Response({'bundle': f'Cannot read bundle: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not reports:
+        return Response(
+            {'bundle': 'No movies, snacks or showtimes files found.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(reports)
+
+# Delta sync for kiosk and mobile clients
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def catalog_sync(request):
+    """
+    Catalog changes since the `since` cursor (from a previous response):
+    changed rows and deleted ids per collection, plus the next cursor.
+    Without `since` (or when it is too old) the full catalog is returned
+    with `reset: true`. Limit collections with `include=movies,news`.
+    """
+    since = request.query_params.get('since')
+    if since:
+        try:
+            since = parse_datetime(since)
+        except ValueError:
+            since = None
+        if since is None or timezone.is_naive(since):
+            return Response(
+                {'since': 'Pass the cursor from a previous sync response.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    else:
+        since = None
+    
+    sources = [name for name in request.query_params.get('include', '').split(',') if name]
+    unknown = set(sources) - set(SYNC_SOURCES)
+    if unknown:
+        return Response(
+            {'include': f"Unknown collection. Use any of: {', '.join(SYNC_SOURCES)}."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(changes_since(since, sources or None, context={'request': request}))
@@ -0,0 +1,201 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+
+PASS_HEADER = 'X-Booking-Pass'
+TOKEN_SALT = 'cinema.waiting_room.token'
+PASS_SALT = 'cinema.waiting_room.pass'
+
+
+def _sessions():
+    return getattr(settings, 'WAITING_ROOM_SESSIONS', 200)
+
+
+def _pass_ms():
+    return getattr(settings, 'WAITING_ROOM_PASS_SECONDS', 300) * 1000
+
+
+def _interval_ms():
+    # One admission per interval keeps at most WAITING_ROOM_SESSIONS passes valid at once
+    return max(_pass_ms() // _sessions(), 1)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _key(showtime_id, name):
+    return f'waiting:{showtime_id}:{name}'
+
+
+def open_room(showtime_id, seconds=None):
+    """Send the showtime's booking flow through the waiting room, e.g. ahead of a premiere."""
+    if seconds is None:
+        seconds = getattr(settings, 'WAITING_ROOM_OPEN_MINUTES', 30) * 60
+    cache.set(_key(showtime_id, 'open'), True, seconds)
+
+
+def close_room(showtime_id):
+    cache.delete(_key(showtime_id, 'open'))
+
+
+def is_open(showtime_id):
+    return bool(cache.get(_key(showtime_id, 'open')))
+
+
+def _record_hit(showtime_id):
+    """Count booking-flow requests per second; a spike opens the room."""
+    key = _key(showtime_id, f'hits:{int(time.time())}')
+    cache.add(key, 0, 5)
+    try:
+        hits = cache.incr(key)
+    except ValueError:
+        return
+    if hits > getattr(settings, 'WAITING_ROOM_TRIGGER_RPS', 50):
+        open_room(showtime_id)
+
+
+def _claim_slot(showtime_id, now_ms):
+    """
+    The time at which the next person in line is admitted. Slots are one
+    interval apart and handed out with an atomic cache increment, so the
+    line is FIFO across processes.
+    """
+    key = _key(showtime_id, 'next_slot')
+    interval = _interval_ms()
+    timeout = getattr(settings, 'WAITING_ROOM_OPEN_MINUTES', 30) * 60 + _pass_ms() // 1000
+    try:
+        slot = cache.incr(key, interval) - interval
+    except ValueError:
+        slot = None
+    if slot is None or slot < now_ms:
+        # Nobody is waiting: admit now and start the schedule from here
+        slot = now_ms
+        cache.set(key, slot + interval, timeout)
+    return slot
+
+
+def _issue_pass(showtime_id, user_id, admit_at):
+    expires_at = admit_at + _pass_ms()
+    return {
+        'status': 'admitted',
+        'pass': signing.dumps({'s': str(showtime_id), 'u': user_id, 'e': expires_at}, salt=PASS_SALT),
+        'expires_at': expires_at // 1000,
+    }
+
+
+def _waiting(token, admit_at, now_ms):
+    wait_ms = admit_at - now_ms
+    return {
+        'status': 'waiting',
+        'token': token,
+        'position': math.ceil(wait_ms / _interval_ms()),
+        'estimated_wait_seconds': math.ceil(wait_ms / 1000),
+        # Poll again when the turn comes, but at least every 30 seconds
+        'retry_after': min(max(math.ceil(wait_ms / 1000), 1), 30),
+    }
+
+
+def _place(showtime_id, user_id, admit_at, now_ms):
+    if admit_at <= now_ms:
+        # The pass runs from the admission slot, so a late poll doesn't extend it
+        return _issue_pass(showtime_id, user_id, admit_at)
+    token = signing.dumps({'s': str(showtime_id), 'u': user_id, 'a': admit_at}, salt=TOKEN_SALT)
+    return _waiting(token, admit_at, now_ms)
+
+
+def join(showtime_id, user_id):
+    """
+    Take a place in the showtime's line. Returns a pass straight away when
+    it's the caller's turn, otherwise a signed position token to poll
+    ``queue_status`` with. Only the cache is used, never the database.
+
+    Each user has one place per showtime: joining again while it is valid
+    returns the same place instead of taking another slot.
+    """
+    now_ms = _now_ms()
+    member = _key(showtime_id, f'user:{user_id}')
+    admit_at = cache.get(member)
+    if admit_at is None or now_ms >= admit_at + _pass_ms():
+        claimed = _claim_slot(showtime_id, now_ms)
+        ttl = (claimed + _pass_ms() - now_ms) // 1000 + 1
+        if admit_at is None and not cache.add(member, claimed, ttl):
+            # A concurrent join by the same user got there first
+            admit_at = cache.get(member, claimed)
+        else:
+            cache.set(member, claimed, ttl)
+            admit_at = claimed
+    return _place(showtime_id, user_id, admit_at, now_ms)
+
+
+def queue_status(showtime_id, token, user_id):
+    """
+    Where a position token stands: still waiting, or admitted with a pass.
+    Raises ``django.core.signing.BadSignature`` for tokens that are forged,
+    belong to another showtime or user, or whose pass window has passed.
+    """
+    data = signing.loads(token, salt=TOKEN_SALT)
+    if data['s'] != str(showtime_id) or data['u'] != user_id:
+        raise signing.BadSignature('Token is for another showtime or user.')
+    now_ms = _now_ms()
+    if now_ms >= data['a'] + _pass_ms():
+        raise signing.BadSignature('Token has expired; join the line again.')
+    return _place(showtime_id, user_id, data['a'], now_ms)
+
+
+def has_pass(request, showtime_id):
+    token = request.headers.get(PASS_HEADER)
+    if not token:
+        return False
+    try:
+        data = signing.loads(token, salt=PASS_SALT)
+    except signing.BadSignature:
+        return False
+    # Passes are issued to signed-in users only and can't be handed on
+    return (
+        request.user.is_authenticated
+        and data['s'] == str(showtime_id)
+        and data['u'] == request.user.pk
+        and _now_ms() < data['e']
+    )
+
+
+def check_admission(request, showtime_id):
+    """
+    ``None`` when the request may enter the showtime's booking flow,
+    otherwise a 429 response pointing to the waiting room. The flow is open
+    to everyone until the room is opened, by hand or by a request spike.
+    """
+    if not showtime_id or not getattr(settings, 'WAITING_ROOM_ENABLED', False):
+        return None
+    if not is_open(showtime_id):
+        _record_hit(showtime_id)
+        return None
+    if has_pass(request, showtime_id):
+        return None
+    response = Response({
+        'detail': 'This showtime is busy. Join the waiting room to get a booking pass.',
+        'waiting_room': request.build_absolute_uri(
+            reverse('waiting-room', kwargs={'showtime_id': showtime_id})
+        ),
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = '1'
+    return response
+
+
+def admission_required(view):
+    """Put a function view taking ``showtime_id`` behind the waiting room."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        denied = check_admission(request, kwargs.get('showtime_id'))
+        if denied is not None:
+            return denied
+        return view(request, *args, **kwargs)
+    return wrapper
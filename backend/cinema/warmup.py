@@ -0,0 +1,189 @@
+import logging
+import os
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+logger = logging.getLogger('cinema.warmup')
+
+# Project modules are imported inside the phases, so their import time is
+# measured in the phase that needs them rather than before warm-up starts
+_lock = threading.Lock()
+_state = {'status': 'not_run', 'phases': [], 'total_ms': None, 'finished_at': None}
+
+
+def load_code():
+    # Modules DRF and simplejwt otherwise import on the first request
+    from rest_framework.settings import api_settings
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS'):
+        getattr(api_settings, name)
+    for module in ('rest_framework_simplejwt.authentication', 'rest_framework_simplejwt.tokens',
+                   'cinema.views', 'cinema.serializers'):
+        import_module(module)
+
+
+def load_urls():
+    resolver = get_resolver()
+    resolver.reverse_dict  # compiles every pattern
+    reverse('api-root')
+    resolver.resolve('/api/movies/')
+
+
+def connect_databases():
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def start_password_pool():
+    from .hashers import start_pool
+    start_pool()
+
+
+def prime_movies():
+    from .models import Movie
+    from .serializers import MovieSerializer
+    from .typeahead import title_index
+    title_index.build()
+    MovieSerializer(Movie.objects.filter(is_showing=True).defer('similar_movies'), many=True).data
+
+
+def prime_halls():
+    from .bootstrap import hall_layout
+    from .models import Hall
+    for hall in Hall.objects.all():
+        hall_layout(hall)
+
+
+def prime_schedule():
+    from .models import Showtime
+    from .serializers import ShowtimeSerializer
+    ShowtimeSerializer(
+        Showtime.objects.select_related('movie', 'hall').filter(datetime__date=timezone.localdate()), many=True
+    ).data
+
+
+def prime_snacks():
+    from .bootstrap import available_snacks
+    available_snacks()
+
+
+# (name, function, required): the process only reports ready once the
+# required phases have succeeded; the others just make the first requests faster
+PHASES = [
+    ('code', load_code, True),
+    ('urls', load_urls, True),
+    ('database', connect_databases, True),
+    ('password_pool', start_password_pool, False),
+    ('movies', prime_movies, False),
+    ('hall_layouts', prime_halls, False),
+    ('schedule', prime_schedule, False),
+    ('snacks', prime_snacks, False),
+]
+
+
+def warm_up(started=None):
+    """
+    Prepare this process for traffic: load code and URL patterns, connect to
+    the databases, start the password hashing pool and prime the hot
+    caches. Each phase is timed; the report is logged on 'cinema.warmup'
+    and served by the health endpoint.
+
+    ``started`` is a ``time.perf_counter()`` value from before Django was
+    set up, so that time is reported as the 'setup' phase.
+    """
+    with _lock:
+        _state.update(status='warming', phases=[], total_ms=None, finished_at=None)
+    began = time.perf_counter()
+    phases = []
+    if started is not None:
+        phases.append({'name': 'setup', 'ms': round((began - started) * 1000, 1), 'ok': True})
+
+    ready = True
+    for name, function, required in PHASES:
+        phase_started = time.perf_counter()
+        phase = {'name': name}
+        try:
+            function()
+            phase['ok'] = True
+        except Exception as exc:
+            logger.exception("Warm-up phase %s failed", name)
+            phase.update(ok=False, error=str(exc))
+            ready = ready and not required
+        phase['ms'] = round((time.perf_counter() - phase_started) * 1000, 1)
+        phases.append(phase)
+
+    total_ms = round((time.perf_counter() - (started if started is not None else began)) * 1000, 1)
+    with _lock:
+        _state.update(
+            status='ready' if ready else 'failed', phases=phases, total_ms=total_ms,
+            finished_at=timezone.now().isoformat(),
+        )
+    logger.info("Warm-up %s in %.0f ms: %s", _state['status'], total_ms, ', '.join(
+        f"{phase['name']} {phase['ms']:.0f} ms{'' if phase['ok'] else ' (failed)'}" for phase in phases
+    ))
+    return report()
+
+
+def report():
+    with _lock:
+        return {**_state, 'phases': list(_state['phases'])}
+
+
+def is_ready():
+    # Processes that don't warm up (WARMUP_ON_STARTUP off, tests) are ready as they are
+    return _state['status'] in ('ready', 'not_run')
+
+
+def start_warm_up(started=None):
+    """
+    Warm up in a background thread, so the server can answer right away with
+    /api/health/ reporting 'warming' (503) until it's done. Returns the thread.
+    """
+    with _lock:
+        _state.update(status='warming', phases=[], total_ms=None, finished_at=None)
+
+    def run():
+        try:
+            warm_up(started)
+        finally:
+            # This thread's connections; request threads open their own
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def _prefork_master():
+    # Set by gunicorn.conf.py in the master, which imports the app itself
+    # when it runs with --preload
+    return os.environ.get('CINEMA_PREFORK_PID') == str(os.getpid())
+
+
+def warm_up_application(application, started=None):
+    """
+    Warm up from wsgi.py/asgi.py, unless WARMUP_ON_STARTUP is off.
+
+    A gunicorn master preloading the app only loads code and URLs, which its
+    workers inherit, and closes its database connections before forking;
+    it starts no threads or pool processes, which wouldn't survive the fork.
+    Each worker then warms up from the post_fork hook in gunicorn.conf.py.
+    """
+    if not getattr(settings, 'WARMUP_ON_STARTUP', True):
+        return application
+    if _prefork_master():
+        load_code()
+        load_urls()
+        connections.close_all()
+        with _lock:
+            _state.update(status='warming')
+    else:
+        start_warm_up(started)
+    return application
@@ -8,9 +8,16 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import time
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cinema_project.settings')
 
+started = time.perf_counter()
 application = get_asgi_application()
+
+# Load code, connect and prime caches in the background (cinema.warmup)
+from cinema.warmup import warm_up_application  # noqa: E402
+
+application = warm_up_application(application, started)
@@ -0,0 +1,77 @@
+"""
+Database profile for settings.DATABASES, chosen by environment variables.
+
+DB_ENGINE=sqlite (default) is meant for development and box-office kiosks:
+WAL journal, synchronous=NORMAL, a busy timeout instead of immediate
+"database is locked" errors, IMMEDIATE write transactions and memory-mapped
+reads.
+
+DB_ENGINE=postgres is for production: persistent connections checked
+before reuse, or (DB_POOL=true) a psycopg 3 connection pool per process.
+"""
+
+import os
+
+
+def _flag(env, name, default):
+    return env.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite_profile(name, env=os.environ):
+    busy_timeout_ms = int(env.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    pragmas = [
+        'PRAGMA journal_mode=WAL',
+        f"PRAGMA synchronous={env.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f'PRAGMA busy_timeout={busy_timeout_ms}',
+        f"PRAGMA mmap_size={int(env.get('SQLITE_MMAP_BYTES', 256 * 1024 * 1024))}",
+        f"PRAGMA cache_size=-{int(env.get('SQLITE_CACHE_KB', 20000))}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': int(env.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': busy_timeout_ms / 1000,
+            # Take the write lock when the transaction starts, so two writers
+            # wait for each other instead of failing on the lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(pragmas),
+        },
+    }
+
+
+def postgres_profile(env=os.environ):
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('DB_NAME', 'cinema_db'),
+        'USER': env.get('DB_USER', 'postgres'),
+        'PASSWORD': env.get('DB_PASSWORD', ''),
+        'HOST': env.get('DB_HOST', 'localhost'),
+        'PORT': env.get('DB_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(env.get('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+    if _flag(env, 'DB_POOL', False):
+        # Django's built-in pool (psycopg 3) replaces persistent connections
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS']['pool'] = {
+            'min_size': int(env.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(env.get('DB_POOL_TIMEOUT', 10)),
+        }
+    else:
+        config['CONN_MAX_AGE'] = int(env.get('DB_CONN_MAX_AGE', 600))
+    return config
+
+
+def database_config(base_dir, env=os.environ):
+    engine = env.get('DB_ENGINE', 'sqlite').lower()
+    if engine in ('postgres', 'postgresql'):
+        return postgres_profile(env)
+    if engine == 'sqlite':
+        return sqlite_profile(env.get('DB_NAME', str(base_dir / 'db.sqlite3')), env)
+    raise ValueError(f"Unsupported DB_ENGINE {engine!r}; use 'sqlite' or 'postgres'")
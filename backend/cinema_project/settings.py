@@ -14,6 +14,8 @@ from pathlib import Path
 import os
 from datetime import timedelta
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'cinema.querylog.SlowQueryLogMiddleware',
+    'cinema.hashers.PasswordHashTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.middleware.common.CommonMiddleware',
@@ -82,25 +86,31 @@ WSGI_APPLICATION = 'cinema_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# For development we'll use SQLite, but in production use PostgreSQL
+# SQLite for development and box-office kiosks, PostgreSQL in production;
+# chosen and tuned with DB_* environment variables (see database.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
-# PostgreSQL configuration (commented out for now, uncomment for production)
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': 'cinema_db',
-#         'USER': 'postgres',
-#         'PASSWORD': 'postgres',
-#         'HOST': 'localhost',
-#         'PORT': '5432',
-#     }
-# }
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Shared between worker processes when REDIS_URL is set (required for the
+# waiting room); otherwise each process has its own in-memory cache
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 # Password validation
@@ -121,6 +131,26 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Passwords are hashed with scrypt (memory-hard); existing PBKDF2 hashes are
+# still accepted and upgraded at the next sign-in. Both run in a small process
+# pool (cinema.hashers) so sign-in bursts can't take the CPU booking requests
+# need: PASSWORD_HASH_WORKERS processes (0 hashes inline), at most
+# PASSWORD_HASH_MAX_PENDING hashes in flight per web process, and requests
+# that wait longer than PASSWORD_HASH_QUEUE_TIMEOUT seconds for a slot, or
+# PASSWORD_HASH_TIMEOUT seconds for the hash itself, get a 503.
+PASSWORD_HASHERS = [
+    'cinema.hashers.PooledScryptPasswordHasher',
+    'cinema.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_MAX_PENDING = 8
+PASSWORD_HASH_QUEUE_TIMEOUT = 2
+PASSWORD_HASH_TIMEOUT = 10
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 5
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -144,6 +174,28 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads get content-hashed names so their URLs can be cached forever;
+# collected static files are content-hashed too (outside DEBUG, since the
+# manifest only exists after collectstatic)
+STORAGES = {
+    'default': {
+        'BACKEND': 'cinema.storage.HashedMediaStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Cache lifetime for media files without a content hash in their name
+MEDIA_CACHE_SECONDS = 3600
+# Let the front proxy send media bodies: 'X-Accel-Redirect' (nginx) or
+# 'X-Sendfile' (Apache/lighttpd), with the proxy's internal location prefix
+MEDIA_SENDFILE_HEADER = None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -178,3 +230,147 @@ SIMPLE_JWT = {
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # For development only
 CORS_ALLOW_CREDENTIALS = True
+
+# Showtime scheduling
+# Minutes a hall is kept free after a showing ends (cleaning, seating)
+SHOWTIME_CLEANING_BUFFER_MINUTES = 15
+
+# Ticket check-in
+# Tickets are let in from CHECKIN_OPENS_MINUTES before the showing starts
+# until CHECKIN_CLOSES_MINUTES after (late enough for offline scanner uploads)
+CHECKIN_OPENS_MINUTES = 60
+CHECKIN_CLOSES_MINUTES = 180
+# Hours after a showing starts before its admitted-ticket set is dropped from memory
+CHECKIN_REGISTRY_RETENTION_HOURS = 12
+
+# Booking lifecycle job (manage.py update_booking_statuses, run from cron)
+BOOKING_LIFECYCLE_BATCH_SIZE = 1000
+
+# GET /api/bookings/history/ page size (overridable with ?page_size=, up to the maximum)
+BOOKING_HISTORY_PAGE_SIZE = 20
+BOOKING_HISTORY_MAX_PAGE_SIZE = 100
+
+# Seat holds placed by the best-seats finder
+SEAT_HOLD_MINUTES = 10
+
+# Transactional outbox (manage.py dispatch_outbox)
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RETRY_SECONDS = 10
+
+# Idempotency-Key support for booking creation
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 3600
+# How long a duplicate request waits for the first one to finish
+IDEMPOTENCY_WAIT_SECONDS = 10
+# After this long an unfinished request is assumed dead and its key reusable
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+# Email
+# Console backend for development; use 'django.core.mail.backends.filebased.EmailBackend'
+# with EMAIL_FILE_PATH to write messages to files, or configure SMTP in production
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'Univer Cinema <no-reply@univercinema.kg>'
+
+# Showtime reminders (manage.py send_showtime_reminders)
+REMINDER_SENDER = 'cinema.reminders.EmailSender'
+REMINDER_LEAD_MINUTES = 120
+REMINDER_WORKERS = 4
+
+# Threads used by catalog imports to validate rows and process images
+CATALOG_IMPORT_WORKERS = 4
+
+# Delta sync: deletions are remembered this long (older cursors get a full
+# resync), and cursors trail the clock to cover in-flight transactions
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+SYNC_CURSOR_LAG_SECONDS = 5
+
+# How long the booking bootstrap endpoint caches hall layouts and the snack
+# list (both are keyed by their rows' updated_at, so changes show at once)
+BOOTSTRAP_CACHE_SECONDS = 300
+
+# Waiting room for on-sale spikes (cinema.waiting_room): once a showtime's
+# booking flow gets more than WAITING_ROOM_TRIGGER_RPS requests a second,
+# it is only open to holders of a pass for WAITING_ROOM_OPEN_MINUTES. Passes
+# are handed out FIFO, one every PASS_SECONDS / SESSIONS seconds, and last
+# WAITING_ROOM_PASS_SECONDS, so at most WAITING_ROOM_SESSIONS are valid at
+# once. The line lives in the cache, so the room is only on with a shared
+# cache (REDIS_URL); the system checks refuse it with a per-process cache.
+WAITING_ROOM_ENABLED = bool(REDIS_URL)
+WAITING_ROOM_SESSIONS = 200
+WAITING_ROOM_PASS_SECONDS = 300
+WAITING_ROOM_TRIGGER_RPS = 50
+WAITING_ROOM_OPEN_MINUTES = 30
+
+# Tracked snack stock is split over this many rows so concurrent checkouts
+# rarely wait on each other (cinema.inventory)
+SNACK_STOCK_SHARDS = 8
+
+# Slow-query log: statements slower than SLOW_QUERY_MS are written to
+# SLOW_QUERY_LOG_FILE with their route and call site (see cinema.querylog
+# and the slow_queries command). SLOW_QUERY_EXPLAIN adds the EXPLAIN plan,
+# at the cost of running every slow read a second time; leave it off in
+# production unless investigating
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_MS = 200
+SLOW_QUERY_EXPLAIN = False
+SLOW_QUERY_LOG_FILE = BASE_DIR / 'slow_queries.log'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 3,
+            'formatter': 'message',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'cinema.warmup': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'cinema.password_hashing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'cinema.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# "Similar movies" (manage.py compute_similar_movies, nightly): neighbours kept
+# per movie, and how many users must have booked both movies to count
+SIMILAR_MOVIES_TOP_K = 8
+SIMILAR_MOVIES_MIN_SUPPORT = 2
+SIMILAR_MOVIES_MAX_PER_USER = 200
+
+# Showtimes embedded per movie by GET /api/movies/?include=showtimes
+# (overridable with ?showtimes=N, up to the maximum)
+MOVIE_SHOWTIMES_PER_MOVIE = 5
+MOVIE_SHOWTIMES_MAX = 20
+
+# Warm each web process up (code, URLs, database connection, hot caches) in
+# the background as it starts; /api/health/ answers 503 until it's ready
+# (see cinema.warmup). Under gunicorn, use gunicorn.conf.py: with --preload
+# the master only loads code and each worker warms up after the fork.
+WARMUP_ON_STARTUP = True
+
+# How often each process checks the movie table for changes made by other
+# processes to the title index used by /api/movies/typeahead/ (one query)
+TYPEAHEAD_CHECK_SECONDS = 5
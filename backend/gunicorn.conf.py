@@ -0,0 +1,20 @@
+"""
+Gunicorn settings, read from the working directory:
+
+    gunicorn cinema_project.wsgi
+
+Every worker warms up before the health check reports it ready (see
+cinema.warmup). Without --preload each worker does that when it imports the
+app; with --preload the master imports the app once, loading only code and
+URLs, and each worker warms up from post_fork.
+"""
+import os
+
+# Lets cinema.warmup tell the master apart from the workers it forks
+os.environ['CINEMA_PREFORK_PID'] = str(os.getpid())
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from cinema.warmup import start_warm_up
+        start_warm_up()
@@ -33,6 +33,7 @@ export interface Booking {
   grand_total: number;
   status: string;
   qr_code: string | null;
+  ticket: string;
   snack_orders: any[];
 }
 